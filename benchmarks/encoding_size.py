@@ -0,0 +1,85 @@
+# benchmarks/encoding_size.py
+"""
+Payload size and encode time of the sensor_update payload.
+
+Builds a synthetic payload shaped like the live one and encodes it as JSON,
+deflated JSON and (with msgpack installed) the compact MessagePack frames
+the web server and MQTT publisher send.
+
+    python benchmarks/encoding_size.py
+    python benchmarks/encoding_size.py --sensors 24 --readings 100
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from sensor_monitor.encoding import compact_available, compact_sensor_data, encode_compact  # noqa: E402
+
+TYPES = ("Solar", "Wind", "Battery")
+
+
+def synthetic_payload(sensor_count=6, readings=20):
+    """Build a sensor_update payload shaped like the live one"""
+    data = {}
+    for i in range(sensor_count):
+        sensor_type = TYPES[i % len(TYPES)]
+        history = []
+        for r in range(readings):
+            reading = {"voltage": 12.4 + r * 0.01, "current": 1.25 + r * 0.003,
+                       "power": 15.5 + r * 0.05, "time_stamp": "10:15:30AM on May 01, 2025"}
+            if sensor_type == "Battery":
+                reading["state_of_charge"] = 75
+                reading["status"] = "charging"
+            else:
+                reading["output"] = 12.0
+            history.append(reading)
+        latest = dict(history[-1])
+        latest.update({"voltage_trend": 0.01, "current_trend": 0.003, "power_trend": 0.05, "readings": history})
+        data[f"{sensor_type} {i}"] = {"address": 64 + i, "type": sensor_type, "max_power": 100,
+                                      "rating": 12, "device_id": 0, "data": latest}
+    data["totals"] = {"solar_total": 31.0, "wind_total": 15.5, "total_power": 46.5,
+                      "battery_soc_total": 75.0, "battery_in_total": 15.5, "battery_out_total": 0.0}
+    data["system_status"] = {"connected_devices": 1, "total_devices": 1, "active_sensors": sensor_count}
+    return data
+
+
+def compare_encodings(data, repeat=100):
+    """{encoding: {"bytes": n, "encode_us": t}} for JSON and the compact encoding"""
+    encoders = {
+        "json": lambda d: json.dumps(d).encode("utf-8"),
+        "json_deflate": lambda d: zlib.compress(json.dumps(d).encode("utf-8"), 6),
+    }
+    if compact_available():
+        encoders["msgpack"] = lambda d: encode_compact(compact_sensor_data(d), threshold=None)
+        encoders["msgpack_deflate"] = lambda d: encode_compact(compact_sensor_data(d), threshold=0)
+
+    results = {}
+    for name, encoder in encoders.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            payload = encoder(data)
+        elapsed = time.perf_counter() - start
+        results[name] = {"bytes": len(payload), "encode_us": round(elapsed / repeat * 1e6, 1)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sensors", type=int, default=6)
+    parser.add_argument("--readings", type=int, default=20, help="Reading history per sensor")
+    parser.add_argument("--repeat", type=int, default=100, help="Encodes timed per format")
+    args = parser.parse_args()
+    if not compact_available():
+        print("msgpack not installed; showing JSON only", file=sys.stderr)
+    payload = synthetic_payload(args.sensors, args.readings)
+    for encoding, result in compare_encodings(payload, args.repeat).items():
+        print(f"{encoding:16} {result['bytes']:8} bytes {result['encode_us']:10} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/import_time.py
+"""
+Import-time regression check.
+
+Imports each module in a fresh interpreter under `python -X importtime` and
+fails if a hardware, web or MQTT library is pulled in at import time (they
+must load lazily) or if the cumulative import time goes over the budget.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 150 --module sensor_monitor.sensor
+"""
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["sensor_monitor.sensor_manager", "sensor_monitor.sensor"]
+# Only loaded on first use of a local/remote device, the web server or MQTT
+LAZY_MODULES = ["board", "busio", "adafruit_ina219", "adafruit_blinka", "pigpio",
+                "flask", "flask_socketio", "paho", "numpy"]
+DEFAULT_BUDGET_MS = 250.0
+
+
+def import_times(module):
+    """Returns [(name, self_us, cumulative_us)] in import order"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    # Run outside the repo so the logger's sensor_monitor.log does not land in the tree
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def check(module, budget_ms, top):
+    rows = import_times(module)
+    names = {name for name, _, _ in rows}
+    eager = sorted(name for name in names
+                   if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES))
+    total_ms = next((cumulative for name, _, cumulative in rows if name == module), 0) / 1000
+
+    print(f"{module}: {total_ms:.1f} ms cumulative, {len(rows)} modules (budget {budget_ms:.0f} ms)")
+    for name, self_us, _ in sorted(rows, key=lambda row: row[1], reverse=True)[:top]:
+        print(f"    {self_us / 1000:7.1f} ms  {name}")
+
+    ok = True
+    if eager:
+        print(f"  FAIL: imported eagerly: {', '.join(eager)}")
+        ok = False
+    if total_ms > budget_ms:
+        print(f"  FAIL: {total_ms:.1f} ms is over the {budget_ms:.0f} ms budget")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module to check (repeatable)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=5, help="Slowest modules to list")
+    args = parser.parse_args()
+    results = [check(module, args.budget_ms, args.top) for module in args.module or DEFAULT_MODULES]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+# benchmarks/mqtt_load.py
+"""
+MQTT publishing throughput benchmark.
+
+Runs MQTTPublisher, unchanged, against a minimal MQTT 3.1.1 broker started
+in the same process, and drives it the way the poll loop does: one
+publish_new_data() per sensor per cycle plus the totals. Every state payload
+carries a per-sensor sequence number and its submit time, so the broker can
+report end-to-end latency, missing, duplicate and out-of-order updates. The
+publisher's CPU is the process's CPU less the broker's and the load
+generator's own threads, reported per delivered update.
+
+Scenarios:
+    steady   broker up for the whole run
+    outage   broker goes away for --outage seconds mid-run, then comes back;
+             reports disk queue depth, time to reconnect and replay time
+    flap     broker drops the connection every --flap-every seconds
+
+    python benchmarks/mqtt_load.py --sensors 1,10,100,500 --seconds 10
+    python benchmarks/mqtt_load.py --rate 0 --sensors 100 --output flat_out.json
+    python benchmarks/mqtt_load.py --scenarios outage --outage 5 --drain 90
+    python benchmarks/mqtt_load.py --log-level warning --output quiet.json
+
+Each case runs in a fresh interpreter in a temporary directory, so its
+sensor_monitor.log and mqtt_queue/ never touch the tree. Needs paho-mqtt,
+and msgpack for --binary.
+"""
+import os
+import sys
+import json
+import math
+import time
+import struct
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import socketserver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SENSORS = "1,10,100,500"
+SCENARIOS = ("steady", "outage", "flap")
+TYPES = ("Solar", "Wind", "Battery")
+
+# MQTT 3.1.1 control packet types (high nibble of the fixed header)
+CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK = 1, 2, 3, 4, 8, 9
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+# ---------------------------------------------------------------- broker
+
+class BrokerHandler(socketserver.BaseRequestHandler):
+    """One client connection; only what MQTTPublisher uses is implemented"""
+    def setup(self):
+        self.cpu_start = time.thread_time()
+        self.buffer = b""
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                raise EOFError
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def packet(self):
+        header = self.read(1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self.read(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header, self.read(length)
+
+    def handle(self):
+        broker = self.server.broker
+        if not broker.register(self.request):
+            return  # Broker "down": the client sees the connection close at once
+        try:
+            while True:
+                header, body = self.packet()
+                kind = header >> 4
+                if kind == PUBLISH:
+                    received = time.perf_counter()
+                    topic_len = struct.unpack(">H", body[:2])[0]
+                    topic = body[2:2 + topic_len].decode("utf-8")
+                    start = 2 + topic_len
+                    if (header >> 1) & 3:
+                        self.request.sendall(bytes([PUBACK << 4, 2]) + body[start:start + 2])
+                        start += 2
+                    broker.received(topic, body[start:], received)
+                elif kind == CONNECT:
+                    self.request.sendall(bytes([CONNACK << 4, 2, 0, 0]))
+                elif kind == PINGREQ:
+                    self.request.sendall(bytes([PINGRESP << 4, 0]))
+                elif kind == SUBSCRIBE:
+                    self.request.sendall(bytes([SUBACK << 4, 3]) + body[:2] + b"\x00")
+                elif kind == DISCONNECT:
+                    return
+                broker.open_cpu[self.request] = time.thread_time() - self.cpu_start
+        except (EOFError, OSError):
+            pass
+        finally:
+            broker.unregister(self.request, time.thread_time() - self.cpu_start)
+
+
+class StandInBroker:
+    """
+    Accepts MQTT connections on localhost and records what arrives. No
+    subscriptions are routed and nothing is retained; it only has to be a
+    fast, predictable sink for the publisher.
+    """
+    def __init__(self):
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), BrokerHandler)
+        self.server.daemon_threads = True
+        self.server.broker = self
+        self.port = self.server.server_address[1]
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.up = True
+        self.accepted = 0
+        self.cpu = 0.0      # Thread CPU of closed connections
+        self.open_cpu = {}  # socket -> thread CPU so far, updated after every packet
+        self.reset()
+        threading.Thread(target=self.server.serve_forever, name="broker", daemon=True).start()
+
+    def reset(self):
+        with self.lock:
+            self.packets = 0
+            self.bytes = 0
+            self.kinds = {"state": 0, "msgpack": 0, "availability": 0, "discovery": 0, "other": 0}
+            self.latency = []
+            self.last_seq = {}     # sensor -> highest sequence number delivered
+            self.delivered = set()  # (sensor, seq)
+            self.duplicates = 0
+            self.out_of_order = 0
+            self.last_packet = time.perf_counter()
+
+    def register(self, sock):
+        with self.lock:
+            if not self.up:
+                return False
+            self.connections.add(sock)
+            self.accepted += 1
+            self.open_cpu[sock] = 0.0
+            return True
+
+    def unregister(self, sock, cpu):
+        with self.lock:
+            self.connections.discard(sock)
+            self.open_cpu.pop(sock, None)
+            self.cpu += cpu
+
+    def received(self, topic, payload, when):
+        if topic.startswith("homeassistant/"):
+            kind = "availability" if topic.endswith("/availability") else "discovery"
+        elif topic.endswith("/msgpack"):
+            kind = "msgpack"
+        elif topic.startswith("ina219_sensor_monitor/"):
+            kind = "state"
+        else:
+            kind = "other"
+        bench = None
+        if kind == "state" and payload[:1] == b"{":
+            bench = json.loads(payload).get("bench")
+        with self.lock:
+            self.packets += 1
+            self.bytes += len(topic) + len(payload)
+            self.kinds[kind] += 1
+            self.last_packet = when
+            if not bench:
+                return
+            key = (topic, bench["seq"])
+            if key in self.delivered:
+                self.duplicates += 1
+                return
+            self.delivered.add(key)
+            self.latency.append((when - bench["sent"]) * 1000)
+            if bench["seq"] < self.last_seq.get(topic, -1):
+                self.out_of_order += 1
+            else:
+                self.last_seq[topic] = bench["seq"]
+
+    def go_down(self):
+        """Drop every connection and refuse new ones until go_up()"""
+        with self.lock:
+            self.up = False
+        self.drop()
+
+    def go_up(self):
+        with self.lock:
+            self.up = True
+
+    def drop(self):
+        with self.lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def cpu_seconds(self):
+        """CPU used by the broker's connection threads so far"""
+        with self.lock:
+            return self.cpu + sum(self.open_cpu.values())
+
+    def close(self):
+        self.go_down()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ---------------------------------------------------------------- one case
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return dict({f"p{p}": None for p in points}, max=None, mean=None)
+    values = sorted(values)
+    result = {f"p{p}": round(values[min(len(values) - 1, int(p / 100 * len(values)))], 2) for p in points}
+    result["max"] = round(values[-1], 2)
+    result["mean"] = round(sum(values) / len(values), 2)
+    return result
+
+
+def process_cpu():
+    times = os.times()
+    return times.user + times.system
+
+
+def sensor_template(index, readings):
+    sensor_type = TYPES[index % len(TYPES)]
+    data = {"voltage": 12.0, "current": 2.0, "power": 24.0,
+            "time_stamp": time.strftime("%I:%M:%S%p on %B %d, %Y"), "ts": time.time()}
+    if sensor_type == "Battery":
+        data.update(state_of_charge=80, status="charging")
+    else:
+        data["output"] = 24
+    # Reading history, as read_data() returns it; the publisher strips it
+    data["readings"] = [dict(data) for _ in range(readings)]
+    return sensor_type, data
+
+
+def wait_for(condition, timeout, step=0.02):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(step)
+    return condition()
+
+
+def run_case(args):
+    """One sensor count and scenario against a fresh publisher; prints a JSON result"""
+    sys.path.insert(0, ROOT)
+    from sensor_monitor.logger import logger
+    from sensor_monitor.mqtt import MQTTPublisher
+
+    logger.logger.setLevel(args.log_level.upper())
+    broker = StandInBroker()
+    publisher = MQTTPublisher({"mqtt_broker": "127.0.0.1", "mqtt_port": broker.port,
+                               "mqtt_binary": 1 if args.binary else 0})
+    if not wait_for(publisher.is_connected, 10):
+        print(json.dumps({"error": f"publisher did not connect: {publisher.connection_status}"}))
+        return
+
+    sensors = [(f"Bench Sensor {i}",) + sensor_template(i, args.readings) for i in range(args.sensors)]
+    started = time.perf_counter()
+    for name, sensor_type, _ in sensors:
+        publisher.send_discovery_config(name, sensor_type)
+    discovery_ms = (time.perf_counter() - started) * 1000
+    wait_for(lambda: broker.last_packet > started and time.perf_counter() - broker.last_packet > 0.2, 10)
+    broker.reset()
+
+    totals = {"total_power": 0, "solar_total": 0, "wind_total": 0, "battery_soc_total": 0,
+              "battery_in_total": 0, "battery_out_total": 0}
+    interval = 1.0 / args.rate if args.rate > 0 else 0
+    events = {"outage_start": None, "outage_end": None, "reconnected": None, "replayed": None, "drops": 0}
+    max_queue = 0
+    offered = 0
+    submit_ms = []
+    generator_cpu = 0.0
+
+    def events_thread():
+        nonlocal max_queue
+        begin = time.monotonic()
+        next_flap = begin + args.flap_every
+        while not done.is_set():
+            now = time.monotonic()
+            if args.scenario == "outage":
+                if events["outage_start"] is None and now - begin >= args.seconds / 3:
+                    events["outage_start"] = now
+                    broker.go_down()
+                elif events["outage_end"] is None and events["outage_start"] and now - events["outage_start"] >= args.outage:
+                    events["outage_end"] = now
+                    broker.go_up()
+                elif events["outage_end"] and events["reconnected"] is None and publisher.is_connected():
+                    events["reconnected"] = now
+                elif events["reconnected"] and events["replayed"] is None and not publisher.replaying:
+                    events["replayed"] = now
+            elif args.scenario == "flap" and next_flap <= now < begin + args.seconds:
+                broker.drop()
+                events["drops"] += 1
+                next_flap = now + args.flap_every
+            if publisher.queue is not None:
+                max_queue = max(max_queue, len(publisher.queue))
+            time.sleep(0.05)
+
+    done = threading.Event()
+    watcher = threading.Thread(target=events_thread, name="bench-events", daemon=True)
+    wall_start = time.perf_counter()
+    cpu_start = process_cpu()
+    broker_cpu_start = broker.cpu_seconds()
+    watcher.start()
+
+    seq = 0
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        cycle = time.monotonic()
+        cpu = time.thread_time()
+        for i, (name, sensor_type, data) in enumerate(sensors):
+            data["voltage"] = round(12 + math.sin((seq + i) / 10), 2)
+            data["power"] = round(data["voltage"] * data["current"], 1)
+            data["ts"] = time.time()
+            data["bench"] = {"seq": seq, "sent": 0.0}
+        totals["total_power"] = seq
+        generator_cpu += time.thread_time() - cpu
+        cpu = time.thread_time()
+        started = time.perf_counter()
+        for name, sensor_type, data in sensors:
+            data["bench"]["sent"] = time.perf_counter()
+            publisher.publish_new_data(name, data)
+        publisher.publish_totals_data(totals)
+        submit_ms.append((time.perf_counter() - started) * 1000)
+        offered += len(sensors)
+        seq += 1
+        if interval:
+            time.sleep(max(0.0, interval - (time.monotonic() - cycle)))
+
+    load_end = time.perf_counter()
+    # Drain: wait for the worker and the disk queue to empty and the broker to go quiet
+    drained = wait_for(lambda: publisher.is_connected() and not publisher.replaying
+                       and not publisher.worker.stats()["pending"]
+                       and not (publisher.queue is not None and len(publisher.queue))
+                       and time.perf_counter() - broker.last_packet > 0.2, args.drain, step=0.05)
+    done.set()
+    watcher.join()
+    wall = time.perf_counter() - wall_start
+    cpu = process_cpu() - cpu_start
+    broker_cpu = broker.cpu_seconds() - broker_cpu_start
+    publisher_cpu = max(0.0, cpu - broker_cpu - generator_cpu)
+    worker = publisher.worker.stats()
+    queue = publisher.queue.stats() if publisher.queue is not None else None
+    delivered = len(broker.delivered)
+    publisher.close()
+    broker.close()
+
+    result = {
+        "sensors": args.sensors,
+        "scenario": args.scenario,
+        "offered": offered,
+        "delivered": delivered,
+        "coalesced": worker["coalesced"],
+        "dropped": worker["dropped"],
+        # Not delivered: superseded in the publish worker by a newer update, or lost
+        "missing": offered - delivered,
+        "duplicates": broker.duplicates,
+        "out_of_order": broker.out_of_order,
+        "drained": drained,
+        # Rates and CPU are over the whole run, load plus drain
+        "wall_s": round(wall, 2),
+        "drain_s": round(wall_start + wall - load_end, 2),
+        "updates_per_s": round(delivered / wall, 1),
+        "packets_per_s": round(broker.packets / wall, 1),
+        "bytes_per_s": round(broker.bytes / wall),
+        "packets": broker.kinds,
+        "latency_ms": percentiles(broker.latency),
+        "poll_submit_ms": percentiles(submit_ms),
+        "cpu": {
+            "publisher_s": round(publisher_cpu, 3),
+            "publisher_percent": round(100 * publisher_cpu / wall, 1),
+            "us_per_update": round(1e6 * publisher_cpu / delivered, 1) if delivered else None,
+            "us_per_packet": round(1e6 * publisher_cpu / broker.packets, 1) if broker.packets else None,
+            "broker_s": round(broker_cpu, 3),
+            "generator_s": round(generator_cpu, 3)
+        },
+        "discovery_ms": round(discovery_ms, 1),
+        "queue": dict(queue or {}, max_depth=max_queue),
+        "errors": worker["errors"]
+    }
+    if args.scenario == "outage":
+        result["outage"] = {
+            "seconds": args.outage,
+            "reconnect_s": round(events["reconnected"] - events["outage_end"], 2) if events["reconnected"] else None,
+            "replay_s": round(events["replayed"] - events["reconnected"], 2) if events["replayed"] else None
+        }
+    elif args.scenario == "flap":
+        result["flap"] = {"every_s": args.flap_every, "drops": events["drops"],
+                          "connections": broker.accepted}
+    print(json.dumps(result))
+
+
+# ---------------------------------------------------------------- driver
+
+def case_command(args, sensors, scenario):
+    command = [sys.executable, os.path.abspath(__file__), "case", "--sensors", str(sensors),
+               "--scenarios", scenario, "--rate", str(args.rate), "--seconds", str(args.seconds),
+               "--readings", str(args.readings), "--outage", str(args.outage),
+               "--flap-every", str(args.flap_every), "--drain", str(args.drain),
+               "--log-level", args.log_level]
+    if args.binary:
+        command.append("--binary")
+    return command
+
+
+def run(args):
+    runs = []
+    for scenario in args.scenarios.split(","):
+        for sensors in [int(n) for n in args.sensors.split(",") if n.strip()]:
+            print(f"{scenario}: {sensors} sensor(s)...", file=sys.stderr)
+            # A fresh interpreter and directory per case: its own log, disk queue and paho client
+            with tempfile.TemporaryDirectory() as cwd:
+                proc = subprocess.run(case_command(args, sensors, scenario), cwd=cwd,
+                                      capture_output=True, text=True,
+                                      timeout=args.seconds + args.drain + 60)
+            if proc.returncode != 0 or not proc.stdout.strip():
+                result = {"sensors": sensors, "scenario": scenario, "error": proc.stderr[-2000:]}
+            else:
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                result.setdefault("sensors", sensors)
+                result.setdefault("scenario", scenario)
+            runs.append(result)
+
+    try:
+        import paho.mqtt  # noqa: F401
+        paho_version = getattr(sys.modules["paho.mqtt"], "__version__", None)
+    except ImportError:
+        paho_version = None
+    report = {
+        "benchmark": "mqtt_load",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "machine": platform.machine(),
+                 "python": platform.python_version(), "cpus": os.cpu_count(), "paho": paho_version},
+        "settings": {"rate": args.rate, "seconds": args.seconds, "readings": args.readings,
+                     "binary": args.binary, "log_level": args.log_level, "outage": args.outage,
+                     "flap_every": args.flap_every},
+        "runs": runs
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", nargs="?", choices=("run", "case"), default="run")
+    parser.add_argument("--sensors", default=DEFAULT_SENSORS, help="Comma-separated sensor counts")
+    parser.add_argument("--scenarios", default="steady,outage,flap", help=f"Comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--rate", type=float, default=1.0, help="Poll cycles per second (0 = as fast as possible)")
+    parser.add_argument("--seconds", type=float, default=10, help="Load duration per case")
+    parser.add_argument("--readings", type=int, default=10, help="Reading history per sensor update")
+    parser.add_argument("--binary", action="store_true", help="Also publish the MessagePack copy (mqtt_binary)")
+    parser.add_argument("--log-level", default="info", choices=("debug", "info", "warning", "error"))
+    parser.add_argument("--outage", type=float, default=3, help="Broker downtime in the outage scenario")
+    parser.add_argument("--flap-every", type=float, default=2, help="Seconds between drops in the flap scenario")
+    parser.add_argument("--drain", type=float, default=30, help="Max seconds to wait for queued updates after the load")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    if args.mode == "case":
+        args.sensors = int(args.sensors)
+        args.scenario = args.scenarios
+        if args.scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {args.scenario}")
+        run_case(args)
+    else:
+        unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
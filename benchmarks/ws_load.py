@@ -0,0 +1,422 @@
+# benchmarks/ws_load.py
+"""
+WebSocket fan-out load test.
+
+Starts the web server (flaskWrapper) in a child process, fed by simulated
+sensors instead of hardware, then connects N headless Socket.IO clients for
+each client count and measures emit-to-receive latency, dropped and late
+frames, the server's CPU and memory, and how long each broadcast holds up
+the simulated poll loop. Prints one JSON document, so runs with different
+async modes, encodings or settings can be saved and compared.
+
+    python benchmarks/ws_load.py --clients 10,50,100,250,500 --sensors 12 --seconds 20
+    python benchmarks/ws_load.py --encoding msgpack --points 200 --output msgpack.json
+    python benchmarks/ws_load.py --async-mode eventlet --output eventlet.json
+
+To load a Pi from another machine, start the server on the Pi and point the
+clients at it (latency is corrected for the clock offset between the hosts):
+
+    python benchmarks/ws_load.py server --port 5099 --sensors 12      # on the Pi
+    python benchmarks/ws_load.py --url http://pi.local:5099 --clients 50,100
+
+Needs flask-socketio on the server and python-socketio[client] with
+websocket-client for the clients, plus msgpack for --encoding msgpack and
+eventlet/gevent for those async modes.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PORT = 5099
+DEFAULT_CLIENTS = "10,50,100"
+# Clients per worker process; each client runs its own transport threads, so
+# too many per process makes the clients, not the server, the bottleneck
+CLIENTS_PER_PROCESS = 10
+TYPES = ("Solar", "Wind", "Battery")
+
+
+# ---------------------------------------------------------------- server
+
+def simulated_reading(sensor_type, step, index):
+    voltage = round(12 + math.sin((step + index) / 10), 2)
+    current = round(2 + math.cos((step + index) / 7), 3)
+    ts = time.time()
+    reading = {"voltage": voltage, "current": current, "power": round(voltage * current, 1),
+               "time_stamp": time.strftime("%I:%M:%S%p on %B %d, %Y"), "ts": round(ts, 3)}
+    if sensor_type == "Battery":
+        reading["state_of_charge"] = 50 + step % 50
+        reading["status"] = "charging"
+    else:
+        reading["output"] = round(reading["power"])
+    return reading
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return dict({f"p{p}": None for p in points}, max=None, mean=None)
+    values = sorted(values)
+    result = {f"p{p}": round(values[min(len(values) - 1, int(p / 100 * len(values)))], 2) for p in points}
+    result["max"] = round(values[-1], 2)
+    result["mean"] = round(sum(values) / len(values), 2)
+    return result
+
+
+def process_usage():
+    """(CPU seconds, resident MB) of this process"""
+    times = os.times()
+    rss = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) / 1024
+                    break
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return times.user + times.system, rss
+
+
+def serve(args):
+    """Run flaskWrapper with simulated sensors until killed"""
+    if args.async_mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    elif args.async_mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+    import threading
+    from collections import deque
+    from types import SimpleNamespace
+    sys.path.insert(0, ROOT)
+    from sensor_monitor.webserver import flaskWrapper
+    from sensor_monitor.live_data import sensor_data
+
+    config = SimpleNamespace(config_data={"webserver_host": args.host, "webserver_port": args.port,
+                                          "compact_encoding": 1, "max_readings": args.readings})
+    wrapper = flaskWrapper(config, SimpleNamespace(sensors={}), async_mode=args.async_mode)
+
+    # Every frame carries a sequence number and its emit time for the clients to check
+    frame = {"seq": 0, "sent": 0.0}
+    status_fields = wrapper.get_status_fields
+    wrapper.get_status_fields = lambda: dict(status_fields(), bench=dict(frame))
+    stats = {"broadcast_ms": [], "cycle_ms": [], "overruns": 0, "cpu": 0.0, "wall": 0.0}
+
+    def reset(*_):
+        stats.update(broadcast_ms=[], cycle_ms=[], overruns=0)
+        stats["cpu"], _ = process_usage()
+        stats["wall"] = time.monotonic()
+        return True
+
+    def report(*_):
+        cpu, rss = process_usage()
+        wall = time.monotonic() - stats["wall"]
+        return {"cpu_percent": round(100 * (cpu - stats["cpu"]) / wall, 1) if wall else None,
+                "rss_mb": round(rss, 1) if rss else None,
+                "threads": threading.active_count(),
+                "clients": len(wrapper.client_rooms),
+                "frames": frame["seq"],
+                "broadcast_ms": percentiles(stats["broadcast_ms"]),
+                "cycle_ms": percentiles(stats["cycle_ms"]),
+                "cycle_overruns": stats["overruns"]}
+
+    wrapper.socketio.on_event("bench_clock", lambda *_: time.time())
+    wrapper.socketio.on_event("bench_reset", reset)
+    wrapper.socketio.on_event("bench_stats", report)
+
+    def feed():
+        """Stands in for SensorManager.get_data and the main loop"""
+        history = {}
+        names = [f"Sim {TYPES[i % len(TYPES)]} {i + 1}" for i in range(args.sensors)]
+        period = 1.0 / args.rate
+        next_cycle = time.monotonic()
+        step = 0
+        while True:
+            started = time.monotonic()
+            step += 1
+            data = {}
+            for i, name in enumerate(names):
+                sensor_type = TYPES[i % len(TYPES)]
+                readings = history.setdefault(name, deque(maxlen=args.readings))
+                readings.append(simulated_reading(sensor_type, step, i))
+                data[name] = {"address": 64 + i % 16, "type": sensor_type, "max_power": 400, "rating": 12,
+                              "device_id": 0, "poll_interval": period,
+                              "data": dict(readings[-1], power_trend=0, readings=list(readings))}
+                if args.broadcast == "per-reading":
+                    # Like get_data: one broadcast per new reading, of the previous cycle's data
+                    emit()
+            if args.broadcast == "per-cycle":
+                emit()
+            data["totals"] = {"total_power": sum(d["data"]["power"] for d in data.values())}
+            data["devices"] = {0: {"name": "Sim", "connected": True, "type": "local", "address": "local"}}
+            data["system_status"] = {"connected_devices": 1, "total_devices": 1, "active_sensors": len(names)}
+            sensor_data.clear()
+            sensor_data.update(data)
+            stats["cycle_ms"].append((time.monotonic() - started) * 1000)
+            next_cycle += period
+            delay = next_cycle - time.monotonic()
+            if delay < 0:
+                stats["overruns"] += 1
+                next_cycle = time.monotonic()
+            else:
+                time.sleep(delay)
+
+    def emit():
+        frame["seq"] += 1
+        frame["sent"] = time.time()
+        started = time.monotonic()
+        wrapper.broadcast_sensor_data()
+        stats["broadcast_ms"].append((time.monotonic() - started) * 1000)
+
+    reset()
+    wrapper.socketio.start_background_task(feed)
+    print(f"Benchmark server on {args.host}:{args.port} ({args.async_mode}, {args.sensors} sensors at {args.rate} Hz)",
+          flush=True)
+    wrapper.run_webserver()
+
+
+# ---------------------------------------------------------------- clients
+
+def clock_offset(sio, samples=5):
+    """Server clock minus ours, from the round trip with the smallest delay"""
+    best = None
+    for _ in range(samples):
+        before = time.time()
+        server = sio.call("bench_clock", timeout=5)
+        after = time.time()
+        if best is None or after - before < best[0]:
+            best = (after - before, server - (before + after) / 2)
+    return best[1]
+
+
+def decode_frame(frame):
+    """sensor_update_bin frame: a flag byte, then MessagePack (zlib-deflated if the flag is 1)"""
+    import zlib
+    import msgpack
+    body = zlib.decompress(frame[1:]) if frame[0] == 1 else frame[1:]
+    return msgpack.unpackb(body, raw=False)
+
+
+def client_worker(url, count, subscription, transport, late_ms, connected, start, stop, results):
+    """One process running `count` clients; sends back latencies and frame counts"""
+    import threading
+    import socketio
+
+    lock = threading.Lock()
+    totals = {"latency": [], "received": 0, "dropped": 0, "late": 0, "bytes": 0, "errors": 0}
+    measuring = threading.Event()
+    clients = []
+
+    def make_client(offset, sizer):
+        sio = socketio.Client(reconnection=False)
+        last = {"seq": None}
+
+        def on_frame(data, size=None):
+            received = time.time()
+            if isinstance(data, (bytes, bytearray)):
+                size = len(data)
+                data = decode_frame(data)
+            bench = data.get("bench") if isinstance(data, dict) else None
+            if not bench or not bench.get("seq"):
+                return
+            seq = bench["seq"]
+            if last["seq"] is not None and seq <= last["seq"]:
+                return  # Initial snapshot or a repeat
+            gap = seq - last["seq"] - 1 if last["seq"] is not None else 0
+            last["seq"] = seq
+            if not measuring.is_set():
+                return
+            latency = (received - bench["sent"] + offset[0]) * 1000
+            if sizer and size is None:
+                size = len(json.dumps(data))
+            with lock:
+                totals["latency"].append(latency)
+                totals["received"] += 1
+                totals["dropped"] += gap
+                totals["late"] += latency > late_ms
+                if size:
+                    totals["bytes"] = size
+
+        sio.on("sensor_update", on_frame)
+        sio.on("sensor_update_bin", on_frame)
+        return sio
+
+    offset = [0.0]
+    for i in range(count):
+        sio = make_client(offset, sizer=i == 0)
+        try:
+            sio.connect(url, transports=[transport], wait_timeout=10)
+            if i == 0:
+                offset[0] = clock_offset(sio)
+            if subscription:
+                sio.emit("subscribe", subscription)
+            clients.append(sio)
+        except Exception:
+            totals["errors"] += 1
+    connected.put(len(clients))
+    start.wait()
+    measuring.set()
+    stop.wait()
+    measuring.clear()
+    with lock:
+        totals["connected"] = sum(1 for sio in clients if sio.connected)
+        results.put(dict(totals))
+    for sio in clients:
+        try:
+            sio.disconnect()
+        except Exception:
+            pass
+
+
+def run_load(url, clients, args, subscription):
+    import socketio
+    context = multiprocessing.get_context("spawn")
+    connected, results = context.Queue(), context.Queue()
+    start, stop = context.Event(), context.Event()
+    per_process = args.per_process
+    sizes = [min(per_process, clients - i) for i in range(0, clients, per_process)]
+    workers = [context.Process(target=client_worker, daemon=True,
+                               args=(url, size, subscription, args.transport, args.late_ms,
+                                     connected, start, stop, results))
+               for size in sizes]
+    for worker in workers:
+        worker.start()
+    ready = sum(connected.get(timeout=120) for _ in workers)
+
+    control = socketio.Client(reconnection=False)
+    control.connect(url, transports=[args.transport], wait_timeout=10)
+    time.sleep(args.warmup)
+    control.call("bench_reset", timeout=10)
+    first = control.call("bench_stats", timeout=10)["frames"]
+    start.set()
+    time.sleep(args.seconds)
+    stop.set()
+    server = control.call("bench_stats", timeout=10)
+    control.disconnect()
+
+    totals = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=10)
+        if worker.is_alive():
+            worker.terminate()
+    latency = [value for t in totals for value in t["latency"]]
+    frames = server["frames"] - first
+    still_connected = sum(t["connected"] for t in totals)
+    received = sum(t["received"] for t in totals)
+    return {
+        "clients": clients,
+        "connected": ready,
+        "still_connected": still_connected,
+        "connect_errors": sum(t["errors"] for t in totals),
+        "frames_emitted": frames,
+        "frames_received": received,
+        # Gaps in the sequence numbers a client saw
+        "dropped": sum(t["dropped"] for t in totals),
+        "late": sum(t["late"] for t in totals),
+        "late_ms": args.late_ms,
+        "latency_ms": percentiles(latency),
+        "payload_bytes": max((t["bytes"] for t in totals), default=0),
+        "server": server,
+    }
+
+
+def start_server(args):
+    command = [sys.executable, os.path.abspath(__file__), "server", "--host", "127.0.0.1", "--port", str(args.port),
+               "--sensors", str(args.sensors), "--rate", str(args.rate), "--readings", str(args.readings),
+               "--async-mode", args.async_mode, "--broadcast", args.broadcast]
+    # Run outside the repo so the logger's sensor_monitor.log does not land in the tree
+    cwd = tempfile.mkdtemp(prefix="ws_load-")
+    log = open(os.path.join(cwd, "server.out"), "w")
+    process = subprocess.Popen(command, cwd=cwd, env=dict(os.environ, PYTHONPATH=ROOT), stdout=log, stderr=log)
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + 30
+    import urllib.request
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.flush()
+            with open(log.name) as f:
+                raise RuntimeError(f"Benchmark server exited:\n{f.read()[-2000:]}")
+        try:
+            urllib.request.urlopen(f"{url}/socket.io/?EIO=4&transport=polling", timeout=1).close()
+            return process, url
+        except Exception:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Benchmark server did not start within 30s")
+
+
+def run(args):
+    subscription = {}
+    if args.encoding != "json":
+        subscription["encoding"] = args.encoding
+    if args.points:
+        subscription["points"] = args.points
+    if args.types:
+        subscription["types"] = args.types.split(",")
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args)
+    try:
+        runs = []
+        for clients in [int(c) for c in args.clients.split(",")]:
+            print(f"{clients} clients...", file=sys.stderr, flush=True)
+            runs.append(run_load(url, clients, args, subscription or None))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+    report = {
+        "config": {"url": url, "async_mode": args.async_mode if process else "remote",
+                   "encoding": args.encoding, "points": args.points, "types": args.types,
+                   "transport": args.transport, "broadcast": args.broadcast if process else "remote",
+                   "sensors": args.sensors, "rate": args.rate, "readings": args.readings,
+                   "seconds": args.seconds, "python": platform.python_version(), "machine": platform.machine()},
+        "runs": runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", nargs="?", choices=("run", "server"), default="run")
+    parser.add_argument("--clients", default=DEFAULT_CLIENTS, help="Comma-separated client counts (run mode)")
+    parser.add_argument("--url", help="Load an already running benchmark server instead of starting one")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--sensors", type=int, default=12)
+    parser.add_argument("--rate", type=float, default=1.0, help="Simulated poll cycles per second")
+    parser.add_argument("--readings", type=int, default=20, help="Readings kept per sensor (the max_readings setting)")
+    parser.add_argument("--async-mode", default="threading", choices=("threading", "eventlet", "gevent"))
+    parser.add_argument("--broadcast", default="per-reading", choices=("per-reading", "per-cycle"),
+                        help="per-reading matches the poll loop, which broadcasts after every new reading")
+    parser.add_argument("--encoding", default="json", choices=("json", "msgpack"))
+    parser.add_argument("--points", type=int, default=0, help="Subscribe with points= downsampling")
+    parser.add_argument("--types", help="Subscribe to these sensor types only, e.g. Battery")
+    parser.add_argument("--transport", default="websocket", choices=("websocket", "polling"))
+    parser.add_argument("--per-process", type=int, default=CLIENTS_PER_PROCESS, help="Clients per worker process")
+    parser.add_argument("--seconds", type=float, default=20, help="Measurement time per client count")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--late-ms", type=float, default=1000, help="Latency above which a frame counts as late")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.mode == "server":
+        serve(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 # main.py
 
+import os
 import sys
 import time
+import signal
 try:
     from sensor_monitor.config_manager import ConfigManager
     from sensor_monitor.sensor_manager import SensorManager
     from sensor_monitor.logger import logger
     from sensor_monitor.live_data import sensor_data
+    from sensor_monitor.storage import flush_all
+    from sensor_monitor.health import sd_notify
     from threading import Thread
 except Exception as ex:
     print("Error" + str(ex))
@@ -19,16 +23,33 @@ manager = SensorManager(config)
 
 def run_sensor_loop():
     while True:
+        started = time.monotonic()
         # Update sensor data
         data = manager.get_data()
         # Update the global sensor_data dictionary
         # This assumes sensor_data is a global dictionary that holds the latest sensor readings
         sensor_data.clear()
         sensor_data.update(data)
+        # Heartbeat for /healthz and the systemd watchdog
+        manager.health.beat(time.monotonic() - started)
         # Sleep for a short duration to avoid busy waiting
         time.sleep(1)
 
+def shutdown(signum, frame):
+    # Write any pending config/sensor edits, then exit as SIGTERM would
+    logger.info("Shutting down, saving pending changes")
+    sd_notify("STOPPING=1")
+    flush_all()
+    manager.mqtt.close()
+    manager.archive.flush()
+    os._exit(0)
+
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, shutdown)
+    # Connect devices, load sensors and publish MQTT discovery in the background
+    # so the web server is reachable straight away
+    manager.start()
+    manager.health.start()
     # Start the sensor data loop in a separate thread
     logger.info("Starting sensor data loop in a separate thread")
     Thread(target=run_sensor_loop).start()
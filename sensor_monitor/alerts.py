@@ -0,0 +1,405 @@
+# sensor_monitor/alerts.py
+import sys
+import json
+import time
+import threading
+import urllib.request
+from collections import deque
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+DEFAULT_FIELD = "power"
+# A rule that has fired will not fire again until this long after it last did
+DEFAULT_COOLDOWN = 300
+DEFAULT_SEVERITY = "warning"
+# How long a value must stay stuck or flat before it counts
+DEFAULT_HOLD = 600
+# |value| at or below this counts as zero for flatline rules
+DEFAULT_FLAT_TOLERANCE = 0.5
+HISTORY_SIZE = 50
+WEBHOOK_TIMEOUT = 5
+WEBHOOK_QUEUE = 100
+
+STATE_FIRING = "firing"
+STATE_CLEARED = "cleared"
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Rule:
+    """
+    One alert condition on a sensor. check() looks at a new reading and
+    returns True (condition met), False (condition clear) or None (not
+    enough data to say). The engine turns changes into fired/cleared events.
+    """
+    kind = None
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.id = str(spec["id"])
+        self.sensor = str(spec["sensor"])
+        self.name = spec.get("name") or self.id
+        self.field = spec.get("field", DEFAULT_FIELD)
+        self.severity = spec.get("severity", DEFAULT_SEVERITY)
+        self.cooldown = float(spec.get("cooldown", DEFAULT_COOLDOWN))
+        self.active = False
+        self.since = None
+        self.last_fired = None
+        self.value = None
+
+    def sensors(self):
+        return (self.sensor,)
+
+    def check(self, name, reading, now, latest):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.name
+
+    def transition(self, met, now):
+        """Apply a check result; returns an event dict if the rule fired or cleared"""
+        if met and not self.active:
+            if self.last_fired is not None and now - self.last_fired < self.cooldown:
+                return None
+            self.active = True
+            self.since = now
+            self.last_fired = now
+            return self.event(STATE_FIRING, now)
+        if met is False and self.active:
+            self.active = False
+            self.since = now
+            return self.event(STATE_CLEARED, now)
+        return None
+
+    def event(self, state, now):
+        return dict(self.to_dict(), state=state, time=round(now, 3), message=self.describe())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.kind,
+            "sensor": self.sensor,
+            "field": self.field,
+            "severity": self.severity,
+            "active": self.active,
+            "since": self.since,
+            "value": self.value
+        }
+
+
+class ThresholdRule(Rule):
+    """
+    Value below `below` and/or above `above`. Each bound clears only once the
+    value is back past its own clear level (hysteresis): `clear_below` and
+    `clear_above`, or `clear` when only one bound is set.
+    """
+    kind = "threshold"
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.below = _number(spec.get("below"))
+        self.above = _number(spec.get("above"))
+        if self.below is None and self.above is None:
+            raise ValueError("needs 'below' or 'above'")
+        clear = _number(spec.get("clear"))
+        if clear is not None and self.below is not None and self.above is not None:
+            raise ValueError("'clear' is ambiguous with both bounds; use 'clear_below' and 'clear_above'")
+        self.clear_below = self.clear_level(_number(spec.get("clear_below")), clear, self.below)
+        self.clear_above = self.clear_level(_number(spec.get("clear_above")), clear, self.above)
+        self.side = None  # "below" or "above": the bound that fired
+
+    @staticmethod
+    def clear_level(specific, shared, bound):
+        if bound is None:
+            return None
+        for level in (specific, shared):
+            if level is not None:
+                return level
+        return bound
+
+    def check(self, name, reading, now, latest):
+        value = _number(reading.get(self.field))
+        if value is None:
+            return None
+        self.value = value
+        side = self.side if self.active else None
+        low = self.below is not None and value < (self.clear_below if side == "below" else self.below)
+        high = self.above is not None and value > (self.clear_above if side == "above" else self.above)
+        self.side = "below" if low else "above" if high else side
+        return low or high
+
+    def describe(self):
+        side = self.side or ("below" if self.below is not None else "above")
+        limit = self.below if side == "below" else self.above
+        return f"{self.name}: {self.sensor} {self.field} {self.value} is {side} {limit}"
+
+
+class RateRule(Rule):
+    """Value changing faster than `max_rate` per minute, measured over `window` seconds"""
+    kind = "rate"
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.max_rate = _number(spec.get("max_rate"))
+        if self.max_rate is None:
+            raise ValueError("needs 'max_rate'")
+        self.window = float(spec.get("window", 60))
+        self.samples = deque()
+
+    def check(self, name, reading, now, latest):
+        value = _number(reading.get(self.field))
+        if value is None:
+            return None
+        self.samples.append((now, value))
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+        start_time, start_value = self.samples[0]
+        if now - start_time <= 0:
+            return None
+        self.value = round((value - start_value) / (now - start_time) * 60, 3)
+        return abs(self.value) > self.max_rate
+
+    def describe(self):
+        return f"{self.name}: {self.sensor} {self.field} changing {self.value}/min (limit {self.max_rate})"
+
+
+class HoldRule(Rule):
+    """Base for conditions that must hold for `for` seconds before they count"""
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.hold = float(spec.get("for", DEFAULT_HOLD))
+        self.held_since = None
+
+    def held(self, condition, now):
+        if not condition:
+            self.held_since = None
+            return False
+        if self.held_since is None:
+            self.held_since = now
+        return now - self.held_since >= self.hold
+
+
+class StuckRule(HoldRule):
+    """Value not changing (within `tolerance`) for `for` seconds: a frozen sensor or bus"""
+    kind = "stuck"
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.tolerance = float(spec.get("tolerance", 0))
+        self.reference = None
+
+    def check(self, name, reading, now, latest):
+        value = _number(reading.get(self.field))
+        if value is None:
+            return None
+        self.value = value
+        same = self.reference is not None and abs(value - self.reference) <= self.tolerance
+        if not same:
+            self.reference = value
+        return self.held(same, now)
+
+    def describe(self):
+        return f"{self.name}: {self.sensor} {self.field} stuck at {self.value}"
+
+
+class FlatlineRule(HoldRule):
+    """
+    Value at zero (within `tolerance`) for `for` seconds, e.g. a panel
+    string producing nothing. With "daylight": true it is only checked
+    while the sun is up at the configured location.
+    """
+    kind = "flatline"
+
+    def __init__(self, spec, daylight=None):
+        super().__init__(spec)
+        self.tolerance = float(spec.get("tolerance", DEFAULT_FLAT_TOLERANCE))
+        self.daylight = daylight if spec.get("daylight") else None
+
+    def check(self, name, reading, now, latest):
+        value = _number(reading.get(self.field))
+        if value is None:
+            return None
+        self.value = value
+        if self.daylight is not None and not self.daylight():
+            self.held_since = None
+            return False
+        return self.held(abs(value) <= self.tolerance, now)
+
+    def describe(self):
+        return f"{self.name}: {self.sensor} {self.field} flat at {self.value}"
+
+
+class CrossRule(Rule):
+    """
+    Compares two sensors, e.g. one solar string producing well under its
+    neighbour: `ratio_below` fires when sensor < ratio x other, and
+    `difference_above` when |sensor - other| exceeds it. Readings where the
+    other sensor is under `min_other` are ignored.
+    """
+    kind = "cross"
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.other = str(spec["other"])
+        self.ratio_below = _number(spec.get("ratio_below"))
+        self.difference_above = _number(spec.get("difference_above"))
+        if self.ratio_below is None and self.difference_above is None:
+            raise ValueError("needs 'ratio_below' or 'difference_above'")
+        self.min_other = float(spec.get("min_other", 0))
+
+    def sensors(self):
+        return (self.sensor, self.other)
+
+    def check(self, name, reading, now, latest):
+        mine = _number((latest.get(self.sensor) or {}).get(self.field))
+        other = _number((latest.get(self.other) or {}).get(self.field))
+        if mine is None or other is None:
+            return None
+        self.value = mine
+        if abs(other) < self.min_other:
+            return False
+        if self.ratio_below is not None and abs(mine) < self.ratio_below * abs(other):
+            return True
+        return self.difference_above is not None and abs(mine - other) > self.difference_above
+
+    def describe(self):
+        return f"{self.name}: {self.sensor} {self.field} {self.value} out of line with {self.other}"
+
+
+RULE_TYPES = {cls.kind: cls for cls in (ThresholdRule, RateRule, StuckRule, FlatlineRule, CrossRule)}
+
+
+class AlertEngine:
+    """
+    Evaluates config.json "alerts" rules against each new reading. Rules are
+    indexed by sensor name, so a reading only runs the rules that mention its
+    sensor. Fired and cleared events go to every listener (MQTT, Socket.IO,
+    webhook).
+    """
+    def __init__(self, rules=None, daylight=None):
+        self.lock = threading.Lock()
+        self.daylight = daylight
+        self.rules = {}
+        self.index = {}   # sensor name -> rules to run when it has a new reading
+        self.latest = {}  # sensor name -> last reading, for cross-sensor rules
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.listeners = []
+        self.configure(rules or [])
+
+    def configure(self, specs):
+        """
+        Load rules from config. A rule whose id and spec are unchanged keeps
+        its object, so its active state, hold timer and cooldown survive a
+        config save; changed and new rules start fresh.
+        """
+        with self.lock:
+            current = dict(self.rules)
+        rules = {}
+        for spec in specs:
+            old = current.get(str(spec.get("id")))
+            if old is not None and old.spec == spec:
+                rules[old.id] = old
+                continue
+            try:
+                kind = spec.get("type", "threshold")
+                cls = RULE_TYPES[kind]
+                rule = cls(spec, self.daylight) if cls is FlatlineRule else cls(spec)
+            except KeyError as e:
+                logger.warning(f"Ignoring alert rule {spec}: missing or unknown {e}")
+                continue
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Ignoring alert rule {spec}: {e}")
+                continue
+            rules[rule.id] = rule
+        index = {}
+        for rule in rules.values():
+            for sensor in rule.sensors():
+                index.setdefault(sensor, []).append(rule)
+        with self.lock:
+            self.rules = rules
+            self.index = index
+        logger.info(f"Alerts configured with {len(rules)} rule(s)")
+
+    def evaluate(self, name, reading, now=None):
+        """Run the rules for one sensor's new reading and notify listeners of any changes"""
+        rules = self.index.get(name)
+        if not rules:
+            return []
+        now = now or time.time()
+        events = []
+        with self.lock:
+            self.latest[name] = reading
+            for rule in rules:
+                try:
+                    event = rule.transition(rule.check(name, reading, now, self.latest), now)
+                except Exception as e:
+                    logger.error(f"Alert rule {rule.id} failed: {e}")
+                    continue
+                if event is not None:
+                    events.append(event)
+                    self.history.append(event)
+        for event in events:
+            log = logger.warning if event["state"] == STATE_FIRING else logger.info
+            log(f"Alert {event['state']}: {event['message']}")
+            for listener in self.listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.error(f"Alert notification failed: {e}")
+        return events
+
+    def rule_list(self):
+        with self.lock:
+            return [rule.to_dict() for rule in self.rules.values()]
+
+    def active(self):
+        with self.lock:
+            return [rule.to_dict() for rule in self.rules.values() if rule.active]
+
+    def status(self):
+        with self.lock:
+            history = list(self.history)
+        return {"rules": self.rule_list(), "active": self.active(), "history": history}
+
+
+class Webhook:
+    """POSTs alert events as JSON to a local URL from its own thread, so a slow endpoint never blocks polling"""
+    def __init__(self, url=None):
+        self.url = url or None
+        self.pending = deque(maxlen=WEBHOOK_QUEUE)
+        self.ready = threading.Event()
+        self.thread = None
+
+    def send(self, event):
+        if not self.url:
+            return
+        self.pending.append(event)
+        self.ready.set()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="alert-webhook", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.ready.wait()
+            self.ready.clear()
+            while self.pending:
+                event = self.pending.popleft()
+                url = self.url
+                if not url:
+                    continue
+                try:
+                    request = urllib.request.Request(url, data=json.dumps(event).encode("utf-8"),
+                                                     headers={"Content-Type": "application/json"})
+                    urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT).close()
+                except Exception as e:
+                    logger.error(f"Alert webhook to {url} failed: {e}")
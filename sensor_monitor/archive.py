@@ -0,0 +1,366 @@
+# sensor_monitor/archive.py
+import io
+import sys
+import zlib
+import mmap
+import time
+import struct
+import threading
+from array import array
+from datetime import date
+from itertools import accumulate
+from urllib.parse import quote, unquote
+try:
+    from pathlib import Path
+    from sensor_monitor.logger import logger
+    from sensor_monitor.backends import load
+    from sensor_monitor.downsample import numpy
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+ARCHIVE_DIR = "archive"
+SEGMENT_SUFFIX = ".col"
+# A block is written once it holds this many samples or spans this many seconds
+BLOCK_SAMPLES = 600
+BLOCK_SECONDS = 600
+# Stored columns and their quantization: values are kept as int32 counts of 1/scale
+COLUMNS = (("voltage", 1000), ("current", 10000), ("power", 1000))
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+QUANT_LIMIT = 2 ** 30
+TIME_SCALE = 1000  # Timestamps are stored in milliseconds
+MAGIC = b"INAC"
+CODEC_RAW = 0
+CODEC_ZSTD = 1
+# magic, crc32 of the body, codec, column count, sample count, first/last time (ms), body length
+BLOCK = struct.Struct("<4sIBBIqqI")
+# Rows per Parquet row group when exporting
+PARQUET_ROWS = 65536
+
+
+def zstd():
+    """The zstandard module if installed, else None (blocks are then stored uncompressed)"""
+    try:
+        return load("zstandard")
+    except RuntimeError:
+        return None
+
+
+def sensor_dir(root, name):
+    return Path(root) / quote(name, safe=" ")
+
+
+def day_of(ms):
+    return time.strftime("%Y-%m-%d", time.localtime(ms / TIME_SCALE))
+
+
+def quantize(value, scale):
+    try:
+        q = int(round(float(value or 0) * scale))
+    except (TypeError, ValueError):
+        q = 0
+    return max(-QUANT_LIMIT, min(q, QUANT_LIMIT))
+
+
+def deltas(values):
+    return [values[0]] + [b - a for a, b in zip(values, values[1:])]
+
+
+def encode_block(times, columns, codec):
+    """
+    One block of samples. Timestamps are delta-of-delta encoded, so a steady
+    poll interval becomes a run of zeros, and each value column holds the
+    deltas of its quantized values. Columns are stored one after another as
+    little-endian int32, so a reader can pick out just the ones it needs.
+    """
+    count = len(times)
+    step = deltas(times)
+    step[0] = 0
+    parts = [struct.pack(f"<{count}i", *deltas(step))]
+    for values in columns:
+        parts.append(struct.pack(f"<{count}i", *deltas(values)))
+    body = b"".join(parts)
+    if codec == CODEC_ZSTD:
+        body = zstd().ZstdCompressor(level=3).compress(body)
+    header = BLOCK.pack(MAGIC, zlib.crc32(body), codec, len(columns), count, times[0], times[-1], len(body))
+    return header + body
+
+
+def _int32(buf, offset, count, np):
+    if np is not None:
+        return np.frombuffer(buf, dtype="<i4", count=count, offset=offset)
+    values = array("i")
+    values.frombytes(bytes(buf[offset:offset + 4 * count]))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _decode_block(np, buf, count, first, fields):
+    """Decode only the requested columns of a raw block body (a bytes or mmap slice view)"""
+    out = {}
+    dod = _int32(buf, 0, count, np)
+    if np is not None:
+        out["ts"] = (np.cumsum(np.cumsum(dod, dtype=np.int64)) + first) / TIME_SCALE
+    else:
+        out["ts"] = [(t + first) / TIME_SCALE for t in accumulate(accumulate(dod))]
+    for i, (name, scale) in enumerate(COLUMNS):
+        if name not in fields:
+            continue
+        raw = _int32(buf, 4 * count * (i + 1), count, np)
+        if np is not None:
+            out[name] = np.cumsum(raw, dtype=np.int64) / scale
+        else:
+            out[name] = [v / scale for v in accumulate(raw)]
+    return out
+
+
+def _trim(np, chunk, start, end):
+    """Limit a decoded chunk to start <= ts <= end (seconds)"""
+    ts = chunk["ts"]
+    if np is not None:
+        lo, hi = np.searchsorted(ts, start, "left"), np.searchsorted(ts, end, "right")
+    else:
+        lo = next((i for i, t in enumerate(ts) if t >= start), len(ts))
+        hi = next((i for i in range(len(ts) - 1, -1, -1) if ts[i] <= end), -1) + 1
+    if lo == 0 and hi == len(ts):
+        return chunk
+    return {key: values[lo:hi] for key, values in chunk.items()}
+
+
+def read_segment(path, start=0, end=float("inf"), fields=COLUMN_NAMES):
+    """
+    Yield decoded chunks (dicts of column -> array) from one day file. The
+    file is memory-mapped and only block headers are read to find the blocks
+    overlapping [start, end]; uncompressed blocks are viewed in place with
+    NumPy rather than copied. A torn block at the end (power cut mid-write)
+    ends the file.
+    """
+    np = numpy()
+    path = Path(path)
+    size = path.stat().st_size
+    if size < BLOCK.size:
+        return
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # Slices of the view are zero-copy; the map is closed once nothing refers to it
+    view = memoryview(mm)
+    start_ms, end_ms = start * TIME_SCALE, end * TIME_SCALE
+    offset = 0
+    while offset + BLOCK.size <= size:
+        magic, crc, codec, ncols, count, first, last, length = BLOCK.unpack_from(mm, offset)
+        body_start = offset + BLOCK.size
+        offset = body_start + length
+        if magic != MAGIC or offset > size:
+            break
+        if last < start_ms:
+            continue
+        if first > end_ms:
+            break
+        body = view[body_start:offset]
+        if zlib.crc32(body) != crc or ncols != len(COLUMNS):
+            logger.warning(f"Skipping damaged archive block in {path}")
+            continue
+        if codec == CODEC_ZSTD:
+            body = zstd().ZstdDecompressor().decompress(bytes(body), max_output_size=4 * count * (ncols + 1))
+        chunk = _trim(np, _decode_block(np, body, count, first, fields), start, end)
+        if len(chunk["ts"]):
+            yield chunk
+
+
+class SensorBuffer:
+    """Samples waiting to be written as the next block of one sensor's day file"""
+    def __init__(self):
+        self.times = []
+        self.columns = [[] for _ in COLUMNS]
+        self.day = None
+
+    def add(self, ms, reading):
+        self.times.append(ms)
+        for values, (name, scale) in zip(self.columns, COLUMNS):
+            values.append(quantize(reading.get(name), scale))
+
+    def due(self, ms):
+        """True if the block is full, old enough, or ms belongs to a new day"""
+        return bool(self.times) and (len(self.times) >= BLOCK_SAMPLES or
+                                     ms - self.times[0] >= BLOCK_SECONDS * TIME_SCALE or
+                                     day_of(ms) != self.day)
+
+    def chunk(self, start, end, fields):
+        np = numpy()
+        chunk = {"ts": [t / TIME_SCALE for t in self.times]}
+        for values, (name, scale) in zip(self.columns, COLUMNS):
+            if name in fields:
+                chunk[name] = [v / scale for v in values]
+        if np is not None:
+            chunk = {key: np.asarray(values, dtype=np.float64) for key, values in chunk.items()}
+        return _trim(np, chunk, start, end)
+
+
+class Archiver:
+    """
+    Long-term per-sensor storage of every reading in daily columnar files
+    (archive/<sensor>/<YYYY-MM-DD>.col). Readings are buffered in memory and
+    appended as compressed blocks of up to BLOCK_SAMPLES samples, so the SD
+    card sees one small write every few minutes per sensor.
+    """
+    def __init__(self, enabled=False, directory=ARCHIVE_DIR):
+        self.lock = threading.Lock()
+        self.buffers = {}  # sensor name -> SensorBuffer
+        self.enabled = False
+        self.directory = Path(directory)
+        self.codec = CODEC_RAW
+        self.blocks = 0
+        self.bytes = 0
+        self.errors = 0
+        self.configure(enabled, directory)
+
+    def configure(self, enabled, directory=ARCHIVE_DIR):
+        self.flush()
+        self.enabled = bool(int(enabled or 0))
+        self.directory = Path(directory or ARCHIVE_DIR)
+        if self.enabled:
+            self.codec = CODEC_ZSTD if zstd() is not None else CODEC_RAW
+            logger.info(f"Archiving readings to {self.directory} ({'zstd' if self.codec == CODEC_ZSTD else 'uncompressed'})")
+
+    def append(self, name, reading, now=None):
+        """Add one new reading; writes the sensor's block when it is due"""
+        if not self.enabled:
+            return
+        ms = int(round(float(reading.get("ts") or now or time.time()) * TIME_SCALE))
+        with self.lock:
+            buffer = self.buffers.get(name)
+            if buffer is None:
+                buffer = self.buffers[name] = SensorBuffer()
+            if buffer.due(ms):
+                self._write(name, buffer)
+            if buffer.day is None:
+                buffer.day = day_of(ms)
+            buffer.add(ms, reading)
+
+    def _write(self, name, buffer):
+        times, columns, day = buffer.times, buffer.columns, buffer.day
+        buffer.__init__()
+        try:
+            block = encode_block(times, columns, self.codec)
+            folder = sensor_dir(self.directory, name)
+            folder.mkdir(parents=True, exist_ok=True)
+            with open(folder / f"{day}{SEGMENT_SUFFIX}", "ab") as f:
+                f.write(block)
+            self.blocks += 1
+            self.bytes += len(block)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Failed to archive {len(times)} readings for {name}: {e}")
+
+    def flush(self):
+        """Write every partial block, e.g. on shutdown"""
+        with self.lock:
+            for name, buffer in self.buffers.items():
+                if buffer.times:
+                    self._write(name, buffer)
+
+    def sensors(self):
+        names = {unquote(path.name) for path in self.directory.glob("*") if path.is_dir()}
+        with self.lock:
+            names.update(name for name, buffer in self.buffers.items() if buffer.times)
+        return sorted(names)
+
+    def chunks(self, name, start=0, end=float("inf"), fields=COLUMN_NAMES):
+        """
+        Yield a sensor's readings between start and end (epoch seconds) one
+        block at a time, oldest first, including readings not yet written.
+        """
+        first_day = date.fromtimestamp(max(start, 0)).isoformat()
+        last_day = date.fromtimestamp(min(end, time.time() + 86400)).isoformat()
+        folder = sensor_dir(self.directory, name)
+        for path in sorted(folder.glob(f"*{SEGMENT_SUFFIX}")):
+            if first_day <= path.stem <= last_day:
+                yield from read_segment(path, start, end, fields)
+        with self.lock:
+            buffer = self.buffers.get(name)
+            pending = buffer.chunk(start, end, fields) if buffer is not None and buffer.times else None
+        if pending is not None and len(pending["ts"]):
+            yield pending
+
+    def read(self, name, start=0, end=float("inf"), fields=COLUMN_NAMES):
+        """All readings in the range as one dict of column -> array"""
+        np = numpy()
+        chunks = list(self.chunks(name, start, end, fields))
+        keys = ("ts",) + tuple(f for f in COLUMN_NAMES if f in fields)
+        if np is not None:
+            return {key: np.concatenate([c[key] for c in chunks]) if chunks else np.empty(0) for key in keys}
+        return {key: [v for c in chunks for v in c[key]] for key in keys}
+
+    def stats(self):
+        with self.lock:
+            pending = sum(len(buffer.times) for buffer in self.buffers.values())
+        return {"enabled": self.enabled, "blocks_written": self.blocks, "bytes_written": self.bytes,
+                "pending": pending, "errors": self.errors}
+
+
+def iter_csv(chunks):
+    """CSV text for exported chunks, one piece per block"""
+    yield "time,ts," + ",".join(COLUMN_NAMES) + "\n"
+    for chunk in chunks:
+        columns = [chunk["ts"]] + [chunk[name] for name in COLUMN_NAMES]
+        columns = [c.tolist() if hasattr(c, "tolist") else c for c in columns]
+        yield "".join(
+            f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(ts))},{ts:.3f},{v:.3f},{i:.4f},{p:.3f}\n"
+            for ts, v, i, p in zip(*columns))
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back whatever has been written since the last take()"""
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_parquet(chunks):
+    """Parquet file for exported chunks, yielded a row group at a time (needs pyarrow)"""
+    pa = load("pyarrow")
+    pq = load("pyarrow.parquet")
+    np = numpy()
+    schema = pa.schema([("ts", pa.timestamp("ms", tz="UTC"))] + [(name, pa.float64()) for name in COLUMN_NAMES])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    batch = []
+    rows = 0
+
+    def write_batch():
+        columns = {key: (np.concatenate([c[key] for c in batch]) if np is not None
+                         else [v for c in batch for v in c[key]]) for key in ("ts",) + COLUMN_NAMES}
+        ts = columns.pop("ts")
+        ms = (ts * TIME_SCALE).round().astype("int64") if np is not None else [round(t * TIME_SCALE) for t in ts]
+        arrays = [pa.array(ms, type=pa.int64()).cast(pa.timestamp("ms", tz="UTC"))]
+        arrays += [pa.array(columns[name], type=pa.float64()) for name in COLUMN_NAMES]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    for chunk in chunks:
+        batch.append(chunk)
+        rows += len(chunk["ts"])
+        if rows >= PARQUET_ROWS:
+            write_batch()
+            batch, rows = [], 0
+            yield sink.take()
+    if batch:
+        write_batch()
+    writer.close()
+    yield sink.take()
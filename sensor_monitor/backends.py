@@ -0,0 +1,59 @@
+# sensor_monitor/backends.py
+import sys
+import importlib
+import threading
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Hardware libraries are imported on first use, so a remote-only setup never
+# loads Blinka and a machine without any of them can still serve the web UI
+INSTALL_HINTS = {
+    "pigpio": "pip install pigpio",
+    "board": "pip install adafruit-circuitpython-ina219 (Adafruit Blinka)",
+    "adafruit_ina219": "pip install adafruit-circuitpython-ina219",
+    "paho.mqtt.client": "pip install paho-mqtt",
+    "numpy": "pip install numpy",
+    "socketio": "pip install python-socketio[client]",
+    "zstandard": "pip install zstandard",
+    "pyarrow": "pip install pyarrow",
+    "pyarrow.parquet": "pip install pyarrow",
+}
+
+_modules = {}
+_lock = threading.Lock()
+
+
+def load(name):
+    """Import a backend module the first time it is needed; raises RuntimeError with an install hint if missing"""
+    module = _modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        if name not in _modules:
+            try:
+                _modules[name] = importlib.import_module(name)
+            except Exception as e:
+                # Blinka raises NotImplementedError on boards it does not know
+                hint = INSTALL_HINTS.get(name, f"pip install {name}")
+                logger.error(f"Backend {name} unavailable: {e}")
+                raise RuntimeError(f"{name} is not available ({e}); {hint}") from e
+            logger.info(f"Loaded backend {name}")
+        return _modules[name]
+
+
+def pigpio_pi(address):
+    """Connection to a remote pigpio daemon"""
+    return load("pigpio").pi(address)
+
+
+def local_i2c():
+    """The Pi's own I2C bus"""
+    return load("board").I2C()
+
+
+def ina219_driver(i2c):
+    """Adafruit INA219 driver on a local bus"""
+    return load("adafruit_ina219").INA219(i2c)
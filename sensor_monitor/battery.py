@@ -0,0 +1,180 @@
+# sensor_monitor/battery.py
+import sys
+import csv
+import threading
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+DEFAULT_BATTERY_MODEL = "lead_acid"
+CUSTOM_BATTERY_MODEL = "custom"
+# Resolution of the precomputed SoC lookup tables
+TABLE_STEP = 0.01
+# Voltage of one "block" that the built-in curves are defined for
+BLOCK_VOLTAGE = 12
+
+# Resting (open circuit) voltage -> SoC curves for one 12 V block, plus the
+# lowest/highest voltage a healthy bank of that chemistry can show (under load/charging)
+BATTERY_MODELS = {
+    "lead_acid": {
+        "curve": [(11.8, 0), (11.9, 10), (12.0, 25), (12.2, 50), (12.4, 75), (12.6, 90), (12.7, 100)],
+        "min_voltage": 10.5,
+        "max_voltage": 14.8,
+    },
+    "agm": {
+        "curve": [(11.8, 0), (11.95, 10), (12.05, 20), (12.15, 30), (12.25, 40), (12.35, 50),
+                  (12.45, 60), (12.55, 70), (12.65, 80), (12.75, 90), (12.85, 100)],
+        "min_voltage": 10.5,
+        "max_voltage": 14.9,
+    },
+    "lifepo4": {
+        "curve": [(10.0, 0), (12.0, 9), (12.5, 14), (12.8, 17), (12.9, 20), (13.0, 30),
+                  (13.1, 40), (13.2, 70), (13.3, 90), (13.4, 99), (13.6, 100)],
+        "min_voltage": 10.0,
+        "max_voltage": 14.6,
+    },
+}
+
+
+class BatteryProfile:
+    """
+    A battery model scaled to one bank voltage, with the SoC curve
+    precomputed into a dense table so lookups are a single index.
+    """
+    def __init__(self, name, curve, min_voltage, max_voltage, step=TABLE_STEP):
+        self.name = name
+        self.curve = sorted(curve)
+        self.min_voltage = min_voltage
+        self.max_voltage = max_voltage
+        self.step = step
+        self.curve_min = self.curve[0][0]
+        self.curve_max = self.curve[-1][0]
+        self.table = self._build_table()
+
+    def _build_table(self):
+        size = int(round((self.curve_max - self.curve_min) / self.step)) + 1
+        table = []
+        segment = 0
+        for i in range(size):
+            voltage = self.curve_min + i * self.step
+            while segment < len(self.curve) - 2 and voltage > self.curve[segment + 1][0]:
+                segment += 1
+            v_low, soc_low = self.curve[segment]
+            v_high, soc_high = self.curve[segment + 1]
+            if v_high == v_low:
+                soc = soc_high
+            else:
+                # Linear interpolation between curve points
+                soc = soc_low + (soc_high - soc_low) * (voltage - v_low) / (v_high - v_low)
+            table.append(int(round(max(0, min(100, soc)))))
+        return table
+
+    def soc(self, voltage, current=0.0, internal_resistance=0.0):
+        """
+        Return SoC (0-100) for a terminal voltage. With internal_resistance (ohms)
+        the IR drop is removed first: positive current is discharge, so the
+        resting voltage is higher than measured, and lower while charging.
+        """
+        if internal_resistance:
+            voltage = voltage + current * internal_resistance
+        if voltage <= self.curve_min:
+            return self.table[0]
+        if voltage >= self.curve_max:
+            return self.table[-1]
+        return self.table[int(round((voltage - self.curve_min) / self.step))]
+
+    def is_valid(self, voltage):
+        return self.min_voltage <= voltage <= self.max_voltage
+
+    def clamp(self, voltage):
+        return max(self.min_voltage, min(self.max_voltage, voltage))
+
+
+def register_battery_model(name, curve, min_voltage, max_voltage):
+    """Add or replace a built-in model; curve is [(volts, soc), ...] for a 12 V block"""
+    BATTERY_MODELS[name] = {"curve": list(curve), "min_voltage": min_voltage, "max_voltage": max_voltage}
+    _clear_cache()
+
+
+def load_curve_file(path):
+    """
+    Read a custom curve from CSV with voltage,soc rows for the whole bank.
+    Optional "min,<volts>" and "max,<volts>" rows set the valid voltage range
+    (default: the curve's own range). A header row and # comments are ignored.
+    Returns (curve, min_voltage, max_voltage).
+    """
+    curve = []
+    limits = {}
+    with open(path, "r", newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].strip().startswith("#"):
+                continue
+            label = row[0].strip().lower()
+            try:
+                if label in ("min", "max"):
+                    limits[label] = float(row[1])
+                else:
+                    curve.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                continue  # Header row
+    if len(curve) < 2:
+        raise ValueError(f"Battery curve {path} needs at least two voltage,soc rows")
+    voltages = [v for v, _ in curve]
+    return curve, limits.get("min", min(voltages)), limits.get("max", max(voltages))
+
+
+def bank_blocks(rating):
+    """Number of 12 V blocks in a bank, e.g. 24 V -> 2, 48 V -> 4"""
+    try:
+        return max(1, int(round(float(rating) / BLOCK_VOLTAGE)))
+    except (TypeError, ValueError):
+        return 1
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def _clear_cache():
+    with _profiles_lock:
+        _profiles.clear()
+
+
+def get_battery_profile(model=None, rating=BLOCK_VOLTAGE, curve_file=None):
+    """
+    Return the cached BatteryProfile for a model and bank rating.
+    A curve_file always selects the custom model. Unknown models fall back to lead-acid.
+    """
+    model = model or DEFAULT_BATTERY_MODEL
+    if curve_file:
+        model = CUSTOM_BATTERY_MODEL
+    blocks = bank_blocks(rating)
+    key = (model, blocks, curve_file)
+    profile = _profiles.get(key)
+    if profile is not None:
+        return profile
+
+    with _profiles_lock:
+        profile = _profiles.get(key)
+        if profile is not None:
+            return profile
+        if model == CUSTOM_BATTERY_MODEL:
+            try:
+                curve, min_voltage, max_voltage = load_curve_file(curve_file)
+                profile = BatteryProfile(f"{CUSTOM_BATTERY_MODEL}:{curve_file}", curve, min_voltage, max_voltage)
+            except Exception as e:
+                logger.error(f"Failed to load battery curve {curve_file}: {e}. Using {DEFAULT_BATTERY_MODEL}.")
+                model = DEFAULT_BATTERY_MODEL
+        if profile is None:
+            if model not in BATTERY_MODELS:
+                logger.warning(f"Unknown battery model '{model}', using {DEFAULT_BATTERY_MODEL}.")
+                model = DEFAULT_BATTERY_MODEL
+            definition = BATTERY_MODELS[model]
+            curve = [(v * blocks, soc) for v, soc in definition["curve"]]
+            profile = BatteryProfile(model, curve, definition["min_voltage"] * blocks,
+                                     definition["max_voltage"] * blocks)
+        _profiles[key] = profile
+        logger.info(f"Battery profile {profile.name} built for {blocks * BLOCK_VOLTAGE}V ({len(profile.table)} points)")
+        return profile
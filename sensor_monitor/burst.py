@@ -0,0 +1,257 @@
+# sensor_monitor/burst.py
+import sys
+import io
+import math
+import time
+import struct
+import datetime
+import threading
+from array import array
+try:
+    from sensor_monitor.logger import logger
+    from sensor_monitor.ina219 import (decode_bus_voltage, CONFIG_REGISTER, BUS_VOLTAGE_REGISTER,
+                                       CURRENT_REGISTER, MODES)
+    from sensor_monitor.sensor import CURRENT_LSB
+    from sensor_monitor.i2c_bus import PRIORITY_BURST
+    from sensor_monitor.downsample import downsample, series_cache
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+DEFAULT_BURST_DURATION = 5
+MAX_BURST_DURATION = 60
+DEFAULT_BURST_RATE = 500
+MAX_BURST_RATE = 2000
+# Points returned by default after decimation (0 = full resolution)
+DEFAULT_BURST_POINTS = 2000
+# pigpio i2c_zip commands: write 1 byte (register pointer), read 2 bytes, end
+ZIP_WRITE = 7
+ZIP_READ = 6
+ZIP_END = 0
+BURST_ZIP = [ZIP_WRITE, 1, BUS_VOLTAGE_REGISTER, ZIP_READ, 2,
+             ZIP_WRITE, 1, CURRENT_REGISTER, ZIP_READ, 2, ZIP_END]
+# Binary download: little-endian float32 records
+BINARY_RECORD = struct.Struct("<ffff")
+CSV_COLUMNS = ("time_s", "voltage", "current", "power", "power_min", "power_max")
+
+STATE_IDLE = "idle"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_ERROR = "error"
+
+
+def channel_stats(values):
+    """Peak, RMS and ripple for one channel of a capture"""
+    if not values:
+        return {}
+    n = len(values)
+    low = min(values)
+    high = max(values)
+    mean = math.fsum(values) / n
+    rms = math.sqrt(math.fsum(v * v for v in values) / n)
+    ripple = high - low
+    return {
+        "min": round(low, 4),
+        "max": round(high, 4),
+        "peak": round(max(abs(low), abs(high)), 4),
+        "mean": round(mean, 4),
+        "rms": round(rms, 4),
+        "ripple": round(ripple, 4),
+        "ripple_pct": round(ripple / abs(mean) * 100, 2) if mean else None,
+    }
+
+
+def decimate(times, voltages, currents, points):
+    """
+    Reduce a capture to about `points` rows, chosen by LTTB on power so the
+    shape of the trace is kept. Each row carries the power min/max of the
+    bucket it stands for so short spikes survive. Returns rows of CSV_COLUMNS.
+    """
+    powers = [v * c for v, c in zip(voltages, currents)]
+    indices, lows, highs = downsample(times, powers, points)
+    return [(times[i], voltages[i], currents[i], powers[i], low, high)
+            for i, low, high in zip(indices, lows, highs)]
+
+
+class BurstCapture:
+    """
+    Samples one sensor as fast as the bus allows (up to `rate` Hz) for
+    `duration` seconds into preallocated buffers. Local sensors are read
+    through adafruit_ina219; remote sensors read the bus voltage and current
+    registers in one pigpio i2c_zip round trip per sample.
+    """
+    def __init__(self, sensor, duration=DEFAULT_BURST_DURATION, rate=DEFAULT_BURST_RATE):
+        self.sensor = sensor
+        self.duration = max(0.1, min(float(duration), MAX_BURST_DURATION))
+        self.rate = max(1, min(int(rate), MAX_BURST_RATE))
+        self.size = int(math.ceil(self.duration * self.rate))
+        self.times = array("f", bytes(4 * self.size))
+        self.voltages = array("f", bytes(4 * self.size))
+        self.currents = array("f", bytes(4 * self.size))
+        self.count = 0
+        self.errors = 0
+        self.state = STATE_IDLE
+        self.error = None
+        self.started = None
+        self.elapsed = 0.0
+        self.stats = None
+        self.thread = None
+
+    def start(self):
+        self.state = STATE_RUNNING
+        self.started = datetime.datetime.now()
+        self.thread = threading.Thread(target=self.run, name=f"burst-{self.sensor.name}", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        sensor = self.sensor
+        sensor.burst_active = True
+        try:
+            if sensor.pi and sensor.handle is not None:
+                read = self.read_remote
+            elif sensor.ina and sensor.bus is not None:
+                read = self.read_local
+            else:
+                raise RuntimeError(f"{sensor.name} has no device connection")
+            self.set_continuous()
+            logger.info(f"Burst capture on {sensor.name}: {self.duration}s at up to {self.rate} Hz")
+
+            period = 1.0 / self.rate
+            start = time.perf_counter()
+            deadline = start + self.duration
+            next_sample = start
+            while self.count < self.size:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now < next_sample:
+                    time.sleep(next_sample - now)
+                next_sample += period
+                try:
+                    voltage, current = read()
+                except Exception as e:
+                    self.errors += 1
+                    if self.errors > 10 and self.errors > self.count:
+                        raise RuntimeError(f"Too many read errors: {e}")
+                    continue
+                self.times[self.count] = time.perf_counter() - start
+                self.voltages[self.count] = voltage
+                self.currents[self.count] = current
+                self.count += 1
+            self.elapsed = time.perf_counter() - start
+            self.stats = self.summary()
+            self.state = STATE_DONE
+            logger.info(f"Burst capture on {sensor.name} finished: {self.count} samples "
+                        f"({self.stats['sample_rate']} Hz, {self.errors} errors)")
+        except Exception as e:
+            self.state = STATE_ERROR
+            self.error = str(e)
+            logger.error(f"Burst capture on {sensor.name} failed: {e}")
+        finally:
+            sensor.configure_adc()  # Restore a triggered-mode configuration
+            sensor.burst_active = False
+
+    def set_continuous(self):
+        """Triggered mode only converts on request, so run continuously for the capture"""
+        adc = self.sensor.adc
+        if adc is None or not adc.triggered:
+            return
+        if self.sensor.pi:
+            value = (adc.register_value() & ~0x7) | MODES["continuous"]
+            self.sensor.write_register_16(CONFIG_REGISTER, value)
+        else:
+            value = (adc.register_value() & ~0x7) | MODES["continuous"]
+            self.sensor.bus.write_register(self.sensor.address, CONFIG_REGISTER, value, PRIORITY_BURST)
+
+    def read_remote(self):
+        count, data = self.sensor.pi.i2c_zip(self.sensor.handle, BURST_ZIP)
+        if count < 4:
+            raise IOError(f"i2c_zip returned {count}")
+        voltage, _, _ = decode_bus_voltage((data[0] << 8) | data[1])
+        raw_current = (data[2] << 8) | data[3]
+        if raw_current & 0x8000:
+            raw_current -= 0x10000
+        return voltage, raw_current * CURRENT_LSB
+
+    def read_local(self):
+        # Queued behind other sensors' polls, so a capture never delays them
+        bus_raw, raw_current = self.sensor.bus.read_registers(
+            self.sensor.address, (BUS_VOLTAGE_REGISTER, CURRENT_REGISTER), PRIORITY_BURST)
+        voltage, _, _ = decode_bus_voltage(bus_raw)
+        if raw_current & 0x8000:
+            raw_current -= 0x10000
+        return voltage, raw_current * self.sensor.local_lsbs()[0]
+
+    def summary(self):
+        n = self.count
+        times = self.times[:n]
+        voltages = self.voltages[:n]
+        currents = self.currents[:n]
+        powers = [v * i for v, i in zip(voltages, currents)]
+        return {
+            "sensor": self.sensor.name,
+            "samples": n,
+            "errors": self.errors,
+            "duration": round(self.elapsed, 3),
+            "sample_rate": round(n / self.elapsed, 1) if self.elapsed else 0,
+            "conversion_time": self.sensor.adc.conversion_time() if self.sensor.adc else None,
+            "started": self.started.isoformat(timespec="seconds"),
+            "voltage": channel_stats(voltages),
+            "current": channel_stats(currents),
+            "power": channel_stats(powers),
+            "time_span": round(times[-1] - times[0], 4) if n else 0,
+        }
+
+    def status(self):
+        status = {"state": self.state, "sensor": self.sensor.name, "duration": self.duration,
+                  "rate": self.rate, "samples": self.count}
+        if self.state == STATE_RUNNING and self.started:
+            elapsed = (datetime.datetime.now() - self.started).total_seconds()
+            status["progress"] = round(min(1.0, elapsed / self.duration) * 100)
+        if self.stats:
+            status["summary"] = self.stats
+        if self.error:
+            status["error"] = self.error
+        return status
+
+    def rows(self, points=DEFAULT_BURST_POINTS):
+        n = self.count
+        # CSV and binary downloads of the same capture share one decimation
+        key = (self.sensor.name, f"burst@{self.started.isoformat()}", points)
+        return series_cache.get(key, n, lambda: decimate(self.times[:n], self.voltages[:n], self.currents[:n], points))
+
+    def to_csv(self, points=DEFAULT_BURST_POINTS):
+        output = io.StringIO()
+        output.write(",".join(CSV_COLUMNS) + "\n")
+        for row in self.rows(points):
+            output.write(",".join(f"{value:.6g}" for value in row) + "\n")
+        return output.getvalue().encode("utf-8")
+
+    def to_binary(self, points=DEFAULT_BURST_POINTS):
+        """float32 records of time_s, voltage, current, power"""
+        return b"".join(BINARY_RECORD.pack(*row[:4]) for row in self.rows(points))
+
+
+class BurstRecorder:
+    """Runs at most one burst capture at a time and keeps the last result"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.capture = None
+
+    def start(self, sensor, duration=DEFAULT_BURST_DURATION, rate=DEFAULT_BURST_RATE):
+        with self.lock:
+            if self.capture and self.capture.state == STATE_RUNNING:
+                raise RuntimeError(f"A burst capture on {self.capture.sensor.name} is already running")
+            self.capture = BurstCapture(sensor, duration, rate)
+            self.capture.start()
+            return self.capture
+
+    def status(self):
+        if self.capture is None:
+            return {"state": STATE_IDLE}
+        return self.capture.status()
+
+    def result(self):
+        if self.capture is None or self.capture.state != STATE_DONE:
+            return None
+        return self.capture
@@ -0,0 +1,86 @@
+# sensor_monitor/config_apply.py
+import sys
+import json
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Settings that can only take effect when the service restarts
+RESTART_KEYS = ("webserver_host", "webserver_port")
+# Settings grouped by the part of the running system they reconfigure
+POLLING_KEYS = ("poll_intervals", "poll_mode", "adaptive_poll", "location")
+MQTT_KEYS = ("mqtt_broker", "mqtt_port", "mqtt_binary", "mqtt_queue_mb")
+GROUP_KEYS = ("groups",)
+PEER_KEYS = ("peers",)
+ALERT_KEYS = ("alerts", "alert_webhook")
+ARCHIVE_KEYS = ("archive", "archive_dir")
+HEALTH_KEYS = ("health",)
+DEVICE_CONNECTION_KEYS = ("remote_gpio", "gpio_address")
+# Sensor fields that need the sensor to reopen its I2C connection
+SENSOR_BIND_KEYS = ("address", "device_id")
+
+
+def _same(a, b):
+    # The web form sends numbers as strings, so "5000" and 5000 count as the same value
+    if not isinstance(a, (dict, list)) and not isinstance(b, (dict, list)):
+        return str(a) == str(b)
+    return json.dumps(a, sort_keys=True, default=str) == json.dumps(b, sort_keys=True, default=str)
+
+
+def changed_keys(old, new):
+    """Top-level keys whose value differs between two config dicts"""
+    return sorted(key for key in set(old) | set(new) if not _same(old.get(key), new.get(key)))
+
+
+def diff_by_key(old_items, new_items, key):
+    """
+    Match two lists of dicts on `key`.
+    Returns (added, removed, changed) where changed is a list of (old, new) pairs.
+    """
+    old_map = {str(item.get(key)): item for item in old_items or []}
+    new_map = {str(item.get(key)): item for item in new_items or []}
+    added = [new_map[k] for k in new_map if k not in old_map]
+    removed = [old_map[k] for k in old_map if k not in new_map]
+    changed = [(old_map[k], new_map[k]) for k in new_map if k in old_map and not _same(old_map[k], new_map[k])]
+    return added, removed, changed
+
+
+def device_needs_reconnect(old, new):
+    """True if a device's connection settings changed (not just its name)"""
+    return any(not _same(old.get(key), new.get(key)) for key in DEVICE_CONNECTION_KEYS)
+
+
+class ConfigChange:
+    """The difference between two configs, split into what can be applied live and what needs a restart"""
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.keys = changed_keys(old, new)
+        self.restart_required = [key for key in self.keys if key in RESTART_KEYS]
+        self.live = [key for key in self.keys if key not in RESTART_KEYS]
+
+    def touches(self, keys):
+        return any(key in self.keys for key in keys)
+
+    def devices(self):
+        return diff_by_key(self.old.get("devices"), self.new.get("devices"), "id")
+
+    def summary(self):
+        return {"applied": self.live, "restart_required": self.restart_required}
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def __repr__(self):
+        return f"ConfigChange(live={self.live}, restart_required={self.restart_required})"
+
+
+def log_change(change):
+    if not change:
+        logger.info("Configuration unchanged")
+        return
+    logger.info(f"Configuration changed: {', '.join(change.keys)}")
+    if change.restart_required:
+        logger.warning(f"Restart required to apply: {', '.join(change.restart_required)}")
@@ -6,6 +6,7 @@ try:
     from pathlib import Path
     from datetime import datetime
     from sensor_monitor.logger import logger
+    from sensor_monitor.storage import JsonStore, atomic_write_json
 except Exception as ex:
     print("Error" + str(ex))
     sys.exit()
@@ -25,15 +26,25 @@ VERSION = "1.0.1"
 
 class ConfigManager:
     def __init__(self):       
-        self.config_data = self.load_config()
+        # In-memory copies of config.json and sensors.json, written back atomically
+        self.config_store = JsonStore(CONFIG_FILE)
+        self.sensor_store = JsonStore(SENSOR_FILE, indent=None)
+        self.load_config()
         logger.set_log_size(int(self.config_data.get("max_log", 10)))
 
+    @property
+    def config_data(self):
+        return self.config_store.data
+
+    @config_data.setter
+    def config_data(self, value):
+        self.config_store.set(value)
+
     def load_config(self):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                logger.info("Config file opened Successfully.")
-                return json.load(f)
-        except FileNotFoundError:
+        if self.config_store.data is not None:
+            logger.info("Config file opened Successfully.")
+            return self.config_store.data
+        else:
             logger.warning("Config file not found, creating default config.")
             default_config = {
                 "devices": [
@@ -58,12 +69,12 @@ class ConfigManager:
                 "remote_gpio": 0,
                 "gpio_address": "localhost",           
                 }
-            try:
-                with open(CONFIG_FILE, "w") as f:
-                    json.dump(default_config, f, indent=4)
+            if Path(CONFIG_FILE).exists():
+                # Unreadable rather than missing: run on defaults but leave the file for inspection
+                self.config_store.data = default_config
+            else:
+                self.config_store.save_now(default_config)
                 logger.info(f"Created new config file at {CONFIG_FILE}.")
-            except Exception as e:
-                logger.error(f"Failed to create config file: {e}")
             
             return default_config
         
@@ -102,46 +113,37 @@ class ConfigManager:
             "mqtt_port": config['mqtt_port'],
             "webserver_host": config['webserver_host'],
             "webserver_port": config['webserver_port'],
-            "remote_gpio": int(config['remote_gpio']),
-            "gpio_address": config['gpio_address']
+            "remote_gpio": int(config.get('remote_gpio', self.config_data.get('remote_gpio', 0))),
+            "gpio_address": config.get('gpio_address', self.config_data.get('gpio_address', "localhost"))
         }
+        # Keep settings the web form does not edit (e.g. encoding options)
+        for key, value in self.config_data.items():
+            new_config.setdefault(key, value)
         # Save the new config to the file
         logger.info(f"Saving new config: {new_config}")
-        try:
-            with open(CONFIG_FILE, "w") as f:
-                json.dump(new_config, f, indent=4)
-            logger.info(f"Saved config file at {CONFIG_FILE}.")
-            self.config_data = new_config
-        except Exception as e:
-            logger.error(f"Failed to save config: {e}")
+        self.write_config(new_config)
+
+    def write_config(self, new_config):
+        # Applied in memory now; the file is written behind (see storage.JsonStore)
+        self.config_data = new_config
 
     def backup_config(self, program_config, sensor_config):
         BACKUP_DIR.mkdir(exist_ok=True)  # Create directory if it doesn't exist
         backup_data = {}
         # Add program configuration if requested
+        # Back up the in-memory state, which includes edits not yet written out
         if program_config:
-            try:
-                with open("config.json", "r") as f:
-                    backup_data["config"] = json.load(f)
-                    logger.info("Added config.json to backup")
-            except FileNotFoundError:
-                logger.info("config.json not found.")
-                backup_data["config"] = None
+            backup_data["config"] = self.config_store.get()
+            logger.info("Added config.json to backup")
         # Add sensor configuration if requested
         if sensor_config:
-            try:
-                with open("sensors.json", "r") as f:
-                    backup_data["sensors"] = json.load(f)
-                    logger.info("Added sensor.json to backup")
-            except FileNotFoundError:
-                logger.info("sensors.json not found.")
-                backup_data["sensors"] = None
+            backup_data["sensors"] = self.sensor_store.get()
+            logger.info("Added sensor.json to backup")
         # Create a timestamped backup file
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         filepath = BACKUP_DIR / f"backup_{timestamp}.json"
 
-        with open(filepath, "w") as f:
-            json.dump(backup_data, f, indent=2)
+        atomic_write_json(filepath, backup_data, indent=2)
         logger.info(f"Backup saved to {filepath}")
         return str(filepath)
 		
@@ -153,14 +155,12 @@ class ConfigManager:
                 backup = json.load(f)
             # Restore the configuration if requested
             if restore_config and "config" in backup and backup["config"]:
-                with open(CONFIG_FILE , "w") as f:
-                    json.dump(backup["config"], f, indent=2)
-                    logger.info("config.json restored.")
+                self.config_store.save_now(backup["config"])
+                logger.info("config.json restored.")
             # Restore the sensors if requested
             if restore_sensors and "sensors" in backup and backup["sensors"]:
-                with open(SENSOR_FILE , "w") as f:
-                    json.dump(backup["sensors"], f, indent=2)
-                    logger.info("sensors.json restored.")
+                self.sensor_store.save_now(backup["sensors"])
+                logger.info("sensors.json restored.")
             logger.info("Backup restored successfully.")
         else:
             logger.error(f"Backup file {backup_file} does not exist in {BACKUP_DIR}.")
@@ -185,6 +185,7 @@ class ConfigManager:
             raise FileNotFoundError(f"Backup file {filename} does not exist.")
         
     def reload_config (self):
-        self.config_data = self.load_config()
+        self.config_store.reload()
+        self.load_config()
         logger.info("Configuration reloaded from disk.")
 
@@ -0,0 +1,96 @@
+# sensor_monitor/discovery.py
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from sensor_monitor.logger import logger
+    from sensor_monitor.ina219 import INA_ADDRESSES, CONFIG_REGISTER, DIE_ID_REGISTER, identify_chip
+    from sensor_monitor.i2c_bus import PRIORITY_SCAN
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+I2C_BUS = 1
+# How long a local scan waits for other users of the bus before giving up
+I2C_LOCK_TIMEOUT = 2.0
+# pigpio i2c_zip commands
+ZIP_END = 0
+ZIP_ADDRESS = 4
+ZIP_READ = 6
+ZIP_WRITE = 7
+
+
+def probe_zip(address):
+    """One i2c_zip request that reads the config and die ID registers of one address"""
+    return [ZIP_ADDRESS, address,
+            ZIP_WRITE, 1, CONFIG_REGISTER, ZIP_READ, 2,
+            ZIP_WRITE, 1, DIE_ID_REGISTER, ZIP_READ, 2,
+            ZIP_END]
+
+
+def probe_remote(pi, name="remote", addresses=INA_ADDRESSES, bus=I2C_BUS):
+    """
+    Probe addresses on a pigpio host. A single handle is opened and each
+    address is checked with one i2c_zip round trip that switches the target
+    address and reads both fingerprint registers. Returns {address: chip}.
+    """
+    found = {}
+    addresses = list(addresses)
+    try:
+        handle = pi.i2c_open(bus, addresses[0])
+    except Exception as e:
+        logger.error(f"{name}: Could not open I2C bus {bus} for discovery: {e}")
+        return found
+    try:
+        for address in addresses:
+            try:
+                count, data = pi.i2c_zip(handle, probe_zip(address))
+            except Exception:
+                continue  # No ACK
+            if count < 4:
+                continue
+            config = (data[0] << 8) | data[1]
+            die_id = (data[2] << 8) | data[3]
+            found[address] = identify_chip(config, die_id)
+            logger.info(f"{name}: {found[address]} detected at {hex(address)}")
+    finally:
+        try:
+            pi.i2c_close(handle)
+        except Exception:
+            pass
+    return found
+
+
+def probe_local(bus, name="local", addresses=INA_ADDRESSES, timeout=I2C_LOCK_TIMEOUT):
+    """
+    Scan the local bus and fingerprint INA-range addresses. Runs at scan
+    priority: the address sweep is one transaction and each fingerprint
+    another, so sensor polls queued in between go first.
+    """
+    found = {}
+    try:
+        with bus.transaction(PRIORITY_SCAN, timeout=timeout) as i2c:
+            present = [address for address in i2c.scan() if address in addresses]
+    except TimeoutError:
+        logger.warning(f"{name}: I2C bus busy, discovery skipped")
+        return found
+    for address in present:
+        try:
+            config, die_id = bus.read_registers(address, (CONFIG_REGISTER, DIE_ID_REGISTER), PRIORITY_SCAN)
+        except Exception:
+            config = die_id = None
+        found[address] = identify_chip(config, die_id)
+        logger.info(f"{name}: {found[address]} detected at {hex(address)}")
+    return found
+
+
+def discover(devices):
+    """Scan every device in parallel. Returns {device_id: {address: chip}}"""
+    devices = [d for d in devices if d.connected]
+    if not devices:
+        return {}
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix="discovery") as pool:
+        results = dict(zip([d.id for d in devices], pool.map(lambda d: d.detect_sensors(), devices)))
+    logger.info(f"Discovery of {len(devices)} device(s) finished in {time.monotonic() - start:.2f}s")
+    return results
@@ -0,0 +1,167 @@
+# sensor_monitor/downsample.py
+import sys
+import math
+import threading
+from collections import OrderedDict
+try:
+    from sensor_monitor.logger import logger
+    from sensor_monitor.backends import load
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Downsampled series kept for repeat requests, keyed by (sensor, range, width)
+CACHE_SIZE = 128
+# LTTB needs the first point, the last point and at least one bucket
+MIN_POINTS = 3
+
+_numpy = None  # The module once imported, False if it is not installed
+
+
+def numpy():
+    """NumPy if installed (imported on first use), else None"""
+    global _numpy
+    if _numpy is None:
+        try:
+            _numpy = load("numpy")
+        except RuntimeError:
+            logger.warning("NumPy not installed, downsampling in pure Python")
+            _numpy = False
+    return _numpy or None
+
+
+def bucket_edges(n, points):
+    """Start index of each LTTB bucket between the fixed first and last points, plus n - 1"""
+    every = (n - 2) / (points - 2)
+    return [1 + int(math.floor(i * every)) for i in range(points - 2)] + [n - 1]
+
+
+def downsample(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets: pick `points` samples of y(x) that keep
+    the visual shape of the series. Returns (indices, mins, maxs) where
+    mins/maxs are the y envelope of the bucket each kept sample stands for,
+    so spikes LTTB skips still show. With points = 0 or n <= points every
+    sample is kept; fewer than MIN_POINTS counts as MIN_POINTS.
+    """
+    n = len(y)
+    if points:
+        points = max(points, MIN_POINTS)
+    if not points or n <= points:
+        return list(range(n)), list(y), list(y)
+    edges = bucket_edges(n, points)
+    np = numpy()
+    if np is not None:
+        return _downsample_numpy(np, x, y, n, points, edges)
+    return _downsample_python(x, y, n, points, edges)
+
+
+def _downsample_numpy(np, x, y, n, points, edges):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    starts = np.asarray(edges[:-1])
+    counts = np.diff(np.asarray(edges))
+    # Per-bucket averages and envelopes in one pass each (the last point is its own bucket)
+    avg_x = np.append(np.add.reduceat(x[:n - 1], starts) / counts, x[n - 1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], starts) / counts, y[n - 1])
+    mins = np.minimum.reduceat(y[:n - 1], starts)
+    maxs = np.maximum.reduceat(y[:n - 1], starts)
+
+    indices = [0]
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area (previous pick, candidate, next bucket's average) for the whole bucket
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        indices.append(a)
+    indices.append(n - 1)
+    return (indices,
+            [float(y[0])] + mins.tolist() + [float(y[n - 1])],
+            [float(y[0])] + maxs.tolist() + [float(y[n - 1])])
+
+
+def _downsample_python(x, y, n, points, edges):
+    indices = [0]
+    mins = [y[0]]
+    maxs = [y[0]]
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        cx = math.fsum(x[nlo:nhi]) / (nhi - nlo)
+        cy = math.fsum(y[nlo:nhi]) / (nhi - nlo)
+        ax, ay = x[a], y[a]
+        best = lo
+        best_area = -1.0
+        for j in range(lo, hi):
+            area = abs((ax - cx) * (y[j] - ay) - (ax - x[j]) * (cy - ay))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        indices.append(a)
+        bucket = y[lo:hi]
+        mins.append(min(bucket))
+        maxs.append(max(bucket))
+    indices.append(n - 1)
+    mins.append(y[n - 1])
+    maxs.append(y[n - 1])
+    return indices, mins, maxs
+
+
+def downsample_readings(readings, points, key="power"):
+    """
+    Reduce a list of reading dicts to about `points` entries, chosen by LTTB
+    on `key`. Kept readings gain `<key>_min`/`<key>_max` for their bucket.
+    """
+    if not points or len(readings) <= points:
+        return readings
+    x = [r.get("ts", i) for i, r in enumerate(readings)]
+    y = [r.get(key) or 0 for r in readings]
+    indices, mins, maxs = downsample(x, y, points)
+    return [dict(readings[i], **{f"{key}_min": low, f"{key}_max": high})
+            for i, low, high in zip(indices, mins, maxs)]
+
+
+def readings_version(readings):
+    """Changes whenever a reading is added or dropped"""
+    if not readings:
+        return (0, None)
+    return (len(readings), readings[-1].get("ts", readings[-1].get("time_stamp")))
+
+
+class SeriesCache:
+    """
+    Small LRU of downsampled series. Each entry remembers the version of the
+    data it was built from, so a chart that is viewed again before the next
+    reading costs nothing, and a new reading rebuilds it once.
+    """
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (version, result)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, build):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        result = build()
+        with self.lock:
+            self.entries[key] = (version, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+series_cache = SeriesCache()
@@ -0,0 +1,71 @@
+# sensor_monitor/encoding.py
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# First byte of every compact frame says how the rest is packed
+FRAME_MSGPACK = 0
+FRAME_MSGPACK_DEFLATE = 1
+# Payloads smaller than this are not worth deflating
+COMPRESSION_THRESHOLD = 1024
+# Marker for readings lists packed as columns
+COLUMNS_KEY = "_cols"
+ROWS_KEY = "_rows"
+
+
+def compact_available():
+    return msgpack is not None
+
+
+def pack_readings(readings):
+    """
+    Pack a list of reading dicts as column names plus value rows so the
+    key names are sent once instead of once per reading.
+    """
+    if not readings:
+        return []
+    columns = list(readings[0].keys())
+    rows = [[reading.get(column) for column in columns] for reading in readings]
+    return {COLUMNS_KEY: columns, ROWS_KEY: rows}
+
+
+def compact_sensor_data(data):
+    """Return a copy of a sensor_update payload with readings packed as columns"""
+    compact = {}
+    for name, entry in data.items():
+        sensor = entry.get("data") if isinstance(entry, dict) else None
+        if isinstance(sensor, dict) and isinstance(sensor.get("readings"), list):
+            sensor = dict(sensor)
+            sensor["readings"] = pack_readings(sensor["readings"])
+            entry = dict(entry)
+            entry["data"] = sensor
+        compact[name] = entry
+    return compact
+
+
+def encode_compact(data, threshold=COMPRESSION_THRESHOLD):
+    """
+    Encode a payload as a compact binary frame: one flag byte followed by
+    MessagePack, deflated (zlib) when the packed payload exceeds threshold.
+    """
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    packed = msgpack.packb(data, use_bin_type=True)
+    if threshold is not None and len(packed) >= threshold:
+        return bytes([FRAME_MSGPACK_DEFLATE]) + zlib.compress(packed, 6)
+    return bytes([FRAME_MSGPACK]) + packed
+
+
+def decode_compact(frame):
+    """Decode a frame produced by encode_compact (readings stay column packed)"""
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    flag, body = frame[0], frame[1:]
+    if flag == FRAME_MSGPACK_DEFLATE:
+        body = zlib.decompress(body)
+    elif flag != FRAME_MSGPACK:
+        raise ValueError(f"Unknown compact frame type {flag}")
+    return msgpack.unpackb(body, raw=False)
@@ -0,0 +1,228 @@
+# sensor_monitor/federation.py
+import sys
+import time
+import threading
+from collections import deque
+try:
+    from sensor_monitor.logger import logger
+    from sensor_monitor.backends import load
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Separates the peer name from its sensor/device names in the merged view
+NAMESPACE_SEPARATOR = "/"
+# A peer that has not sent an update for this long is shown stale and left out of the totals
+PEER_STALE_AFTER = 30
+# Peers only push on a new reading, which can be a minute apart with adaptive polling,
+# so a snapshot is also requested this often and staleness never depends on poll cadence
+PEER_REFRESH_INTERVAL = 10
+CONNECT_TIMEOUT = 10
+RETRY_DELAYS = (2, 5, 10, 30, 60)
+# Upper bound on sensors taken from one peer, so a broken peer cannot grow our payload without limit
+MAX_PEER_SENSORS = 256
+PEER_SYSTEM_KEYS = ("totals", "groups", "devices", "system_status", "peers", "alerts")
+
+
+def namespaced(peer, name):
+    return f"{peer}{NAMESPACE_SEPARATOR}{name}"
+
+
+class PeerLink:
+    """
+    Socket.IO client for one peer instance, on its own thread. Updates land in
+    a one-slot mailbox that always holds the newest snapshot: a slow
+    aggregator drops intermediate frames (counted in `dropped`) instead of
+    queueing them, and a slow or dead peer never blocks the aggregator.
+    """
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.mailbox = deque(maxlen=1)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.client = None
+        self.connected = False
+        self.last_update = 0
+        self.received = 0
+        self.dropped = 0
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"peer-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        client = self.client
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def run(self):
+        attempt = 0
+        while not self.stopped.is_set():
+            try:
+                socketio = load("socketio")
+                # Reconnects are driven by this loop so the backoff is the same for every failure
+                client = socketio.Client(reconnection=False)
+                client.on("connect", self.on_connect)
+                client.on("disconnect", self.on_disconnect)
+                client.on("sensor_update", self.on_update)
+                self.client = client
+                client.connect(self.url, wait_timeout=CONNECT_TIMEOUT)
+                client.emit("subscribe", {})
+                attempt = 0
+                while client.connected and not self.stopped.wait(PEER_REFRESH_INTERVAL):
+                    client.emit("sensor_update_request")
+            except Exception as e:
+                self.error = str(e)
+                if attempt == 0:
+                    logger.warning(f"Peer {self.name}: connection to {self.url} failed: {e}")
+            finally:
+                self.connected = False
+                self.client = None
+            delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)]
+            attempt += 1
+            self.stopped.wait(delay)
+
+    def on_connect(self):
+        self.connected = True
+        self.error = None
+        logger.info(f"Peer {self.name}: connected to {self.url}")
+
+    def on_disconnect(self, *args):
+        self.connected = False
+        logger.warning(f"Peer {self.name}: disconnected")
+
+    def on_update(self, data):
+        if not isinstance(data, dict):
+            return
+        with self.lock:
+            if self.mailbox:
+                self.dropped += 1  # The aggregator has not taken the previous snapshot yet
+            self.mailbox.append(data)
+            self.received += 1
+            self.last_update = time.time()
+
+    def take(self):
+        """The newest snapshot since the last call, or None (never blocks on the network)"""
+        with self.lock:
+            return self.mailbox.popleft() if self.mailbox else None
+
+    def is_stale(self, now):
+        return not self.connected or now - self.last_update > PEER_STALE_AFTER
+
+    def status(self, now):
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "stale": self.is_stale(now),
+            "last_update": self.last_update or None,
+            "received": self.received,
+            "dropped": self.dropped,
+            "error": self.error
+        }
+
+
+class Federation:
+    """
+    Aggregator side of multi-instance monitoring. Each peer's sensors and
+    devices are merged into our sensor_update under "<peer>/<name>", and
+    their readings feed the TotalsTree so totals (and groups naming
+    "<peer>/<sensor>") cover every instance.
+    """
+    def __init__(self, peers=None):
+        self.links = {}
+        self.views = {}  # peer -> (sensor entries, device entries) from its last snapshot
+        self.in_totals = {}  # peer -> sensor names currently counted in the totals
+        self.configure(peers or [], start=False)
+
+    def configure(self, peers, start=True):
+        """Add, remove or re-point peer links to match config.json "peers" """
+        wanted = {}
+        for peer in peers:
+            name = str(peer.get("name") or "").strip()
+            url = str(peer.get("url") or "").strip()
+            if not name or not url or NAMESPACE_SEPARATOR in name:
+                logger.warning(f"Ignoring peer {peer}: needs a name (without '{NAMESPACE_SEPARATOR}') and a url")
+                continue
+            wanted[name] = url
+        for name in list(self.links):
+            if wanted.get(name) != self.links[name].url:
+                self.links.pop(name).stop()
+                self.views.pop(name, None)
+                logger.info(f"Peer {name} removed")
+        for name, url in wanted.items():
+            if name not in self.links:
+                self.links[name] = PeerLink(name, url)
+                logger.info(f"Peer {name} added at {url}")
+                if start:
+                    self.links[name].start()
+
+    def start(self):
+        for link in self.links.values():
+            if link.thread is None:
+                link.start()
+
+    def stop(self):
+        for link in self.links.values():
+            link.stop()
+
+    def sensor_names(self):
+        return [name for names in self.in_totals.values() for name in names]
+
+    def namespace(self, peer, snapshot):
+        """Rename a peer snapshot's sensors and devices into our view"""
+        sensors = {}
+        for name, entry in snapshot.items():
+            # Skip system entries, and sensors the peer itself federated (no loops)
+            if name in PEER_SYSTEM_KEYS or not isinstance(entry, dict) or "peer" in entry:
+                continue
+            if "type" not in entry or "data" not in entry:
+                continue
+            if len(sensors) >= MAX_PEER_SENSORS:
+                logger.warning(f"Peer {peer}: more than {MAX_PEER_SENSORS} sensors, the rest are ignored")
+                break
+            entry = dict(entry, peer=peer, device_id=namespaced(peer, entry.get("device_id", 0)))
+            sensors[namespaced(peer, name)] = entry
+        devices = {}
+        for device_id, device in (snapshot.get("devices") or {}).items():
+            if isinstance(device, dict):
+                devices[namespaced(peer, device_id)] = dict(device, peer=peer, name=namespaced(peer, device.get("name", device_id)))
+        return sensors, devices
+
+    def merge(self, data, device_status, totals):
+        """Add every peer's latest view to data/device_status and keep the totals in step"""
+        now = time.time()
+        status = {}
+        for peer, link in list(self.links.items()):
+            snapshot = link.take()
+            if snapshot is not None:
+                self.views[peer] = self.namespace(peer, snapshot)
+            sensors, devices = self.views.get(peer, ({}, {}))
+            stale = link.is_stale(now)
+            counted = self.in_totals.setdefault(peer, set())
+            if stale:
+                for name in counted:
+                    totals.remove(name)
+                counted.clear()
+            elif snapshot is not None:
+                for name, entry in sensors.items():
+                    totals.update(name, entry["type"], entry["data"])
+                for name in counted - set(sensors):
+                    totals.remove(name)
+                counted.clear()
+                counted.update(sensors)
+            for name, entry in sensors.items():
+                data[name] = dict(entry, stale=True) if stale else entry
+            for device_id, device in devices.items():
+                device_status[device_id] = dict(device, connected=device.get("connected", False) and not stale)
+            status[peer] = dict(link.status(now), sensors=len(sensors))
+        for peer in [p for p in self.in_totals if p not in self.links]:
+            for name in self.in_totals.pop(peer):
+                totals.remove(name)
+        data["peers"] = status
@@ -0,0 +1,172 @@
+# sensor_monitor/health.py
+import os
+import sys
+import time
+import socket
+import threading
+from collections import deque
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Defaults for the config.json "health" block (seconds)
+DEFAULT_MAX_LOOP_LAG = 30    # Poll loop must complete a cycle at least this often
+DEFAULT_MAX_READ_AGE = 120   # A sensor's last good read may be this old (or 3 poll intervals, if longer)
+READ_AGE_INTERVALS = 3
+CYCLE_SAMPLES = 300
+# How often the monitor thread checks the loop when systemd has no watchdog set
+CHECK_INTERVAL = 5
+
+STATUS_OK = "ok"
+STATUS_DEGRADED = "degraded"   # Service works but something it reports on is stale or offline
+STATUS_FAILING = "failing"     # Poll loop stalled; /healthz returns 503 and systemd is not petted
+
+
+def sd_notify(message):
+    """Send a notification to systemd (Type=notify services); a no-op when not started by systemd"""
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        address = "\0" + address[1:]  # Abstract socket namespace
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(message.encode("utf-8"))
+        return True
+    except OSError as e:
+        logger.warning(f"sd_notify failed: {e}")
+        return False
+
+
+def watchdog_interval():
+    """Half the systemd WatchdogSec in seconds, or None if the watchdog is not enabled for this process"""
+    usec = os.environ.get("WATCHDOG_USEC")
+    pid = os.environ.get("WATCHDOG_PID")
+    if not usec or (pid and pid != str(os.getpid())):
+        return None
+    try:
+        return int(usec) / 1e6 / 2
+    except ValueError:
+        return None
+
+
+class HealthMonitor:
+    """
+    Tracks the poll loop's heartbeat and pets the systemd watchdog from its own
+    thread, but only while the loop keeps beating within max_loop_lag. A loop
+    stuck on a wedged I2C bus or a blocking pigpio connect therefore stops the
+    pets and systemd restarts the service after WatchdogSec.
+    """
+    def __init__(self, config=None):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_beat = None
+        self.cycles = 0
+        self.cycle_times = deque(maxlen=CYCLE_SAMPLES)
+        self.ready = False
+        self.stalled = False
+        self.interval = watchdog_interval()
+        self.thread = None
+        self.configure(config or {})
+
+    def configure(self, config):
+        self.max_loop_lag = float(config.get("max_loop_lag", DEFAULT_MAX_LOOP_LAG))
+        self.max_read_age = float(config.get("max_read_age", DEFAULT_MAX_READ_AGE))
+        self.require_mqtt = bool(config.get("require_mqtt", False))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="health", daemon=True)
+            self.thread.start()
+        if self.interval:
+            logger.info(f"systemd watchdog enabled, petting every {self.interval:.1f}s while the poll loop is healthy")
+
+    def beat(self, cycle_seconds):
+        """Called by the poll loop after every cycle with how long the cycle took"""
+        with self.lock:
+            self.last_beat = time.monotonic()
+            self.cycles += 1
+            self.cycle_times.append(cycle_seconds)
+        if not self.ready:
+            self.ready = True
+            sd_notify("READY=1")
+
+    def loop_lag(self):
+        """Seconds since the poll loop last completed a cycle (since start if it never has)"""
+        return time.monotonic() - (self.last_beat or self.started)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval or CHECK_INTERVAL)
+            lag = self.loop_lag()
+            if lag <= self.max_loop_lag:
+                if self.stalled:
+                    logger.info("Poll loop recovered")
+                self.stalled = False
+                sd_notify(f"WATCHDOG=1\nSTATUS=Polling, last cycle {self.cycle_ms()['last']} ms")
+                continue
+            if not self.stalled:
+                logger.error(f"Poll loop stalled: no completed cycle for {lag:.0f}s (limit {self.max_loop_lag:.0f}s)")
+            self.stalled = True
+            sd_notify(f"STATUS=Poll loop stalled for {lag:.0f}s")
+
+    def cycle_ms(self):
+        with self.lock:
+            times = sorted(self.cycle_times)
+            last = self.cycle_times[-1] if self.cycle_times else 0
+        p95 = times[min(len(times) - 1, int(0.95 * len(times)))] if times else 0
+        return {"last": round(last * 1000, 1), "p95": round(p95 * 1000, 1),
+                "max": round(times[-1] * 1000, 1) if times else 0}
+
+    def report(self, sensors, mqtt_state, buses=None):
+        """
+        Health against the configured limits. sensors maps name -> (last good
+        read time or None, poll interval, paused); mqtt_state is the
+        publisher's connection state; buses is local I2C bus utilization and
+        contention, reported as is.
+        """
+        now = time.time()
+        problems = []
+        failing = False
+
+        lag = self.loop_lag()
+        loop_ok = lag <= self.max_loop_lag
+        if not loop_ok:
+            failing = True
+            problems.append(f"poll loop has not completed a cycle for {lag:.0f}s")
+
+        sensor_health = {}
+        for name, (last_read, interval, paused) in sensors.items():
+            limit = max(self.max_read_age, READ_AGE_INTERVALS * interval)
+            age = round(now - last_read, 1) if last_read else None
+            ok = paused or (age is not None and age <= limit)
+            if not ok:
+                problems.append(f"{name}: no good read for {age}s" if age is not None else f"{name}: never read")
+            sensor_health[name] = {"last_read_age": age, "limit": limit, "ok": ok, "paused": paused}
+
+        # "disabled" means no broker is configured, which is not a fault
+        mqtt_ok = mqtt_state in ("connected", "disabled")
+        if not mqtt_ok:
+            problems.append(f"MQTT {mqtt_state}")
+            failing = failing or self.require_mqtt
+
+        if failing:
+            status = STATUS_FAILING
+        elif problems:
+            status = STATUS_DEGRADED
+        else:
+            status = STATUS_OK
+        return {
+            "status": status,
+            "problems": problems,
+            "uptime": round(time.monotonic() - self.started),
+            "loop": {"lag": round(lag, 1), "limit": self.max_loop_lag, "ok": loop_ok,
+                     "cycles": self.cycles, "cycle_ms": self.cycle_ms()},
+            "sensors": sensor_health,
+            "mqtt": {"state": mqtt_state, "ok": mqtt_ok, "required": self.require_mqtt},
+            "i2c": buses or {},
+            "watchdog": {"systemd": self.interval is not None, "interval": self.interval}
+        }
@@ -0,0 +1,175 @@
+# sensor_monitor/i2c_bus.py
+import sys
+import time
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+try:
+    from sensor_monitor.logger import logger
+    from sensor_monitor.backends import local_i2c
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Lower runs first: sensor polls, then burst captures, then ADC/calibration writes, then discovery scans
+PRIORITY_POLL = 0
+PRIORITY_BURST = 1
+PRIORITY_CALIBRATION = 2
+PRIORITY_SCAN = 3
+PRIORITY_NAMES = ("poll", "burst", "calibration", "scan")
+# A waiting transaction moves up one priority level for every this many seconds it waits, so scans cannot starve
+AGING_SECONDS = 0.5
+LOCK_POLL = 0.001
+# Window for the recent utilization figure
+STATS_WINDOW = 60
+
+
+class I2CBus:
+    """
+    Owns the handle of one physical local I2C bus and serialises every
+    transaction on it: sensor polls, burst captures, ADC writes and discovery
+    scans queue here and are granted in priority order, oldest first within
+    a priority. A transaction holds Blinka's bus lock once for all of its
+    register accesses, rather than once per access as adafruit_ina219 does.
+    """
+    def __init__(self, i2c, name="i2c"):
+        self.i2c = i2c
+        self.name = name
+        self.cond = threading.Condition()
+        self.busy = False
+        self.granted = None
+        self.waiting = []  # (priority, seq, enqueued) tickets
+        self.seq = itertools.count()
+        self.started = time.monotonic()
+        self.counts = [0] * len(PRIORITY_NAMES)
+        self.wait_total = [0.0] * len(PRIORITY_NAMES)
+        self.wait_max = [0.0] * len(PRIORITY_NAMES)
+        self.contended = 0
+        self.timeouts = 0
+        self.busy_time = 0.0
+        self.recent = deque()  # (end, held) of recent transactions
+
+    def acquire(self, priority=PRIORITY_POLL, timeout=None):
+        """Wait for this transaction's turn; returns the time it was granted. Raises TimeoutError"""
+        enqueued = time.monotonic()
+        with self.cond:
+            if self.busy or self.waiting:
+                self.contended += 1
+                ticket = (priority, next(self.seq), enqueued)
+                self.waiting.append(ticket)
+                deadline = None if timeout is None else enqueued + timeout
+                while self.granted is not ticket:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.waiting.remove(ticket)
+                        self.timeouts += 1
+                        raise TimeoutError(f"{self.name}: bus busy for {timeout}s")
+                    self.cond.wait(remaining)
+                self.granted = None
+            else:
+                self.busy = True
+            granted = time.monotonic()
+            waited = granted - enqueued
+            self.counts[priority] += 1
+            self.wait_total[priority] += waited
+            self.wait_max[priority] = max(self.wait_max[priority], waited)
+        return granted
+
+    def release(self, granted):
+        now = time.monotonic()
+        with self.cond:
+            held = now - granted
+            self.busy_time += held
+            self.recent.append((now, held))
+            if self.waiting:
+                # Hand the bus straight to the next ticket so no other thread can slip in
+                ticket = min(self.waiting, key=lambda t: (t[0] - (now - t[2]) / AGING_SECONDS, t[1]))
+                self.waiting.remove(ticket)
+                self.granted = ticket
+                self.cond.notify_all()
+            else:
+                self.busy = False
+
+    @contextmanager
+    def transaction(self, priority=PRIORITY_POLL, timeout=None, hold_lock=True):
+        """
+        Exclusive use of the bus. With hold_lock=False Blinka's lock is left
+        to the caller, for drivers such as adafruit_ina219 that take it
+        themselves on every access.
+        """
+        granted = self.acquire(priority, timeout)
+        try:
+            if not hold_lock:
+                yield self.i2c
+                return
+            # Every user of the bus goes through here, so Blinka's lock is normally free at once
+            while not self.i2c.try_lock():
+                time.sleep(LOCK_POLL)
+            try:
+                yield self.i2c
+            finally:
+                self.i2c.unlock()
+        finally:
+            self.release(granted)
+
+    def read_registers(self, address, registers, priority=PRIORITY_POLL):
+        """Read several 16-bit (big-endian) registers back to back in one transaction"""
+        buffer = bytearray(2)
+        values = []
+        with self.transaction(priority) as i2c:
+            for register in registers:
+                i2c.writeto_then_readfrom(address, bytes([register]), buffer)
+                values.append((buffer[0] << 8) | buffer[1])
+        return values
+
+    def write_register(self, address, register, value, priority=PRIORITY_CALIBRATION):
+        with self.transaction(priority) as i2c:
+            i2c.writeto(address, bytes([register, (value >> 8) & 0xFF, value & 0xFF]))
+
+    def stats(self):
+        now = time.monotonic()
+        with self.cond:
+            while self.recent and now - self.recent[0][0] > STATS_WINDOW:
+                self.recent.popleft()
+            recent = sum(held for _, held in self.recent)
+            window = min(STATS_WINDOW, now - self.started) or 1
+            return {
+                "utilization": round(100 * self.busy_time / ((now - self.started) or 1), 2),
+                "recent_utilization": round(100 * recent / window, 2),
+                "transactions": dict(zip(PRIORITY_NAMES, self.counts)),
+                "wait_ms": {name: {"mean": round(1000 * total / count, 2) if count else 0,
+                                   "max": round(1000 * longest, 2)}
+                            for name, count, total, longest in
+                            zip(PRIORITY_NAMES, self.counts, self.wait_total, self.wait_max)},
+                "contended": self.contended,
+                "timeouts": self.timeouts,
+                "waiting": len(self.waiting)
+            }
+
+
+_buses = {}  # id(Blinka I2C) -> I2CBus
+_buses_lock = threading.Lock()
+
+
+def local_bus(i2c=None):
+    """
+    The scheduler for a local bus, one per Blinka handle. Without a handle
+    the Pi's own bus (board.I2C(), itself shared) is used, so sensors and
+    devices on it all end up on the same I2CBus.
+    """
+    with _buses_lock:
+        if i2c is None:
+            i2c = local_i2c()
+        bus = _buses.get(id(i2c))
+        if bus is None:
+            bus = _buses[id(i2c)] = I2CBus(i2c, name=f"i2c-{len(_buses) + 1}")
+            logger.info(f"I2C scheduler started for {bus.name}")
+        return bus
+
+
+def bus_stats():
+    """Utilization and contention of every local bus, by name"""
+    with _buses_lock:
+        buses = list(_buses.values())
+    return {bus.name: bus.stats() for bus in buses}
@@ -0,0 +1,80 @@
+# sensor_monitor/i2c_pool.py
+import sys
+import threading
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+I2C_BUS = 1
+
+
+class I2CHandlePool:
+    """
+    Owns the pigpio I2C handles of one remote device. Sensors borrow a
+    handle per address; sensors sharing an address share the handle. When the
+    device reconnects, attach() drops every handle of the old connection and
+    sensors re-open theirs on the new one. Each clear starts a new generation,
+    so a late release of an old handle cannot touch its replacement.
+    """
+    def __init__(self, name, bus=I2C_BUS):
+        self.name = name
+        self.bus = bus
+        self.pi = None
+        self.handles = {}  # address -> [handle, users, generation]
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def attach(self, pi):
+        """Switch to a new pigpio connection, closing handles left on the old one"""
+        with self.lock:
+            if pi is not self.pi:
+                self._close_all()
+            self.pi = pi
+
+    def open(self, address):
+        """Borrow the handle for address; returns (handle, generation), both needed to release it"""
+        with self.lock:
+            if self.pi is None:
+                raise RuntimeError(f"{self.name}: No pigpio connection")
+            entry = self.handles.get(address)
+            if entry is None:
+                handle = self.pi.i2c_open(self.bus, address)
+                entry = self.handles[address] = [handle, 0, self.generation]
+                logger.info(f"{self.name}: I2C handle {handle} opened at address {hex(address)}")
+            entry[1] += 1
+            return entry[0], entry[2]
+
+    def release(self, address, handle, generation):
+        with self.lock:
+            entry = self.handles.get(address)
+            if entry is None or entry[0] != handle or entry[2] != generation:
+                return  # Already dropped with its connection; the entry now there belongs to someone else
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.handles[address]
+                self._close(address, entry[0])
+
+    def close_all(self):
+        with self.lock:
+            self._close_all()
+
+    def _close_all(self):
+        for address, (handle, _, _) in list(self.handles.items()):
+            self._close(address, handle)
+        self.handles.clear()
+        self.generation += 1
+
+    def _close(self, address, handle):
+        # pigpiod's handle table is small, so give handles back whenever the old connection still works
+        if self.pi is None or not self.pi.connected:
+            return
+        try:
+            self.pi.i2c_close(handle)
+            logger.info(f"{self.name}: I2C handle {handle} closed at address {hex(address)}")
+        except Exception as e:
+            logger.warning(f"{self.name}: Failed to close I2C handle {handle}: {e}")
+
+    def open_count(self):
+        return len(self.handles)
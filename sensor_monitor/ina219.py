@@ -0,0 +1,141 @@
+# sensor_monitor/ina219.py
+import sys
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Registers
+CONFIG_REGISTER = 0x00
+SHUNT_VOLTAGE_REGISTER = 0x01
+BUS_VOLTAGE_REGISTER = 0x02
+POWER_REGISTER = 0x03
+CURRENT_REGISTER = 0x04
+CALIBRATION_REGISTER = 0x05
+
+# Bus voltage register flags
+CONVERSION_READY = 0x02  # CNVR
+MATH_OVERFLOW = 0x01     # OVF
+BUS_VOLTAGE_LSB = 0.004
+
+# Chip power-on default: 32V range, /8 gain, 12-bit bus and shunt, continuous
+DEFAULT_CONFIG = 0x399F
+
+# Address range selectable with the A0/A1 pins on INA219 (and INA226/INA260) boards
+INA_ADDRESSES = range(0x40, 0x50)
+# Die ID register of the newer INA2xx parts; the INA219 has no ID registers
+DIE_ID_REGISTER = 0xFF
+DIE_IDS = {0x2260: "INA226", 0x2270: "INA260", 0x3220: "INA3221"}
+CHIP_INA219 = "INA219"
+CHIP_UNKNOWN = "unknown"
+
+BUS_RANGES = {16: 0, 32: 1}
+# Shunt full scale (mV) -> PGA gain code
+SHUNT_RANGES = {40: 0, 80: 1, 160: 2, 320: 3}
+# Single-sample resolutions -> ADC code
+ADC_RESOLUTIONS = {9: 0x0, 10: 0x1, 11: 0x2, 12: 0x3}
+# 12-bit averaged sample counts -> ADC code
+ADC_SAMPLES = {1: 0x3, 2: 0x9, 4: 0xA, 8: 0xB, 16: 0xC, 32: 0xD, 64: 0xE, 128: 0xF}
+# Conversion time (microseconds) per ADC code
+CONVERSION_TIMES_US = {0x0: 84, 0x1: 148, 0x2: 276, 0x3: 532, 0x9: 1060, 0xA: 2130,
+                       0xB: 4260, 0xC: 8510, 0xD: 17020, 0xE: 34050, 0xF: 68100}
+MODES = {"triggered": 0x3, "continuous": 0x7}
+
+
+class Ina219Config:
+    """
+    Configuration register (0x00) settings for one INA219, built from the
+    optional "adc" block of a sensor in sensors.json, e.g.
+    {"bus_samples": 16, "shunt_samples": 128, "bus_range": 32, "shunt_range": 320, "mode": "continuous"}
+    Samples > 1 use the chip's 12-bit hardware averaging; with 1 sample the
+    "bus_resolution"/"shunt_resolution" (9-12 bits) is used instead.
+    """
+    def __init__(self, bus_range=32, shunt_range=320, bus_resolution=12, bus_samples=1,
+                 shunt_resolution=12, shunt_samples=1, mode="continuous"):
+        self.bus_range = self._check(int(bus_range), BUS_RANGES, "bus_range")
+        self.shunt_range = self._check(int(shunt_range), SHUNT_RANGES, "shunt_range")
+        self.bus_samples = self._check(int(bus_samples), ADC_SAMPLES, "bus_samples")
+        self.shunt_samples = self._check(int(shunt_samples), ADC_SAMPLES, "shunt_samples")
+        self.bus_resolution = self._check(int(bus_resolution), ADC_RESOLUTIONS, "bus_resolution")
+        self.shunt_resolution = self._check(int(shunt_resolution), ADC_RESOLUTIONS, "shunt_resolution")
+        self.mode = self._check(mode, MODES, "mode")
+
+    @staticmethod
+    def _check(value, allowed, name):
+        if value not in allowed:
+            raise ValueError(f"Invalid INA219 {name} {value}, expected one of {list(allowed)}")
+        return value
+
+    @classmethod
+    def from_dict(cls, settings):
+        if not settings:
+            return None
+        try:
+            return cls(**settings)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Ignoring invalid INA219 adc settings {settings}: {e}")
+            return None
+
+    def to_dict(self):
+        return {"bus_range": self.bus_range, "shunt_range": self.shunt_range,
+                "bus_resolution": self.bus_resolution, "bus_samples": self.bus_samples,
+                "shunt_resolution": self.shunt_resolution, "shunt_samples": self.shunt_samples,
+                "mode": self.mode}
+
+    @property
+    def bus_adc(self):
+        if self.bus_samples > 1:
+            return ADC_SAMPLES[self.bus_samples]
+        return ADC_RESOLUTIONS[self.bus_resolution]
+
+    @property
+    def shunt_adc(self):
+        if self.shunt_samples > 1:
+            return ADC_SAMPLES[self.shunt_samples]
+        return ADC_RESOLUTIONS[self.shunt_resolution]
+
+    @property
+    def gain(self):
+        return SHUNT_RANGES[self.shunt_range]
+
+    @property
+    def mode_code(self):
+        return MODES[self.mode]
+
+    @property
+    def triggered(self):
+        return self.mode == "triggered"
+
+    @property
+    def hardware_averaging(self):
+        return self.bus_samples > 1 or self.shunt_samples > 1
+
+    def register_value(self):
+        return ((BUS_RANGES[self.bus_range] << 13) | (self.gain << 11) |
+                (self.bus_adc << 7) | (self.shunt_adc << 3) | self.mode_code)
+
+    def conversion_time(self):
+        """Seconds for one bus + shunt conversion"""
+        return (CONVERSION_TIMES_US[self.bus_adc] + CONVERSION_TIMES_US[self.shunt_adc]) / 1e6
+
+
+def decode_bus_voltage(raw):
+    """Split the bus voltage register into (volts, conversion_ready, overflow)"""
+    raw &= 0xFFFF
+    return (raw >> 3) * BUS_VOLTAGE_LSB, bool(raw & CONVERSION_READY), bool(raw & MATH_OVERFLOW)
+
+
+def identify_chip(config, die_id):
+    """
+    Guess the chip from its configuration (0x00) and die ID (0xFF) registers.
+    INA226/INA260/INA3221 report a die ID; the INA219 does not, but bit 14
+    of its configuration register always reads 0.
+    """
+    if die_id is not None:
+        chip = DIE_IDS.get(die_id & 0xFFF0)  # Low nibble is the silicon revision
+        if chip:
+            return chip
+    if config is not None and not config & 0x4000:
+        return CHIP_INA219
+    return CHIP_UNKNOWN
@@ -4,6 +4,7 @@ import time
 try:
     from sensor_monitor.config_manager import MQTT_DISCOVERY_PREFIX, MQTT_BASE, VERSION
     from sensor_monitor.logger import logger
+    from sensor_monitor.encoding import compact_available, encode_compact
 except Exception as ex:
     print("Error loading config: " + str(ex))
     sys.exit()
@@ -26,19 +27,25 @@ DEVICE_PAYLOAD = {
             "device": DEVICE_INFO,
         }
 try:
-    import paho.mqtt.client as mqtt
     import json
+    import threading
+    from sensor_monitor.backends import load
+    from sensor_monitor.mqtt_queue import DiskQueue, QUEUE_DIR, DEFAULT_MAX_BYTES
+    from sensor_monitor.mqtt_worker import PublishWorker
 except Exception as ex:
     print("Error loading config: " + str(ex))
     sys.exit()
 
 # Global MQTT connection status for frontend
 mqttConnectionStatus = 0
+# Queued messages are replayed at this rate after a reconnect, so the broker is not flooded
+REPLAY_RATE = 50
+REPLAY_BATCH = 50
 
 class MQTTPublisher:
-    def __init__(self, mqtt_config):
+    def __init__(self, mqtt_config, connect=True):
         self.connection_status = {
-            'state': 'disconnected',  # disconnected, connecting, connected, error
+            'state': 'disconnected',  # disconnected, connecting, connected, error, disabled
             'last_connected': None,
             'last_error': None,
             'connection_attempts': 0
@@ -47,31 +54,158 @@ class MQTTPublisher:
         logger.info("Initializing MQTT Publisher")
         self.mqtt_broker = mqtt_config['mqtt_broker']
         self.mqtt_port = int(mqtt_config['mqtt_port'])
+        self.set_binary_topic(mqtt_config.get('mqtt_binary', 0))
+        self.queue_max_bytes = self.queue_size(mqtt_config)
+        self.client = None  # Created (and paho imported) on the first connect
+        # State messages published while the broker is unreachable wait on disk
+        self.queue = None
+        self.replay_lock = threading.Lock()
+        self.replaying = False
+        # State updates are serialised and sent off the poll thread
+        self.worker = PublishWorker()
+        if connect:
+            self.connect()
+
+    @property
+    def enabled(self):
+        # A blank broker turns MQTT off
+        return bool(str(self.mqtt_broker or "").strip())
+
+    def create_client(self):
+        mqtt = load("paho.mqtt.client")
         self.client = mqtt.Client()
         self.client.on_connect = self._on_connect
         self.client.on_disconnect = self._on_disconnect
         self.client.loop_start()
+        if self.queue is None:
+            self.queue = DiskQueue(QUEUE_DIR, max_bytes=self.queue_max_bytes)
 
+    def close(self):
+        """Send pending state updates and sync the disk queue before exit"""
+        self.worker.stop()
+        if self.queue is not None:
+            self.queue.close()
+
+    def queue_size(self, mqtt_config):
+        try:
+            return int(float(mqtt_config.get('mqtt_queue_mb') or 0) * 1024 * 1024) or DEFAULT_MAX_BYTES
+        except (TypeError, ValueError):
+            return DEFAULT_MAX_BYTES
+
+    def _publish(self, topic, payload, retain=True):
+        if self.client is not None:
+            self.client.publish(topic, payload, retain=retain)
+
+    def _publish_state(self, topic, payload):
+        """
+        Publish a state message that must not be lost. While the broker is
+        unreachable, or queued messages are still being replayed (so order is
+        kept), it is appended to the disk queue instead.
+        """
+        if self.queue is None:
+            return self._publish(topic, payload)
+        with self.replay_lock:
+            if self.replaying or not self.is_connected():
+                self.queue.put(topic, payload, retain=True)
+                return
+        self._publish(topic, payload)
+
+    def replay(self):
+        """Send queued messages oldest first, rate limited, then return to direct publishing"""
+        sent = 0
+        logger.info(f"MQTT: replaying {len(self.queue)} queued message(s)")
+        try:
+            while self.is_connected():
+                batch = self.queue.peek(REPLAY_BATCH)
+                if not batch:
+                    with self.replay_lock:
+                        if not len(self.queue):
+                            break
+                    time.sleep(0.1)
+                    continue  # A message was queued after the peek
+                last = None
+                for position, timestamp, topic, payload, retain in batch:
+                    info = self.client.publish(topic, payload, qos=1, retain=retain)
+                    if info.rc != 0:
+                        break
+                    last = position
+                    sent += 1
+                    time.sleep(1.0 / REPLAY_RATE)
+                if last is None:
+                    break
+                self.queue.ack(last)
+        except Exception as e:
+            logger.error(f"MQTT replay failed: {e}")
+        finally:
+            with self.replay_lock:
+                self.replaying = False
+        logger.info(f"MQTT: replayed {sent} message(s), {len(self.queue)} still queued")
+
+    def set_binary_topic(self, enabled):
+        # Optional MessagePack copy of each state message on <topic>/msgpack
+        self.binary_topic = bool(int(enabled or 0))
+        if self.binary_topic and not compact_available():
+            logger.warning("mqtt_binary is enabled but msgpack is not installed; binary topic disabled")
+            self.binary_topic = False
+
+    def connect(self):
+        if not self.enabled:
+            self.connection_status['state'] = 'disabled'
+            logger.info("MQTT disabled (no broker configured)")
+            return
         try:
             self.connection_status['state'] = 'connecting'
             self.connection_status['connection_attempts'] += 1
+            if self.client is None:
+                self.create_client()
             self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
             logger.info("Connected to MQTT Broker")
-            self.client.publish(f"{MQTT_BASE}/ina219_hub_status", "online", retain=True)
-            self.client.publish(f"{MQTT_DISCOVERY_PREFIX}/sensor/ina219_hub_status/availability", "online", retain=True)
+            self._publish(f"{MQTT_BASE}/ina219_hub_status", "online", retain=True)
+            self._publish(f"{MQTT_DISCOVERY_PREFIX}/sensor/ina219_hub_status/availability", "online", retain=True)
             logger.info("Published Hub Status as online")
         except Exception as e:
             self.connection_status['state'] = 'error'
             self.connection_status['last_error'] = str(e)
             logger.error(f"Connection to MQTT Broker failed: {e}")
 
+    def reconfigure(self, mqtt_config):
+        """
+        Apply new MQTT settings at runtime. Returns True if the broker changed
+        and the client reconnected, so discovery needs publishing again.
+        """
+        self.set_binary_topic(mqtt_config.get('mqtt_binary', 0))
+        self.queue_max_bytes = self.queue_size(mqtt_config)
+        if self.queue is not None:
+            self.queue.max_bytes = max(self.queue_max_bytes, 2 * self.queue.segment_bytes)
+        broker = mqtt_config['mqtt_broker']
+        port = int(mqtt_config['mqtt_port'])
+        if broker == self.mqtt_broker and port == self.mqtt_port:
+            return False
+        logger.info(f"MQTT broker changed from {self.mqtt_broker}:{self.mqtt_port} to {broker}:{port}")
+        try:
+            if self.client is not None:
+                self.client.disconnect()
+        except Exception as e:
+            logger.warning(f"MQTT disconnect failed: {e}")
+        self.mqtt_broker = broker
+        self.mqtt_port = port
+        self.connect()
+        return True
+
     def _on_connect(self, client, userdata, flags, rc):
         global mqttConnectionStatus
         if rc == 0:
-            self.connection_status['state'] = 'connected'
+            # Claim the replay and go 'connected' under the same lock that _publish_state takes, so
+            # a message is either queued before the replay starts (and sent by it) or published directly
+            with self.replay_lock:
+                replay = self.queue is not None and len(self.queue) > 0 and not self.replaying
+                self.replaying = self.replaying or replay
+                self.connection_status['state'] = 'connected'
             self.connection_status['last_connected'] = time.time()
             self.connection_status['last_error'] = None
             logger.info("MQTT connection established successfully")
+            if replay:
+                threading.Thread(target=self.replay, name="mqtt-replay", daemon=True).start()
             
             # Update global MQTT status for frontend
             mqttConnectionStatus = 1
@@ -100,6 +234,9 @@ class MQTTPublisher:
         status = self.connection_status.copy()
         status['broker'] = self.mqtt_broker
         status['port'] = self.mqtt_port
+        status['queue'] = self.queue.stats() if self.queue is not None else None
+        status['replaying'] = self.replaying
+        status['worker'] = self.worker.stats()
         return status
 
     def is_connected(self):
@@ -117,31 +254,38 @@ class MQTTPublisher:
         }
         config_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/ina219_hub_status/config"
         logger.info(f'Publishing MQTT Hub Device Config - {config_topic} with payload: {payload}')
-        self.client.publish(config_topic, json.dumps(payload), retain=True)
+        self._publish(config_topic, json.dumps(payload), retain=True)
         # Publish the state and availability topics for the hub device
-        self.client.publish(f"{MQTT_BASE}/ina219_hub_status", "online", retain=True)
-        self.client.publish(f"{MQTT_DISCOVERY_PREFIX}/sensor/ina219_hub_status/availability", "online", retain=True)
+        self._publish(f"{MQTT_BASE}/ina219_hub_status", "online", retain=True)
+        self._publish(f"{MQTT_DISCOVERY_PREFIX}/sensor/ina219_hub_status/availability", "online", retain=True)
         logger.info(f'MQTT Hub Device Published - {MQTT_DISCOVERY_PREFIX}/sensor/ina219_hub_status/availability as online')
 
-    def publish_totals_device(self):
+    TOTALS_ENTITIES = [
+        ("total_power", "Total Power Generated", "W", "power", "mdi:flash"),
+        ("solar_total", "Solar Total Generated", "W", "power", "mdi:solar-power"),
+        ("wind_total", "Wind Total Generated", "W", "power", "mdi:weather-windy"),
+        ("battery_soc_total", "Battery Total SoC", "%", "battery", "mdi:battery"),
+        ("battery_in_total", "Battery Total Charge In", "Wh", "energy", "mdi:battery-plus"),
+        ("battery_out_total", "Battery Total Discharge Out", "Wh", "energy", "mdi:battery-minus"),
+    ]
+
+    def totals_slug(self, group_id=None):
+        # "totals" for the system totals, "totals_<group>" for a group (see sensor_monitor/totals.py)
+        return "totals" if group_id is None else f"totals_{str(group_id).replace(' ', '_')}"
+
+    def publish_totals_device(self, group_id=None, group_name=None):
         """
         Publishes Home Assistant MQTT discovery config for a totals device.
         Shows total power generated by turbine and solar, and battery in/out totals.
+        With group_id, publishes a separate device for that group's totals.
         """
-        base_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/totals"
-        state_topic = f"{MQTT_BASE}/totals"
+        slug = self.totals_slug(group_id)
+        base_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/{slug}"
+        state_topic = f"{MQTT_BASE}/{slug}"
         
-        totals = [
-            ("total_power", "Total Power Generated", "W", "power", "mdi:flash"),
-            ("solar_total", "Solar Total Generated", "W", "power", "mdi:solar-power"),
-            ("wind_total", "Wind Total Generated", "W", "power", "mdi:weather-windy"),
-            ("battery_soc_total", "Battery Total SoC", "%", "battery", "mdi:battery"),
-            ("battery_in_total", "Battery Total Charge In", "Wh", "energy", "mdi:battery-plus"),
-            ("battery_out_total", "Battery Total Discharge Out", "Wh", "energy", "mdi:battery-minus"),
-        ]
         device_info = {
-            "identifiers": ["ina219_sensor_totals"],
-            "name": "INA219 Sensor Totals",
+            "identifiers": ["ina219_sensor_totals" if group_id is None else f"ina219_sensor_{slug}"],
+            "name": "INA219 Sensor Totals" if group_id is None else f"INA219 Totals - {group_name or group_id}",
             "manufacturer": "allanbeth",
             "model": "INA219 Sensor (Totals)",
             "sw_version": VERSION,
@@ -149,15 +293,15 @@ class MQTTPublisher:
             "suggested_area": "Power Systems",
         }
 
-        for key, name, unit, device_class, icon in totals:
-            config_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/totals_{key}/config"
+        for key, name, unit, device_class, icon in self.TOTALS_ENTITIES:
+            config_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/{slug}_{key}/config"
             logger.info(f"Publishing MQTT discovery for Totals ({key}) to {config_topic}")
 
             payload = {
-                "name": name,        
+                "name": name if group_id is None else f"{group_name or group_id} {name}",
                 "state_topic": state_topic,
                 "value_template": f"{{{{ value_json.{key} }}}}",
-                "unique_id": f"ina219_totals_{key}",
+                "unique_id": f"ina219_{slug}_{key}",
                 "unit_of_measurement": unit,
                 "device_class": device_class,
                 "icon": icon,
@@ -166,11 +310,57 @@ class MQTTPublisher:
             }
             
             logger.info(f"Publishing MQTT payload for ({key}): {payload}")
-            self.client.publish(config_topic, json.dumps(payload), retain=True)
+            self._publish(config_topic, json.dumps(payload), retain=True)
             logger.info(f'MQTT Totals Discovery Config Published - {config_topic}')
 
         # Publish the availability topic for the totals device
-        self.client.publish(f"{base_topic}/availability", "online", retain=True)
+        self._publish(f"{base_topic}/availability", "online", retain=True)
+
+    def remove_totals_device(self, group_id):
+        """Remove a group's totals device from Home Assistant"""
+        slug = self.totals_slug(group_id)
+        for key, *_ in self.TOTALS_ENTITIES:
+            self._publish(f"{MQTT_DISCOVERY_PREFIX}/sensor/{slug}_{key}/config", "", retain=True)
+        self._publish(f"{MQTT_DISCOVERY_PREFIX}/sensor/{slug}/availability", "offline", retain=True)
+        logger.info(f"MQTT discovery removed for totals group {group_id}")
+
+    def alert_slug(self, rule_id):
+        return f"alert_{str(rule_id).replace(' ', '_')}"
+
+    def publish_alert_device(self, rule):
+        """Home Assistant binary_sensor (device class problem) for one alert rule, on the hub device"""
+        slug = self.alert_slug(rule["id"])
+        state_topic = f"{MQTT_BASE}/{slug}"
+        payload = {
+            "name": rule["name"],
+            "state_topic": state_topic,
+            "value_template": "{{ value_json.state }}",
+            "payload_on": "ON",
+            "payload_off": "OFF",
+            "json_attributes_topic": state_topic,
+            "device_class": "problem",
+            "unique_id": f"ina219_{slug}",
+            "device": DEVICE_INFO,
+        }
+        self._publish(f"{MQTT_DISCOVERY_PREFIX}/binary_sensor/ina219_{slug}/config", json.dumps(payload), retain=True)
+        logger.info(f"MQTT Alert Discovery Config Published - {rule['id']}")
+        self.publish_alert_state(rule)
+
+    def remove_alert_device(self, rule_id):
+        slug = self.alert_slug(rule_id)
+        self._publish(f"{MQTT_DISCOVERY_PREFIX}/binary_sensor/ina219_{slug}/config", "", retain=True)
+        self._publish(f"{MQTT_BASE}/{slug}", "", retain=True)
+
+    def publish_alert_state(self, alert):
+        """alert is a rule dict or a fired/cleared event; sent through the publish worker"""
+        if self.client is None:
+            return
+        topic = f"{MQTT_BASE}/{self.alert_slug(alert['id'])}"
+        self.worker.submit(topic, self._send_alert_state, topic, dict(alert))
+
+    def _send_alert_state(self, topic, alert):
+        alert["state"] = "ON" if alert.get("active") else "OFF"
+        self._publish_state(topic, json.dumps(alert))
 
     def send_discovery_config(self, sensor_name, sensor_type):
         """
@@ -224,7 +414,7 @@ class MQTTPublisher:
             }
 
             logger.info(f"Publishing MQTT payload for ({sensor_name}): {payload}")
-            self.client.publish(config_topic, json.dumps(payload), retain=True)
+            self._publish(config_topic, json.dumps(payload), retain=True)
             logger.info(f'MQTT Discovery Config Published - {config_topic}')
 
         # For battery type, publish status as a separate enum entity
@@ -242,7 +432,7 @@ class MQTTPublisher:
                 "icon": "mdi:battery",
                 "options": ["charging", "discharging", "idle"]
             }
-            self.client.publish(status_config_topic, json.dumps(status_payload), retain=True)
+            self._publish(status_config_topic, json.dumps(status_payload), retain=True)
             logger.info(f'MQTT Discovery Config Published - {status_config_topic}')
 
 
@@ -258,34 +448,50 @@ class MQTTPublisher:
 
         for measurement in measurements:
             config_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/{sensor_clean}_{measurement}/config"
-            self.client.publish(config_topic, "", retain=True)
+            self._publish(config_topic, "", retain=True)
 
     def rename_discovery_config(self, old_name, new_name, sensor_type): 
         self.remove_discovery_config(old_name, sensor_type)
         self.send_discovery_config(new_name, sensor_type)
 
     def publish_new_data(self, sensor, readings):
+        """Queue a sensor's new state for the publish worker; readings is not modified"""
+        if self.client is None:
+            return
+        topic = f"{MQTT_BASE}/{sensor.replace(' ', '_')}"
+        # A copy without the reading history, so later changes to readings cannot leak into it
+        sensor_data = {key: value for key, value in readings.items() if key != 'readings'}
+        self.worker.submit(topic, self._send_sensor_data, sensor, sensor_data)
+
+    def _send_sensor_data(self, sensor, sensor_data):
         sensor_clean = sensor.replace(" ", "_")
         topic = f"{MQTT_BASE}/{sensor_clean}"
-        sensor_data = readings
-        del sensor_data['readings']
-
         payload = json.dumps(sensor_data)
-        self.client.publish(topic, payload, retain=True)
+        self._publish_state(topic, payload)
         logger.info(f'MQTT Published - {topic}: {payload}')
+        if self.binary_topic:
+            self._publish_state(f"{topic}/msgpack", encode_compact(sensor_data))
 
         availability_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/{sensor_clean}/availability"
-        self.client.publish(availability_topic, "online", retain=True)
+        self._publish(availability_topic, "online", retain=True)
 
-    def publish_totals_data(self, totals_dict):
+    def publish_totals_data(self, totals_dict, group_id=None):
         """
         Publishes the totals data to MQTT for Home Assistant.
         totals_dict should have keys: solar_total, wind_total, battery_in_total, battery_out_total
         """
-        topic = f"{MQTT_BASE}/totals"
+        if self.client is None:
+            return
+        slug = self.totals_slug(group_id)
+        self.worker.submit(f"{MQTT_BASE}/{slug}", self._send_totals_data, slug, dict(totals_dict))
+
+    def _send_totals_data(self, slug, totals_dict):
+        topic = f"{MQTT_BASE}/{slug}"
         payload = json.dumps(totals_dict)
-        self.client.publish(topic, payload, retain=True)
+        self._publish_state(topic, payload)
         logger.info(f'MQTT Published Totals - {topic}: {payload}')
+        if self.binary_topic:
+            self._publish_state(f"{topic}/msgpack", encode_compact(totals_dict))
 
-        availability_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/totals/availability"
-        self.client.publish(availability_topic, "online", retain=True)
\ No newline at end of file
+        availability_topic = f"{MQTT_DISCOVERY_PREFIX}/sensor/{slug}/availability"
+        self._publish(availability_topic, "online", retain=True)
\ No newline at end of file
@@ -0,0 +1,202 @@
+# sensor_monitor/mqtt_queue.py
+import os
+import sys
+import time
+import json
+import zlib
+import struct
+import threading
+try:
+    from pathlib import Path
+    from sensor_monitor.logger import logger
+    from sensor_monitor.storage import atomic_write_json
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+QUEUE_DIR = "mqtt_queue"
+SEGMENT_BYTES = 256 * 1024
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+CURSOR_FILE = "cursor.json"
+SEGMENT_SUFFIX = ".seg"
+# crc32 (of everything after it), timestamp, payload length, topic length, retain
+RECORD = struct.Struct("<IdIHB")
+
+
+def encode_record(timestamp, topic, payload, retain):
+    topic = topic.encode("utf-8")
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    body = RECORD.pack(0, timestamp, len(payload), len(topic), 1 if retain else 0)[4:] + topic + payload
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+def read_records(f, offset):
+    """Yield (next_offset, timestamp, topic, payload, retain) from offset until the end or a torn/corrupt record"""
+    f.seek(offset)
+    while True:
+        header = f.read(RECORD.size)
+        if len(header) < RECORD.size:
+            return
+        crc, timestamp, payload_len, topic_len, retain = RECORD.unpack(header)
+        rest = f.read(topic_len + payload_len)
+        if len(rest) < topic_len + payload_len or zlib.crc32(header[4:] + rest) != crc:
+            return
+        offset += RECORD.size + topic_len + payload_len
+        yield offset, timestamp, rest[:topic_len].decode("utf-8"), rest[topic_len:], bool(retain)
+
+
+class DiskQueue:
+    """
+    Bounded on-disk FIFO for outbound MQTT messages. Messages are appended to
+    numbered segment files and a cursor records how far replay has got. Once
+    the queue passes max_bytes the oldest segment is deleted, read or not, so
+    an outage loses the oldest data rather than filling the SD card.
+    """
+    def __init__(self, directory=QUEUE_DIR, max_bytes=DEFAULT_MAX_BYTES, segment_bytes=SEGMENT_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max(max_bytes, 2 * segment_bytes)
+        self.lock = threading.Lock()
+        self.segments = {}  # seq -> [bytes, records], oldest first
+        self.cursor = (0, 0, 0)  # (segment, offset, records consumed in it)
+        self.writer = None
+        self.evicted = 0
+        self._load()
+
+    def _path(self, seq):
+        return self.directory / f"{seq:08d}{SEGMENT_SUFFIX}"
+
+    def _load(self):
+        for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}")):
+            seq = int(path.stem)
+            records = 0
+            offset = 0
+            with open(path, "rb") as f:
+                for offset, *_ in read_records(f, 0):
+                    records += 1
+            if offset != path.stat().st_size:
+                # Torn write from a crash or power cut: drop the partial record
+                logger.warning(f"MQTT queue: truncating {path.name} at {offset} bytes")
+                os.truncate(path, offset)
+            self.segments[seq] = [offset, records]
+        try:
+            with open(self.directory / CURSOR_FILE) as f:
+                seq, offset, consumed = json.load(f)
+            self.cursor = (seq, offset, consumed)
+        except (OSError, ValueError, TypeError):
+            self.cursor = (min(self.segments), 0, 0) if self.segments else (0, 0, 0)
+        for seq in [s for s in self.segments if s < self.cursor[0]]:
+            self._delete(seq)
+        if self.segments and self.cursor[0] not in self.segments:
+            self.cursor = (min(self.segments), 0, 0)
+        if len(self):
+            logger.info(f"MQTT queue: {len(self)} message(s) waiting from a previous run")
+
+    def put(self, topic, payload, retain=True, timestamp=None):
+        record = encode_record(timestamp or time.time(), topic, payload, retain)
+        with self.lock:
+            seq = max(self.segments) if self.segments else self.cursor[0]
+            if self.writer is None or self.segments.get(seq, [0])[0] >= self.segment_bytes:
+                seq = self._roll(seq)
+            self.writer.write(record)
+            self.writer.flush()
+            self.segments[seq][0] += len(record)
+            self.segments[seq][1] += 1
+            while self.size() > self.max_bytes and len(self.segments) > 1:
+                self._evict_oldest()
+
+    def _roll(self, seq):
+        if self.writer is not None:
+            os.fsync(self.writer.fileno())
+            self.writer.close()
+            seq += 1
+        elif seq in self.segments and self.segments[seq][0] >= self.segment_bytes:
+            seq += 1
+        self.writer = open(self._path(seq), "ab")
+        self.segments.setdefault(seq, [0, 0])
+        return seq
+
+    def _evict_oldest(self):
+        seq = min(self.segments)
+        lost = self.segments[seq][1]
+        if seq == self.cursor[0]:
+            lost -= self.cursor[2]
+            self.cursor = (seq + 1, 0, 0)
+            self._save_cursor()
+        self.evicted += lost
+        self._delete(seq)
+        logger.warning(f"MQTT queue full, dropped {lost} oldest message(s)")
+
+    def _delete(self, seq):
+        self.segments.pop(seq, None)
+        try:
+            self._path(seq).unlink()
+        except FileNotFoundError:
+            pass
+
+    def peek(self, limit):
+        """Up to limit messages from the cursor: [(position, timestamp, topic, payload, retain)]"""
+        with self.lock:
+            if self.writer is not None:
+                self.writer.flush()
+            batch = []
+            seq, offset, consumed = self.cursor
+            while len(batch) < limit and seq in self.segments:
+                with open(self._path(seq), "rb") as f:
+                    for offset, timestamp, topic, payload, retain in read_records(f, offset):
+                        consumed += 1
+                        batch.append(((seq, offset, consumed), timestamp, topic, payload, retain))
+                        if len(batch) >= limit:
+                            break
+                if len(batch) >= limit or seq == max(self.segments):
+                    break
+                seq, offset, consumed = seq + 1, 0, 0
+            return batch
+
+    def ack(self, position):
+        """Everything up to and including position has been sent"""
+        with self.lock:
+            seq = position[0]
+            if seq not in self.segments:
+                return  # Evicted while it was being sent
+            for old in [s for s in self.segments if s < seq]:
+                self._delete(old)
+            self.cursor = position
+            # A fully sent segment that is no longer written to can go
+            if position[2] >= self.segments[seq][1] and seq != max(self.segments):
+                self._delete(seq)
+                self.cursor = (seq + 1, 0, 0)
+            self._save_cursor()
+
+    def _save_cursor(self):
+        try:
+            atomic_write_json(self.directory / CURSOR_FILE, list(self.cursor))
+        except OSError as e:
+            logger.error(f"MQTT queue: failed to save cursor: {e}")
+
+    def size(self):
+        return sum(size for size, _ in self.segments.values())
+
+    def __len__(self):
+        total = sum(records for _, records in self.segments.values())
+        return total - (self.cursor[2] if self.cursor[0] in self.segments else 0)
+
+    def stats(self):
+        oldest = self.peek(1)
+        return {
+            "depth": len(self),
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+            "oldest_age": round(time.time() - oldest[0][1], 1) if oldest else None,
+            "evicted": self.evicted
+        }
+
+    def close(self):
+        with self.lock:
+            if self.writer is not None:
+                self.writer.flush()
+                os.fsync(self.writer.fileno())
+                self.writer.close()
+                self.writer = None
@@ -0,0 +1,78 @@
+# sensor_monitor/mqtt_worker.py
+import sys
+import threading
+from collections import OrderedDict
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# More distinct topics than this waiting at once means something is wrong; the oldest are dropped
+MAX_PENDING = 1024
+
+
+class PublishWorker:
+    """
+    Publishes state messages on its own thread so a slow broker never holds
+    up polling. Pending messages are kept per topic and only the newest one
+    survives: if the worker falls behind, older states for the same topic
+    are replaced (counted in `coalesced`) rather than queued.
+    """
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = OrderedDict()  # key -> (send, args), oldest first
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self.run, name="mqtt-publish", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, send, *args):
+        """Queue send(*args) as the latest message for key; returns immediately"""
+        with self.cond:
+            if key in self.pending:
+                # Keep its place in line so a busy topic cannot starve the others
+                self.pending[key] = (send, args)
+                self.coalesced += 1
+            else:
+                if len(self.pending) >= self.max_pending:
+                    self.pending.popitem(last=False)
+                    self.dropped += 1
+                self.pending[key] = (send, args)
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopped:
+                    self.cond.wait()
+                if self.stopped and not self.pending:
+                    return
+                key, (send, args) = self.pending.popitem(last=False)
+            try:
+                send(*args)
+                self.published += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"MQTT publish of {key} failed: {e}")
+
+    def stop(self, timeout=2):
+        """Send what is pending, then end the thread"""
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join(timeout)
+
+    def stats(self):
+        with self.cond:
+            return {
+                "pending": len(self.pending),
+                "published": self.published,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "errors": self.errors
+            }
@@ -0,0 +1,144 @@
+# sensor_monitor/polling.py
+import sys
+import math
+import datetime
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+POLL_MODE_FIXED = "fixed"
+POLL_MODE_ADAPTIVE = "adaptive"
+DEFAULT_POLL_INTERVAL = 30
+# Activity is change/variance of power as a fraction of the sensor's max_power
+FAST_ACTIVITY = 0.02   # Above this the interval is halved
+SLOW_ACTIVITY = 0.005  # Below this the interval grows by BACKOFF_FACTOR
+BACKOFF_FACTOR = 1.5
+# Readings used to judge activity
+ACTIVITY_WINDOW = 5
+
+
+def sun_times(day, latitude, longitude):
+    """
+    Sunrise and sunset for a UTC date using the NOAA solar position approximation.
+    Returns (sunrise, sunset) as UTC datetimes, ("day", "day") during midnight
+    sun or ("night", "night") during polar night.
+    """
+    gamma = 2 * math.pi / 365 * (day.timetuple().tm_yday - 1)
+    eqtime = 229.18 * (0.000075 + 0.001868 * math.cos(gamma) - 0.032077 * math.sin(gamma)
+                       - 0.014615 * math.cos(2 * gamma) - 0.040849 * math.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * math.cos(gamma) + 0.070257 * math.sin(gamma)
+            - 0.006758 * math.cos(2 * gamma) + 0.000907 * math.sin(2 * gamma)
+            - 0.002697 * math.cos(3 * gamma) + 0.00148 * math.sin(3 * gamma))
+    lat = math.radians(latitude)
+    cos_ha = (math.cos(math.radians(90.833)) / (math.cos(lat) * math.cos(decl))
+              - math.tan(lat) * math.tan(decl))
+    if cos_ha > 1:
+        return "night", "night"
+    if cos_ha < -1:
+        return "day", "day"
+    ha = math.degrees(math.acos(cos_ha))
+    midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+    sunrise = midnight + datetime.timedelta(minutes=720 - 4 * (longitude + ha) - eqtime)
+    sunset = midnight + datetime.timedelta(minutes=720 - 4 * (longitude - ha) - eqtime)
+    return sunrise, sunset
+
+
+def is_daylight(now, latitude, longitude):
+    """True if the sun is up at the given UTC datetime and location"""
+    # Check neighbouring dates too, local daylight can span a UTC date change
+    for offset in (-1, 0, 1):
+        sunrise, sunset = sun_times((now + datetime.timedelta(days=offset)).date(), latitude, longitude)
+        if sunrise == "day" and offset == 0:
+            return True
+        if sunrise in ("day", "night"):
+            continue
+        if sunrise <= now <= sunset:
+            return True
+    return False
+
+
+class AdaptivePoller:
+    """
+    Works out when each sensor is next due. In fixed mode this is the
+    configured poll interval per type. In adaptive mode each sensor's interval
+    moves between a min and max: it shortens while power is changing and backs
+    off while the signal is flat. Solar sensors are held at their max interval
+    between sunset and sunrise when a location is configured.
+    """
+    def __init__(self, config_data):
+        self.intervals = {}
+        self.last_poll_times = {}
+        self._daylight_cache = (None, True)
+        self.configure(config_data)
+
+    def configure(self, config_data):
+        self.mode = config_data.get("poll_mode", POLL_MODE_FIXED)
+        self.poll_intervals = config_data.get("poll_intervals", {})
+        self.adaptive = config_data.get("adaptive_poll", {})
+        location = config_data.get("location") or {}
+        try:
+            self.location = (float(location["latitude"]), float(location["longitude"]))
+        except (KeyError, TypeError, ValueError):
+            self.location = None
+        # Limits may have changed, so restart each sensor from its configured interval
+        self.intervals = {}
+        logger.info(f"Polling mode: {self.mode}" + (f", night schedule at {self.location}" if self.location else ""))
+
+    def limits(self, sensor_type):
+        fixed = self.poll_intervals.get(sensor_type, DEFAULT_POLL_INTERVAL)
+        limits = self.adaptive.get(sensor_type, {})
+        min_interval = float(limits.get("min", 1))
+        max_interval = float(limits.get("max", fixed * 6))
+        return min_interval, max(min_interval, max_interval)
+
+    def interval(self, sensor):
+        if self.mode != POLL_MODE_ADAPTIVE:
+            return self.poll_intervals.get(sensor.type, DEFAULT_POLL_INTERVAL)
+        min_interval, max_interval = self.limits(sensor.type)
+        if sensor.type == "Solar" and self.location and not self.daylight():
+            return max_interval
+        return self.intervals.get(sensor.name, self.poll_intervals.get(sensor.type, min_interval))
+
+    def is_due(self, sensor, now):
+        return now - self.last_poll_times.get(sensor.name, 0) >= self.interval(sensor)
+
+    def record_poll(self, sensor, now):
+        """Store the poll time and, in adaptive mode, retune the sensor's interval"""
+        self.last_poll_times[sensor.name] = now
+        if self.mode != POLL_MODE_ADAPTIVE:
+            return
+        min_interval, max_interval = self.limits(sensor.type)
+        current = self.intervals.get(sensor.name, self.poll_intervals.get(sensor.type, min_interval))
+        activity = self.activity(sensor)
+        if activity > FAST_ACTIVITY:
+            new_interval = current / 2
+        elif activity < SLOW_ACTIVITY:
+            new_interval = current * BACKOFF_FACTOR
+        else:
+            new_interval = current
+        new_interval = max(min_interval, min(max_interval, new_interval))
+        if new_interval != current:
+            logger.debug(f"{sensor.name}: poll interval {current:.1f}s -> {new_interval:.1f}s (activity {activity:.4f})")
+        self.intervals[sensor.name] = new_interval
+
+    def activity(self, sensor):
+        """Largest of the last step change and the standard deviation of power, relative to max_power"""
+        readings = list(sensor.readings)[-ACTIVITY_WINDOW:]
+        if len(readings) < 2:
+            return FAST_ACTIVITY * 2  # Not enough history, keep sampling quickly
+        scale = abs(float(sensor.max_power or 0)) or 1.0
+        powers = [r.get("power", 0) for r in readings]
+        step = abs(powers[-1] - powers[-2])
+        mean = sum(powers) / len(powers)
+        std = math.sqrt(sum((p - mean) ** 2 for p in powers) / len(powers))
+        return max(step, std) / scale
+
+    def daylight(self):
+        # Recompute at most once a minute
+        now = datetime.datetime.now(datetime.timezone.utc)
+        minute = now.replace(second=0, microsecond=0)
+        if self._daylight_cache[0] != minute:
+            self._daylight_cache = (minute, is_daylight(now, *self.location))
+        return self._daylight_cache[1]
@@ -0,0 +1,160 @@
+# sensor_monitor/registry.py
+import sys
+import threading
+from contextlib import contextmanager
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. Waiting writers block new readers so edits are
+    not starved by the poll loop. The write side is reentrant for its owner.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+
+def _key(device_id):
+    # Device ids come from JSON as either "0" or 0
+    return str(device_id)
+
+
+class _Index:
+    """One immutable generation of the registry: the sensor tuple and its lookup tables"""
+    def __init__(self, sensors):
+        self.sensors = tuple(sensors)
+        self.by_name = {}
+        self.by_location = {}
+        by_type = {}
+        by_device = {}
+        for sensor in self.sensors:
+            self.by_name[sensor.name] = sensor
+            self.by_location[(_key(sensor.device_id), sensor.address)] = sensor
+            by_type.setdefault(sensor.type, []).append(sensor)
+            by_device.setdefault(_key(sensor.device_id), []).append(sensor)
+        self.by_type = {k: tuple(v) for k, v in by_type.items()}
+        self.by_device = {k: tuple(v) for k, v in by_device.items()}
+
+
+class SensorRegistry:
+    """
+    Thread-safe collection of Sensor objects with O(1) lookups by name,
+    (device, address), type and device. Writes publish a new immutable index
+    (copy-on-write), so iterating never sees a sensor list changing underneath
+    it. Field edits go through editing(), and readers that need a sensor's
+    fields to be consistent hold reading().
+    """
+    def __init__(self, sensors=()):
+        self.lock = ReadWriteLock()
+        self._index = _Index(sensors)
+        self.generation = 0  # Bumped on every change, so readers can tell when to resync
+
+    def _publish(self, sensors):
+        self._index = _Index(sensors)
+        self.generation += 1
+
+    def __iter__(self):
+        return iter(self._index.sensors)
+
+    def __len__(self):
+        return len(self._index.sensors)
+
+    def __contains__(self, name):
+        return name in self._index.by_name
+
+    def snapshot(self):
+        return self._index.sensors
+
+    def get(self, name):
+        return self._index.by_name.get(name)
+
+    def by_address(self, device_id, address):
+        return self._index.by_location.get((_key(device_id), address))
+
+    def by_type(self, sensor_type):
+        return self._index.by_type.get(sensor_type, ())
+
+    def by_device(self, device_id):
+        return self._index.by_device.get(_key(device_id), ())
+
+    def names(self):
+        return list(self._index.by_name)
+
+    def add(self, sensor):
+        with self.writing():
+            if sensor.name in self._index.by_name:
+                logger.warning(f"Sensor {sensor.name} already registered, replacing it")
+            self._publish([s for s in self._index.sensors if s.name != sensor.name] + [sensor])
+
+    def remove(self, sensor):
+        with self.writing():
+            self._publish([s for s in self._index.sensors if s is not sensor])
+
+    def replace_all(self, sensors):
+        with self.writing():
+            self._publish(sensors)
+
+    @contextmanager
+    def writing(self):
+        self.lock.acquire_write()
+        try:
+            yield
+        finally:
+            self.lock.release_write()
+
+    @contextmanager
+    def editing(self):
+        """Hold the write lock while changing sensor fields, then rebuild the indexes"""
+        with self.writing():
+            try:
+                yield
+            finally:
+                self._publish(self._index.sensors)
+
+    @contextmanager
+    def reading(self):
+        self.lock.acquire_read()
+        try:
+            yield
+        finally:
+            self.lock.release_read()
@@ -1,56 +1,241 @@
 # sensor_monitor/sensor.py
 import sys
-import board
-import busio
+import math
+import time
 import datetime
 try:
-    from adafruit_ina219 import INA219
     from collections import deque
     from sensor_monitor.logger import logger
+    from sensor_monitor.backends import ina219_driver
+    from sensor_monitor.i2c_bus import local_bus, PRIORITY_POLL, PRIORITY_CALIBRATION
+    from sensor_monitor.battery import get_battery_profile, DEFAULT_BATTERY_MODEL
+    from sensor_monitor.ina219 import (Ina219Config, decode_bus_voltage, CONFIG_REGISTER, BUS_VOLTAGE_REGISTER,
+                                       POWER_REGISTER, CURRENT_REGISTER, CALIBRATION_REGISTER)
 except Exception as ex:
     print("Error loading config: " + str(ex))
     sys.exit()
 
-CALIBRATION_REGISTER = 0x05
 DEFAULT_CALIBRATION = 4191
+# Current/power LSBs for DEFAULT_CALIBRATION with a 0.1 ohm shunt
+CURRENT_LSB = 3.2 / 32767
+POWER_LSB = 20 * CURRENT_LSB
+# adafruit_ina219's own 32V/2A calibration, used when the driver does not expose it
+LOCAL_CALIBRATION = 4096
+LOCAL_CURRENT_LSB = 0.1  # mA
+LOCAL_POWER_LSB = 0.002  # W
+# Read in one bus transaction per local poll
+LOCAL_READ_REGISTERS = (BUS_VOLTAGE_REGISTER, CURRENT_REGISTER, POWER_REGISTER, CALIBRATION_REGISTER)
 
 class Sensor:
-    def __init__(self, name, address, sensor_type, max_power, rating, max_readings, device_id, i2c=None, pi=None):
+    def __init__(self, name, address, sensor_type, max_power, rating, max_readings, device_id, i2c=None, pi=None,
+                 battery_model=DEFAULT_BATTERY_MODEL, battery_curve=None, internal_resistance=0.0, adc=None, pool=None):
         self.name = name
         self.type = sensor_type
         self.max_power = max_power
         self.address = address
         self.rating = rating
         self.device_id = device_id
+        # Battery model selection (see sensor_monitor/battery.py)
+        self.battery_model = battery_model or DEFAULT_BATTERY_MODEL
+        self.battery_curve = battery_curve
+        self.internal_resistance = float(internal_resistance or 0.0)
+        # Optional INA219 ADC/averaging configuration (see sensor_monitor/ina219.py)
+        self.adc = Ina219Config.from_dict(adc)
         self.max_readings = max_readings
         self.readings = deque(maxlen=self.max_readings)
+        self.burst_active = False  # Normal polling pauses while a burst capture owns the sensor
+        self.last_read = None  # Time of the last successful read from the chip, for /healthz
+        self.pi = None
+        self.i2c = None
+        self.bus = None  # Scheduler for the local I2C bus (see sensor_monitor/i2c_bus.py)
+        self.ina = None
+        self.pool = None
+        self.handle = None
+        self.handle_address = None
+        self.handle_generation = None  # I2CHandlePool generation the handle was borrowed in
+        self.bind(pi=pi, i2c=i2c, pool=pool)
+
+    def bind(self, pi=None, i2c=None, pool=None):
+        """
+        Attach the sensor to its device's current connection. Called again when
+        the device reconnects or the address changes; readings and settings are kept.
+        """
+        self.release()
         self.pi = pi
         self.i2c = i2c
+        self.pool = pool
         self.ina = None
+        self.bus = None
 
         if self.pi:
-            self.handle = self.pi.i2c_open(1, self.address)
-            logger.info(f"Sensor {self.name}: Remote I2C handle {self.handle} opened at address {hex(self.address)}")
-            self.calibrate()  # Calibrate when using remote GPIO
+            try:
+                if pool is not None:
+                    self.handle, self.handle_generation = pool.open(self.address)
+                else:
+                    self.handle = self.pi.i2c_open(1, self.address)
+                self.handle_address = self.address
+                logger.info(f"Sensor {self.name}: Remote I2C handle {self.handle} opened at address {hex(self.address)}")
+                self.calibrate()  # Calibrate when using remote GPIO
+            except Exception as e:
+                logger.warning(f"Sensor {self.name}: Failed to open remote I2C handle: {e}")
+                self.handle = None
         else:
             try:
-                self.i2c = i2c or busio.I2C(board.SCL, board.SDA)
-                self.ina = INA219(self.i2c)
+                self.bus = local_bus(i2c)
+                self.i2c = self.bus.i2c
+                # The driver locks the bus itself on every register access
+                with self.bus.transaction(PRIORITY_CALIBRATION, hold_lock=False):
+                    self.ina = ina219_driver(self.i2c)
                 self.ina.i2c_device.device_address = self.address
                 logger.info(f"INA219 sensor connected on address {hex(self.address)}")
+                self.configure_adc()
             except Exception as e:
                 logger.warning(f"INA219 sensor not detected: {str(e)}")
                 self.ina = None
 
+    def detach(self):
+        """Disconnect the sensor from its device; it reports offline until bound again"""
+        self.release()
+        self.pi = None
+        self.i2c = None
+        self.bus = None
+        self.pool = None
+        self.ina = None
+
+    def set_max_readings(self, max_readings):
+        """Resize the reading window, keeping the newest readings"""
+        self.max_readings = max_readings
+        self.readings = deque(self.readings, maxlen=max_readings)
+
+    def release(self):
+        """Give back the remote I2C handle, if any"""
+        if self.handle is None:
+            return
+        try:
+            if self.pool is not None:
+                self.pool.release(self.handle_address, self.handle, self.handle_generation)
+            elif self.pi and self.pi.connected:
+                self.pi.i2c_close(self.handle)
+        except Exception as e:
+            logger.warning(f"Sensor {self.name}: Failed to release I2C handle {self.handle}: {e}")
+        self.handle = None
+        self.handle_address = None
+        self.handle_generation = None
+
+    @property
+    def hardware_averaging(self):
+        return self.adc is not None and self.adc.hardware_averaging
+
     def calibrate(self, value=DEFAULT_CALIBRATION):
         try:
-            if self.pi and hasattr(self, 'handle'):
-                # Write value as big-endian (high byte first)
-                self.pi.i2c_write_word_data(self.handle, CALIBRATION_REGISTER, value)
+            if self.pi and self.handle is not None:
+                self.write_register_16(CALIBRATION_REGISTER, value)
                 logger.info(f"Calibrated {self.name} with value {value}")
+                self.configure_adc()
+            elif self.ina and self.bus is not None:
+                value = getattr(self.ina, "_cal_value", LOCAL_CALIBRATION)
+                self.bus.write_register(self.address, CALIBRATION_REGISTER, value, PRIORITY_CALIBRATION)
+                logger.info(f"Calibrated {self.name} with value {value}")
+                self.configure_adc()
         except Exception as e:
             logger.error(f"Calibration failed for {self.name}: {e}")
 
+    def local_lsbs(self):
+        """(amps, watts) per bit for the calibration adafruit_ina219 set up"""
+        return (getattr(self.ina, "_current_lsb", LOCAL_CURRENT_LSB) / 1000,
+                getattr(self.ina, "_power_lsb", LOCAL_POWER_LSB))
+
+    def configure_adc(self):
+        """Write the ADC resolution/averaging, PGA range and mode to the configuration register"""
+        if self.adc is None:
+            return
+        try:
+            if self.pi and self.handle is not None:
+                self.write_register_16(CONFIG_REGISTER, self.adc.register_value())
+            elif self.ina and self.bus is not None:
+                # Same fields adafruit_ina219 sets one property at a time, in a single write
+                self.bus.write_register(self.address, CONFIG_REGISTER, self.adc.register_value(), PRIORITY_CALIBRATION)
+            else:
+                return
+            logger.info(f"Configured {self.name} ADC: {self.adc.to_dict()} (config {hex(self.adc.register_value())})")
+        except Exception as e:
+            logger.error(f"ADC configuration failed for {self.name}: {e}")
+
+    def read_remote(self):
+        """
+        Read (voltage, current, power) over pigpio, or None if the chip has no new
+        conversion since the last read or the result overflowed.
+        """
+        if self.adc and self.adc.triggered:
+            # Writing the config register starts a single conversion and clears CNVR
+            self.write_register_16(CONFIG_REGISTER, self.adc.register_value())
+            deadline = time.monotonic() + self.adc.conversion_time() * 2 + 0.01
+            time.sleep(self.adc.conversion_time())
+            bus_voltage, ready, overflow = decode_bus_voltage(self.read_register_16(BUS_VOLTAGE_REGISTER))
+            while not ready and time.monotonic() < deadline:
+                time.sleep(0.001)
+                bus_voltage, ready, overflow = decode_bus_voltage(self.read_register_16(BUS_VOLTAGE_REGISTER))
+            if not ready:
+                logger.warning(f"{self.name}: Conversion not ready after trigger")
+                return None
+        else:
+            bus_voltage, ready, overflow = decode_bus_voltage(self.read_register_16(BUS_VOLTAGE_REGISTER))
+            if self.adc and not ready and self.readings:
+                logger.debug(f"{self.name}: No new conversion since last read")
+                return None
+        if overflow:
+            logger.warning(f"{self.name}: INA219 math overflow (OVF), reading discarded")
+            return None
+
+        voltage = round(bus_voltage, 1)
+        current = round(self.read_register_16(CURRENT_REGISTER) * CURRENT_LSB, 0)
+        if self.adc:
+            # Reading the power register clears CNVR; the chip's power comes from the same averaged conversion
+            power = round(math.copysign((self.read_register_16(POWER_REGISTER) & 0xFFFF) * POWER_LSB, current), 0)
+        else:
+            power = None
+        return voltage, current, power
+
+    def read_local(self):
+        """
+        Read (voltage, current, power) from the local bus, or None if there is
+        no new valid conversion. All registers are read in one scheduled
+        transaction; the bus is released while a triggered conversion runs.
+        """
+        if self.adc and self.adc.triggered:
+            # Writing the config register starts a single conversion
+            self.bus.write_register(self.address, CONFIG_REGISTER, self.adc.register_value(), PRIORITY_POLL)
+            deadline = time.monotonic() + self.adc.conversion_time() * 2 + 0.01
+            time.sleep(self.adc.conversion_time())
+            (raw,) = self.bus.read_registers(self.address, (BUS_VOLTAGE_REGISTER,))
+            while not decode_bus_voltage(raw)[1] and time.monotonic() < deadline:
+                time.sleep(0.001)
+                (raw,) = self.bus.read_registers(self.address, (BUS_VOLTAGE_REGISTER,))
+        bus_raw, current_raw, power_raw, calibration = self.bus.read_registers(self.address, LOCAL_READ_REGISTERS)
+        if calibration == 0:
+            # The chip reset (e.g. a load spike), so current and power read zero until it is calibrated again
+            logger.warning(f"{self.name}: Calibration register cleared, recalibrating")
+            self.calibrate()
+            return None
+        bus_voltage, ready, overflow = decode_bus_voltage(bus_raw)
+        if self.adc and not ready and self.readings:
+            logger.debug(f"{self.name}: No new conversion since last read")
+            return None
+        if overflow:
+            logger.warning(f"{self.name}: INA219 math overflow (OVF), reading discarded")
+            return None
+
+        current_lsb, power_lsb = self.local_lsbs()
+        if current_raw & 0x8000:
+            current_raw -= 0x10000
+        voltage = round(bus_voltage, 1)
+        current = round(current_raw * current_lsb, 0)
+        if self.adc:
+            power = round(math.copysign(power_raw * power_lsb, current), 0)
+        else:
+            power = None
+        return voltage, current, power
+
     def get_battery_status(self, current):
         if current > 0.05:  # Discharging (current flowing out of battery)
             return "discharging"
@@ -60,26 +245,22 @@ class Sensor:
             return "idle"
 
 
+    def battery_profile(self):
+        """Precomputed battery model for this sensor's chemistry and rating (cached)"""
+        return get_battery_profile(self.battery_model, self.rating, self.battery_curve)
+
     def is_battery_voltage_valid(self, voltage):
         """
-        Check if the voltage is within the valid range for the battery type.
+        Check if the voltage is within the valid range for the battery model.
         Returns True if valid, False otherwise.
         """
-        if self.rating >= 20:  # Assume 24V battery if rating >= 20
-            min_v, max_v = 21.0, 29.0  # Typical 24V lead-acid: 21V (empty) - 29V (full, charging)
-        else:
-            min_v, max_v = 11.8, 14.8  # Typical 12V lead-acid: 10.5V (empty) - 14.8V (full, charging)
-        return min_v <= voltage <= max_v
+        return self.battery_profile().is_valid(voltage)
 
     def clamp_battery_voltage(self, voltage):
         """
-        Clamp the voltage to the valid range for the battery type.
+        Clamp the voltage to the valid range for the battery model.
         """
-        if self.rating >= 20:
-            min_v, max_v = 21.0, 29.0
-        else:
-            min_v, max_v = 10.5, 14.8
-        return max(min_v, min(max_v, voltage))
+        return self.battery_profile().clamp(voltage)
 
     def handle_battery_voltage(self, voltage):
         """
@@ -88,14 +269,14 @@ class Sensor:
         """
         if not self.is_battery_voltage_valid(voltage):
             logger.warning(
-                f"{self.name}: Battery voltage {voltage}V out of range for {self.rating}V system. Clamping."
+                f"{self.name}: Battery voltage {voltage}V out of range for {self.rating}V {self.battery_model} system. Clamping."
             )
             return self.clamp_battery_voltage(voltage)
         return voltage
 
     def fetch_data(self):
         # Check if sensor has no device connection (disconnected)
-        if not self.pi and not self.ina:
+        if (self.pi and self.handle is None) or (not self.pi and not self.ina):
             logger.debug(f"Sensor {self.name} has no device connection - returning offline data")
             data = {
                 "voltage": 0, "current": 0, "power": 0,
@@ -125,48 +306,10 @@ class Sensor:
             return data
             
         try:
-            if self.pi:
-                raw_voltage = self.read_register_16(0x02)
-                voltage = round((raw_voltage >> 3) * 0.004, 1)
-                raw_current = self.read_register_16(0x04)
-                
-                # Handle signed 16-bit current register
-                # Convert unsigned 16-bit to signed if necessary
-                if raw_current > 32767:
-                    raw_current = raw_current - 65536  # Convert to signed
-                
-                CURRENT_LSB = 3.2 / 32767
-                current = round(raw_current * CURRENT_LSB, 0)
-            else:
-                voltage = round(self.ina.bus_voltage, 1) if self.ina else 0.0
-                current = round(self.ina.current / 1000, 0) if self.ina else 0.0
-
-            # --- Battery voltage validation ---
-            if self.type == "Battery":
-                voltage = self.handle_battery_voltage(voltage)
-
-            # Calculate power (voltage * current)
-            # For wind turbines, negative current is normal depending on wiring direction
-            # The sign indicates current flow direction relative to the INA219 sensor orientation
-            power = round(voltage * current, 0)
-            
-            # For wind/solar generation, we typically want absolute power values for totals
-            # but keep the sign for individual sensor readings to show current direction
-            time_stamp = datetime.datetime.now().strftime("%I:%M:%S%p on %B %d, %Y")
-            new_readings = {"voltage": voltage, "current": current, "power": power, "time_stamp": time_stamp}
-
-            if self.type == "Battery":
-                new_readings["state_of_charge"] = self.estimate_soc(voltage)
-                new_readings["status"] = self.get_battery_status(current)
-            else:
-                output = float(power / self.max_power) * 100
-                new_readings["output"] = round(output, 0)
-
-            # Outlier rejection before appending
-            if self.is_valid_reading(new_readings):
-                self.readings.append(new_readings)
-            else:
-                logger.info(f"Outlier detected for {self.name}: {new_readings}")
+            sample = self.read_remote() if self.pi else self.read_local()
+            if sample is not None:
+                self.add_reading(*sample)
+                self.last_read = time.time()
 
             data = self.smoothed_data()
             if self.type == "Battery":
@@ -188,6 +331,36 @@ class Sensor:
             }
         return data
 
+    def add_reading(self, voltage, current, power=None):
+        # --- Battery voltage validation ---
+        if self.type == "Battery":
+            voltage = self.handle_battery_voltage(voltage)
+
+        # Calculate power (voltage * current) unless the chip supplied it
+        # For wind turbines, negative current is normal depending on wiring direction
+        # The sign indicates current flow direction relative to the INA219 sensor orientation
+        if power is None:
+            power = round(voltage * current, 0)
+        
+        # For wind/solar generation, we typically want absolute power values for totals
+        # but keep the sign for individual sensor readings to show current direction
+        time_stamp = datetime.datetime.now().strftime("%I:%M:%S%p on %B %d, %Y")
+        new_readings = {"voltage": voltage, "current": current, "power": power, "time_stamp": time_stamp,
+                        "ts": round(time.time(), 3)}
+
+        if self.type == "Battery":
+            new_readings["state_of_charge"] = self.estimate_soc(voltage, current)
+            new_readings["status"] = self.get_battery_status(current)
+        else:
+            output = float(power / self.max_power) * 100
+            new_readings["output"] = round(output, 0)
+
+        # Outlier rejection before appending
+        if self.is_valid_reading(new_readings):
+            self.readings.append(new_readings)
+        else:
+            logger.info(f"Outlier detected for {self.name}: {new_readings}")
+
     def is_valid_reading(self, new_reading, threshold=0.4):
         """
         Reject readings that deviate too much from the median of the last N readings.
@@ -225,17 +398,20 @@ class Sensor:
             }
         readings = list(self.readings)
         n = len(readings)
+        # The chip already averages each reading in hardware, so skip the software window
+        window = readings[-1:] if self.hardware_averaging else readings
+        w = len(window)
         averaged = {
-            "voltage": round(sum(r["voltage"] for r in readings) / n, 2),
-            "current": round(sum(r["current"] for r in readings) / n, 2),
-            "power": round(sum(r["power"] for r in readings) / n, 2),
+            "voltage": round(sum(r["voltage"] for r in window) / w, 2),
+            "current": round(sum(r["current"] for r in window) / w, 2),
+            "power": round(sum(r["power"] for r in window) / w, 2),
             #"time_stamp": time_stamp
         }
         if self.type == "Battery":
-            averaged["state_of_charge"] = round(sum(r["state_of_charge"] for r in readings) / n, 0)
+            averaged["state_of_charge"] = round(sum(r["state_of_charge"] for r in window) / w, 0)
             #averaged["status"] = readings[0]["status"] if readings else ""
         else:
-            averaged["output"] = round(sum(r["output"] for r in readings) / n, 0)
+            averaged["output"] = round(sum(r["output"] for r in window) / w, 0)
 
         # Trend calculation (difference per reading)
         if n > 1:
@@ -285,46 +461,19 @@ class Sensor:
             data["power_trend"] = 0
         return data
 
-    def estimate_soc(self, voltage):
+    def estimate_soc(self, voltage, current=0.0):
         """
-        Estimate state of charge (SoC) for a 12V or 24V lead-acid battery using a piecewise linear table.
-        Assumes voltage is measured at rest (not charging/discharging).
+        Estimate state of charge (SoC) from the battery model's lookup table.
+        If internal_resistance is configured the IR drop from current is compensated,
+        otherwise voltage is assumed to be at rest (not charging/discharging).
         """
-        if self.rating >= 20:  # 24V battery
-            soc_table = [
-                (25.4, 100),
-                (25.2, 90),
-                (24.8, 75),
-                (24.4, 50),
-                (24.0, 25),
-                (23.8, 10),
-                (23.6, 0)
-            ]
-            min_v, max_v = 23.6, 25.4
-        else:  # 12V battery
-            soc_table = [
-                (12.7, 100),
-                (12.6, 90),
-                (12.4, 75),
-                (12.2, 50),
-                (12.0, 25),
-                (11.9, 10),
-                (11.8, 0)
-            ]
-            min_v, max_v = 11.8, 12.7
-
-        # Clamp voltage to table range
-        voltage = max(min_v, min(max_v, voltage))
-        for i in range(len(soc_table) - 1):
-            v_high, soc_high = soc_table[i]
-            v_low, soc_low = soc_table[i + 1]
-            if v_low <= voltage <= v_high:
-                # Linear interpolation
-                soc = soc_low + (soc_high - soc_low) * (voltage - v_low) / (v_high - v_low)
-                return int(round(soc))
-        # If voltage is below lowest value
-        return 0
+        return self.battery_profile().soc(voltage, current, self.internal_resistance)
     
+    def write_register_16(self, reg, value):
+        # SMBus words are little-endian but the INA219 expects the high byte first
+        swapped = ((value & 0xFF) << 8) | ((value >> 8) & 0xFF)
+        self.pi.i2c_write_word_data(self.handle, reg, swapped)
+
     def read_register_16(self, reg):
         if not self.pi:
             return 0
@@ -1,20 +1,37 @@
 # sensor_monitor/sensor_manager.py
 
-import json
 import time
-import pigpio
-import board
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import sys
 try:
     from sensor_monitor.sensor import Sensor
+    from sensor_monitor.ina219 import Ina219Config, CHIP_INA219
+    from sensor_monitor.discovery import discover, probe_local, probe_remote
+    from sensor_monitor.startup import StartupProgress
+    from sensor_monitor.totals import TotalsTree
+    from sensor_monitor.federation import Federation
+    from sensor_monitor.alerts import AlertEngine, Webhook
+    from sensor_monitor.archive import Archiver, ARCHIVE_DIR
+    from sensor_monitor.health import HealthMonitor
+    from sensor_monitor.backends import pigpio_pi
+    from sensor_monitor.i2c_bus import local_bus, bus_stats
+    from sensor_monitor.i2c_pool import I2CHandlePool
+    from sensor_monitor.registry import SensorRegistry
     from sensor_monitor.config_manager import SENSOR_FILE, MQTT_STATUS
     from sensor_monitor.mqtt import MQTTPublisher
-    from sensor_monitor.webserver import flaskWrapper
+    from sensor_monitor.polling import AdaptivePoller
+    from sensor_monitor.config_apply import (ConfigChange, log_change, diff_by_key, device_needs_reconnect,
+                                             POLLING_KEYS, MQTT_KEYS, GROUP_KEYS, PEER_KEYS, ALERT_KEYS,
+                                             ARCHIVE_KEYS, HEALTH_KEYS, SENSOR_BIND_KEYS)
     from sensor_monitor.logger import logger
 except Exception as ex:
     print("Error loading config: " + str(ex))
     sys.exit()
 
+# Reconnect attempts that can run at once; a hub that hangs in pigpio.pi() only holds one worker
+RECONNECT_WORKERS = 4
+
 class Device:
     def __init__(self, name, id, remote_gpio=False, gpio_address=None):
         self.name = name
@@ -23,8 +40,11 @@ class Device:
         self.gpio_address = gpio_address
         self.pi = None
         self.i2c = None
+        self.bus = None  # Local bus scheduler, shared with every other local device and sensor
+        self.handles = I2CHandlePool(self.name)  # Remote I2C handles, reopened on reconnect
         self.connected = False
         self.last_connection_check = 0
+        self.last_reconnect_attempt = 0
         self.connection_check_interval = 30  # Check connection every 30 seconds
         logger.info(f"Initializing Device: {self.name} (ID: {self.id} Remote GPIO: {self.remote_gpio})")
 
@@ -33,8 +53,10 @@ class Device:
             if self.remote_gpio:
                 logger.info(f"{self.name}: Establishing remote GPIO connection at {self.gpio_address}")
                 if self.pi:
+                    self.handles.close_all()
                     self.pi.stop()  # Close existing connection if any
-                self.pi = pigpio.pi(self.gpio_address)
+                self.pi = pigpio_pi(self.gpio_address)
+                self.handles.attach(self.pi)
                 if not self.pi.connected:
                     self.connected = False
                     raise RuntimeError(f"{self.name}: Could not connect to remote GPIO at {self.gpio_address}")
@@ -42,7 +64,8 @@ class Device:
                 logger.info(f"{self.name}: Remote GPIO connection established")
             else:
                 logger.info(f"{self.name}: Establishing local GPIO connection")
-                self.i2c = board.I2C()
+                self.bus = local_bus()
+                self.i2c = self.bus.i2c
                 self.connected = True
                 logger.info(f"{self.name}: Local GPIO connection established")
             self.last_connection_check = time.time()
@@ -77,7 +100,11 @@ class Device:
             return False
 
     def reconnect(self):
-        """Attempt to reconnect the device"""
+        """Attempt to reconnect the device, at most once per connection_check_interval"""
+        current_time = time.time()
+        if current_time - self.last_reconnect_attempt < self.connection_check_interval:
+            return False
+        self.last_reconnect_attempt = current_time
         logger.info(f"{self.name}: Attempting to reconnect...")
         try:
             self.connect()
@@ -86,54 +113,91 @@ class Device:
             logger.error(f"{self.name}: Reconnection failed - {str(e)}")
             return False
 
+    @property
+    def pool(self):
+        """Handle pool for sensors on this device (remote devices only)"""
+        return self.handles if self.remote_gpio else None
+
+    def disconnect(self):
+        """Close the device's handles and connection"""
+        self.handles.close_all()
+        if self.pi:
+            try:
+                self.pi.stop()
+            except Exception as e:
+                logger.warning(f"{self.name}: Error closing remote GPIO connection - {str(e)}")
+        self.pi = None
+        self.i2c = None
+        self.bus = None
+        self.connected = False
+        logger.info(f"{self.name}: Disconnected")
+
     def detect_sensors(self):
+        """Probe the INA address range. Returns {address: chip}"""
+        if not self.connected:
+            logger.warning(f"{self.name}: Not connected, skipping sensor detection")
+            return {}
         if self.remote_gpio:
-            logger.warning(f"{self.name}: Remote GPIO sensor detection not implemented; assuming config is correct.")
-            return []
-        if not self.i2c:
+            return probe_remote(self.pi, self.name)
+        if not self.bus:
             logger.warning(f"{self.name}: I2C not initialized.")
-            return []
-        while not self.i2c.try_lock():
-            pass
-        try:
-            addresses = self.i2c.scan()
-            for addr in addresses:
-                logger.info(f"{self.name}: I2C Sensor detected at {hex(addr)}")
-            return addresses
-        finally:
-            self.i2c.unlock()
+            return {}
+        return probe_local(self.bus, self.name)
 
 
 class sensor_config:
-    def __init__(self, mqtt=None):
-        self.sensors = []
+    def __init__(self, mqtt=None, store=None):
+        self.sensors = SensorRegistry()
         self.mqtt = mqtt
+        self.store = store  # JsonStore for sensors.json
 
     def save_sensors(self, sensors=None):
         if sensors is None:
             sensors = self.sensors
-        with open(SENSOR_FILE, "w") as f:
-            json.dump([{"name": s.name, "address": s.address, "type": s.type,
-                        "max_power": s.max_power, "rating": s.rating, "device_id": s.device_id} for s in sensors], f)
-
-    def update_sensor(self, name, new_name, new_type, new_max_power, new_rating, new_address, new_device_id):
-        for sensor in self.sensors:
-            if sensor.name == name:
-                sensor.name = new_name
-                sensor.type = new_type
-                sensor.max_power = new_max_power
-                sensor.rating = new_rating
+        self.store.set([self.sensor_entry(s) for s in sensors])
+
+    def sensor_entry(self, s):
+        entry = {"name": s.name, "address": s.address, "type": s.type,
+                 "max_power": s.max_power, "rating": s.rating, "device_id": s.device_id}
+        if s.type == "Battery":
+            entry["battery_model"] = s.battery_model
+            if s.battery_curve:
+                entry["battery_curve"] = s.battery_curve
+            if s.internal_resistance:
+                entry["internal_resistance"] = s.internal_resistance
+        if s.adc:
+            entry["adc"] = s.adc.to_dict()
+        return entry
+
+    def update_sensor(self, name, new_name, new_type, new_max_power, new_rating, new_address, new_device_id,
+                      battery_model=None, battery_curve=None, internal_resistance=None):
+        sensor = self.sensors.get(name)
+        if sensor is None:
+            return False
+        with self.sensors.editing():
+            sensor.name = new_name
+            sensor.type = new_type
+            sensor.max_power = new_max_power
+            sensor.rating = new_rating
+            sensor.device_id = new_device_id
+            if new_address != sensor.address:
                 sensor.address = new_address
-                sensor.device_id = new_device_id
-                self.save_sensors()
-                self.mqtt.send_discovery_config(sensor.name, sensor.type)
-                return True
-        return False
+                sensor.bind(pi=sensor.pi, i2c=sensor.i2c, pool=sensor.pool)
+            if battery_model is not None:
+                sensor.battery_model = battery_model
+            if battery_curve is not None:
+                sensor.battery_curve = battery_curve or None
+            if internal_resistance is not None:
+                sensor.internal_resistance = float(internal_resistance)
+        self.save_sensors()
+        self.mqtt.send_discovery_config(sensor.name, sensor.type)
+        return True
 
     def remove_sensor(self, name):
-        sensor_to_remove = next((s for s in self.sensors if s.name == name), None)
+        sensor_to_remove = self.sensors.get(name)
         if sensor_to_remove:
             self.sensors.remove(sensor_to_remove)
+            sensor_to_remove.release()
             self.save_sensors()
             self.mqtt.remove_discovery_config(sensor_to_remove.name, sensor_to_remove.type)
             logger.info(f"Removed sensor: {sensor_to_remove.name}")
@@ -148,172 +212,433 @@ class SensorManager:
         #logger = sensor_logger()
         self.set_config()
 
-        self.mqtt = MQTTPublisher(self.mqtt_config)
-        self.sensor_config = sensor_config( self.mqtt)
+        # Connecting is left to the startup thread so an unreachable broker cannot delay the web server
+        self.mqtt = MQTTPublisher(self.mqtt_config, connect=False)
+        self.mqtt_ready = threading.Event()
+        self.sensor_config = sensor_config( self.mqtt, self.config.sensor_store)
 
         self.devices = []
-        for d in self.device_configs:
-            device = Device(
+        self.device_index = {}  # str(id) -> connected Device
+        self.pending_devices = {}  # id -> Device that failed to connect, kept for retries
+        # Reconnects run here, never on the poll thread: pigpio.pi() has no connect timeout
+        self.reconnector = ThreadPoolExecutor(max_workers=RECONNECT_WORKERS, thread_name_prefix="reconnect")
+        self.reconnects = {}  # device id -> (Device, Future of device.reconnect())
+        # Devices are connected by start(); pigpio.pi() blocks for a long time on unreachable hubs
+        self.startup_devices = [
+            Device(
                 name=d['name'],
                 id=d.get('id', 0),
                 remote_gpio=d.get('remote_gpio', 0) == 1,
                 gpio_address=d.get('gpio_address')
             )
-            
-            try:
-                device.connect()
-                self.devices.append(device)
-                logger.info(f"Device {device.name} connected successfully")
-            except Exception as e:
-                logger.error(f"Failed to connect to device {device.name}: {str(e)}")
-                logger.info(f"Continuing without device {device.name}")
-                # Continue without this device - webserver will still start
+            for d in self.device_configs
+        ]
+        self.sensor_order = {}  # name -> position in sensors.json, keeps the card order stable
 
-        self.sensors = self.load_sensors()
-        self.sensor_config.sensors = self.sensors
+        self.sensors = self.sensor_config.sensors
 
+        # Flask/Socket.IO load here rather than at import, so the sensor code can be used without them
+        from sensor_monitor.webserver import flaskWrapper
         self.webserver = flaskWrapper(self.config, self.sensor_config)
         self.webserver.mqtt_publisher = self.mqtt  # Pass MQTT publisher to webserver
-
-        self.mqtt.publish_hub_device()
-        self.load_mqtt_discovery()
+        # Settings/sensor changes from the web UI are applied by the sensor loop thread
+        self.pending_lock = threading.Lock()
+        self.pending_changes = []
+        self.webserver.on_config_change = self.apply_config
+        self.webserver.on_sensors_change = self.queue_sensor_reload
+        self.webserver.on_scan = self.scan_devices
+        self.webserver.on_alerts = self.alerts.status
+        self.webserver.archive = self.archive
+        self.webserver.on_health = self.health_status
+        self.alerts.listeners = [self.mqtt.publish_alert_state, self.webserver.emit_alert, self.webhook.send]
+        self.progress = StartupProgress(self.startup_devices, on_change=self.webserver.emit_startup_progress)
+        self.webserver.startup = self.progress
 
     def set_config(self):
         self.device_configs = self.config.config_data["devices"]
         logger.info(f"Sensor Manager initialized with {len(self.device_configs)} devices")
         self.poll_intervals = self.config.config_data.get("poll_intervals", {})
         # logger.max_log_size = self.config.config_data["max_log"]
-        self.last_poll_times = {}
-        self.mqtt_config = {
-            "mqtt_broker": self.config.config_data['mqtt_broker'],
-            "mqtt_port": self.config.config_data['mqtt_port']
-        }
+        self.poller = AdaptivePoller(self.config.config_data)
+        self.mqtt_config = self.get_mqtt_config(self.config.config_data)
         self.battery_count = 0
         self.totals_data = {}
+        self.totals = TotalsTree(self.config.config_data.get("groups", []))
+        self.totals_generation = -1
+        self.federation = Federation(self.config.config_data.get("peers", []))
+        self.alerts = AlertEngine(self.config.config_data.get("alerts", []), daylight=self.sun_up)
+        self.webhook = Webhook(self.config.config_data.get("alert_webhook"))
+        self.archive = Archiver(self.config.config_data.get("archive", 0),
+                                self.config.config_data.get("archive_dir", ARCHIVE_DIR))
+        self.health = HealthMonitor(self.config.config_data.get("health", {}))
+
+    def sun_up(self):
+        # Without a location there is no night schedule, so daylight-only alert rules always apply
+        return self.poller.location is None or self.poller.daylight()
+
+    def health_status(self):
+        """Poll loop, per-sensor and MQTT health for /healthz"""
+        sensors = {s.name: (s.last_read, self.poller.interval(s), s.burst_active) for s in self.sensors}
+        return self.health.report(sensors, self.mqtt.connection_status['state'], bus_stats())
+
+    def get_mqtt_config(self, config_data):
+        return {
+            "mqtt_broker": config_data['mqtt_broker'],
+            "mqtt_port": config_data['mqtt_port'],
+            "mqtt_binary": config_data.get('mqtt_binary', 0),
+            "mqtt_queue_mb": config_data.get('mqtt_queue_mb')
+        }
 
-    def load_sensors(self):
-        sensors = []
+    def apply_config(self, old_config, new_config):
+        """
+        Work out what changed between two configs and queue the live changes for
+        the sensor loop. Returns {"applied": [...], "restart_required": [...]}.
+        """
+        change = ConfigChange(old_config, new_config)
+        log_change(change)
+        if change.live:
+            self.queue_change(lambda: self.apply_change(change))
+        return change.summary()
+
+    def queue_sensor_reload(self):
+        self.queue_change(self.reload_sensors)
+
+    def queue_change(self, apply):
+        with self.pending_lock:
+            self.pending_changes.append(apply)
+
+    def apply_pending_changes(self):
+        with self.pending_lock:
+            changes, self.pending_changes = self.pending_changes, []
+        for apply in changes:
+            try:
+                apply()
+            except Exception as e:
+                logger.error(f"Failed to apply configuration change: {e}")
+
+    def apply_change(self, change):
+        config_data = change.new
+        if change.touches(("max_log",)):
+            self.config.set_config()
+        if change.touches(("max_readings",)):
+            max_readings = int(config_data['max_readings'])
+            with self.sensors.editing():
+                for sensor in self.sensors:
+                    sensor.set_max_readings(max_readings)
+            logger.info(f"Reading window resized to {max_readings}")
+        if change.touches(POLLING_KEYS):
+            self.poll_intervals = config_data.get("poll_intervals", {})
+            self.poller.configure(config_data)
+        if change.touches(MQTT_KEYS):
+            self.mqtt_config = self.get_mqtt_config(config_data)
+            if self.mqtt.reconfigure(self.mqtt_config):
+                self.mqtt.publish_hub_device()
+                self.load_mqtt_discovery()
+        if change.touches(("devices",)):
+            self.apply_device_changes(change)
+        if change.touches(GROUP_KEYS):
+            self.apply_group_changes(change)
+        if change.touches(PEER_KEYS):
+            self.federation.configure(config_data.get("peers", []))
+        if change.touches(ALERT_KEYS):
+            self.apply_alert_changes(change)
+        if change.touches(HEALTH_KEYS):
+            self.health.configure(config_data.get("health", {}))
+        if change.touches(ARCHIVE_KEYS):
+            self.archive.configure(config_data.get("archive", 0), config_data.get("archive_dir", ARCHIVE_DIR))
+        logger.info(f"Applied configuration changes: {', '.join(change.live)}")
+
+    def apply_device_changes(self, change):
+        added, removed, changed = change.devices()
+        self.device_configs = change.new["devices"]
+        for device_config in removed:
+            self.remove_device(device_config.get('id', 0))
+        for old, new in changed:
+            if device_needs_reconnect(old, new):
+                self.remove_device(old.get('id', 0))
+                self.add_device(new)
+            else:
+                device = self.find_device(new.get('id', 0)) or self.pending_devices.get(new.get('id', 0))
+                if device:
+                    device.name = new['name']
+        for device_config in added:
+            self.add_device(device_config)
+
+    def add_device(self, device_config):
+        device = Device(
+            name=device_config['name'],
+            id=device_config.get('id', 0),
+            remote_gpio=device_config.get('remote_gpio', 0) == 1,
+            gpio_address=device_config.get('gpio_address')
+        )
         try:
-            with open(SENSOR_FILE, "r") as f:
-                logger.info(f"Loading sensors from {SENSOR_FILE}")
-                sensor_data = json.load(f)
-
-                for s in sensor_data:
-                    i2c = None
-                    pi = None
-                    device_id = s.get("device_id", 0)
-                    logger.info(f"Loading sensor: {s['name']} at address {s['address']} on device ID {device_id}")
-
-                    # Look for connected device
-                    device_found = False
-                    for device in self.devices:
-                        if device.id == device_id:
-                            logger.info(f"Found device {device.name} for sensor {s['name']}")
-                            if device.remote_gpio:
-                                logger.info(f"Using remote GPIO for sensor {s['name']}")
-                            i2c = device.i2c
-                            pi = device.pi
-                            device_found = True
-                            logger.info(f"Found matching device for sensor {s['name']}: {device.name}")
-                            break
-
-                    # Create sensor regardless of device connection status
-                    # If device is not connected, i2c and pi will be None, causing graceful degradation
-                    sensor = Sensor(
-                        s["name"],
-                        s["address"],
-                        s["type"],
-                        s["max_power"],
-                        s["rating"],
-                        self.config.config_data['max_readings'],
-                        device_id=device_id,
-                        i2c=i2c,
-                        pi=pi
-                    )
-                    
-                    if not device_found:
-                        logger.warning(f"Creating sensor {sensor.name} without device connection - will show null data")
+            device.connect()
+            self.register_device(device)
+            self.rebind_sensors(device)
+            logger.info(f"Device {device.name} added")
+        except Exception as e:
+            # Retried by get_data on the normal reconnect schedule
+            device.last_reconnect_attempt = time.time()
+            self.pending_devices[device.id] = device
+            logger.warning(f"Device {device.name} added but not connected: {str(e)}")
+
+    def remove_device(self, device_id):
+        device = self.device_index.pop(str(device_id), None)
+        if device:
+            self.devices.remove(device)
+            with self.sensors.editing():
+                for sensor in self.sensors.by_device(device_id):
+                    sensor.detach()
+            device.disconnect()
+            logger.info(f"Device {device.name} removed")
+        for pending_id in list(self.pending_devices):
+            if str(pending_id) == str(device_id):
+                del self.pending_devices[pending_id]
+
+    def register_device(self, device):
+        self.devices.append(device)
+        self.device_index[str(device.id)] = device
+
+    def find_device(self, device_id):
+        return self.device_index.get(str(device_id))
+
+    def create_sensor(self, s):
+        device = self.find_device(s.get("device_id", 0))
+        return Sensor(
+            s["name"],
+            s["address"],
+            s["type"],
+            s["max_power"],
+            s["rating"],
+            self.config.config_data['max_readings'],
+            device_id=s.get("device_id", 0),
+            i2c=device.i2c if device else None,
+            pi=device.pi if device else None,
+            battery_model=s.get("battery_model"),
+            battery_curve=s.get("battery_curve"),
+            internal_resistance=s.get("internal_resistance", 0.0),
+            adc=s.get("adc"),
+            pool=device.pool if device else None
+        )
+
+    def reload_sensors(self):
+        """Apply sensors.json to the running sensors: add, remove and update them in place"""
+        entries = self.config.sensor_store.get() or []
+        current = [self.sensor_config.sensor_entry(s) for s in self.sensors]
+        added, removed, changed = diff_by_key(current, entries, "name")
+
+        for entry in removed:
+            sensor = self.sensors.get(entry["name"])
+            self.sensors.remove(sensor)
+            sensor.release()
+            self.mqtt.remove_discovery_config(sensor.name, sensor.type)
+            logger.info(f"Removed sensor: {sensor.name}")
+        with self.sensors.editing():
+            for old, new in changed:
+                sensor = self.sensors.get(old["name"])
+                if sensor.type != new["type"]:
+                    self.mqtt.remove_discovery_config(sensor.name, sensor.type)
+                sensor.type = new["type"]
+                sensor.max_power = new["max_power"]
+                sensor.rating = new["rating"]
+                sensor.battery_model = new.get("battery_model") or sensor.battery_model
+                sensor.battery_curve = new.get("battery_curve")
+                sensor.internal_resistance = float(new.get("internal_resistance", 0.0) or 0.0)
+                sensor.adc = Ina219Config.from_dict(new.get("adc"))
+                if any(old.get(key) != new.get(key) for key in SENSOR_BIND_KEYS):
+                    sensor.address = new["address"]
+                    sensor.device_id = new.get("device_id", 0)
+                    device = self.find_device(sensor.device_id)
+                    if device:
+                        sensor.bind(pi=device.pi, i2c=device.i2c, pool=device.pool)
                     else:
-                        logger.info(f"Creating Sensor: {sensor.name} of type {sensor.type} with address {sensor.address}")
-                    
-                    sensors.append(sensor)
-
-                    if sensor.type == "Battery":
-                        self.battery_count += 1
+                        sensor.detach()
+                else:
+                    sensor.configure_adc()
+                self.mqtt.send_discovery_config(sensor.name, sensor.type)
+                logger.info(f"Updated sensor: {sensor.name}")
+        for entry in added:
+            sensor = self.create_sensor(entry)
+            self.sensors.add(sensor)
+            self.mqtt.send_discovery_config(sensor.name, sensor.type)
+            logger.info(f"Added sensor: {sensor.name}")
+        self.battery_count = len([s for s in self.sensors if s.type == "Battery"])
+
+    def sensor_entries(self):
+        """Entries from sensors.json, or a default Battery/Solar pair per configured device"""
+        entries = self.config.sensor_store.get()
+        if entries is None:
+            logger.warning(f"Failed to load sensors from file: {SENSOR_FILE} not found")
+        elif entries:
+            logger.info(f"Loading sensors from {SENSOR_FILE}")
+            return list(entries)
+        logger.info("No saved sensors found, creating default sensors from device config")
+        entries = []
+        for device_config in self.device_configs:
+            device_id = device_config.get('id', 0)
+            device_name = device_config.get('name', f'Device_{device_id}')
+            entries.append({"name": f"Battery_{device_name}", "address": 0x40, "type": "Battery",
+                            "max_power": 100, "rating": 12, "device_id": device_id})
+            entries.append({"name": f"Solar_{device_name}", "address": 0x41, "type": "Solar",
+                            "max_power": 100, "rating": 12, "device_id": device_id})
+        return entries
+
+    def start(self):
+        """Connect devices, set up sensors and publish MQTT discovery in the background"""
+        thread = threading.Thread(target=self.run_startup, name="startup", daemon=True)
+        thread.start()
+        self.federation.start()
+        return thread
+
+    def run_startup(self):
+        entries = self.sensor_entries()
+        self.sensor_order = {entry["name"]: i for i, entry in enumerate(entries)}
+        by_device = {}
+        for entry in entries:
+            by_device.setdefault(str(entry.get("device_id", 0)), []).append(entry)
+
+        # Every device (and the MQTT connection) starts in its own thread, so one
+        # offline hub only delays its own sensors
+        with ThreadPoolExecutor(max_workers=len(self.startup_devices) + 1, thread_name_prefix="startup") as pool:
+            pool.submit(self.start_mqtt)
+            for device in self.startup_devices:
+                pool.submit(self.start_device, device, by_device.pop(str(device.id), []))
+
+        # Sensors pointing at a device id that is not in config.json
+        for device_id, orphans in by_device.items():
+            logger.warning(f"No device with ID {device_id} configured for {len(orphans)} sensor(s)")
+            self.start_sensors(orphans)
+
+        if len(self.sensors):
+            self.sensor_config.save_sensors()
+        logger.info(f"Total sensors loaded: {len(self.sensors)} (connected devices: {len(self.devices)})")
+        self.progress.finish()
+
+    def start_mqtt(self):
+        try:
+            self.mqtt.connect()
+            self.mqtt.publish_hub_device()
+            self.mqtt.publish_totals_device()
+            self.publish_group_discovery()
+            self.publish_alert_discovery()
+        except Exception as e:
+            logger.error(f"MQTT startup failed: {e}")
+        finally:
+            self.mqtt_ready.set()
+            self.progress.mqtt_finished(self.mqtt.connection_status['state'] != 'error')
 
-                    logger.info(f"Configured Sensor: {sensor.name}")
+    def start_device(self, device, entries):
+        """Connect one device, then create its sensors and auto-detect new ones"""
+        try:
+            connected = False
+            try:
+                device.connect()
+                self.register_device(device)
+                connected = True
+                logger.info(f"Device {device.name} connected successfully")
+            except Exception as e:
+                logger.error(f"Failed to connect to device {device.name}: {str(e)}")
+                logger.info(f"Continuing without device {device.name}")
+                # The sensor loop retries it after connection_check_interval
+                device.last_reconnect_attempt = time.time()
+                self.pending_devices[device.id] = device
+                if entries:
+                    logger.warning(f"Creating {len(entries)} sensor(s) of {device.name} without device connection - will show null data")
+            sensors = self.start_sensors(entries)
+            if connected:
+                sensors += self.autodetect_sensors(device)
+            self.progress.device_finished(device, connected, len(sensors))
         except Exception as e:
-            logger.warning(f"Failed to load sensors from file: {e}")
-            
-        # If no saved sensors but we have device configurations, create default sensors
+            logger.error(f"Startup of device {device.name} failed: {e}")
+            self.progress.device_finished(device, False)
+
+    def autodetect_sensors(self, device):
+        """Add sensors for INA219s found on the device that are not configured yet"""
+        existing_addresses = {s.address for s in self.sensors.by_device(device.id)}
+        entries = []
+        for addr, chip in device.detect_sensors().items():
+            if addr in existing_addresses:
+                continue
+            if chip != CHIP_INA219:
+                logger.warning(f"{device.name}: {chip} at {hex(addr)} is not supported, not adding it")
+                continue
+            entries.append({"name": f"{device.name}_{addr}", "address": addr, "type": "Solar",
+                            "max_power": 100, "rating": 12, "device_id": device.id})
+        return self.start_sensors(entries)
+
+    def start_sensors(self, entries):
+        """Create sensors (opening and calibrating their I2C connection), register them and publish discovery"""
+        sensors = []
+        for entry in entries:
+            logger.info(f"Loading sensor: {entry['name']} at address {entry['address']} on device ID {entry.get('device_id', 0)}")
+            try:
+                sensors.append(self.create_sensor(entry))
+                logger.info(f"Configured Sensor: {entry['name']}")
+            except Exception as e:
+                logger.error(f"Failed to create sensor {entry.get('name')}: {e}")
         if not sensors:
-            logger.info("No saved sensors found, creating default sensors from device config")
-            for device_config in self.config.config_data.get('devices', []):
-                device_id = device_config.get('id', 0)
-                device_name = device_config.get('name', f'Device_{device_id}')
-                device_found = False
-                i2c = None
-                pi = None
-                
-                # Look for connected device
-                for d in self.devices:
-                    if d.id == device_id:
-                        device_found = True
-                        i2c = d.i2c
-                        pi = d.pi
-                        break
-                
-                # Create default sensors for each configured device (connected or not)
-                default_sensors = [
-                    {"name": f"Battery_{device_name}", "address": 0x40, "type": "Battery", "max_power": 100, "rating": 12},
-                    {"name": f"Solar_{device_name}", "address": 0x41, "type": "Solar", "max_power": 100, "rating": 12}
-                ]
-                
-                for sensor_config in default_sensors:
-                    sensor = Sensor(
-                        sensor_config["name"],
-                        sensor_config["address"],
-                        sensor_config["type"],
-                        sensor_config["max_power"],
-                        sensor_config["rating"],
-                        self.config.config_data['max_readings'],
-                        device_id=device_id,
-                        i2c=i2c,
-                        pi=pi
-                    )
-                    
-                    if not device_found:
-                        logger.warning(f"Creating default sensor {sensor.name} without device connection - will show null data")
-                    else:
-                        logger.info(f"Creating default sensor: {sensor.name}")
-                    
-                    sensors.append(sensor)
-                    
-                    if sensor.type == "Battery":
-                        self.battery_count += 1
-
-        # Auto-detect sensors only on successfully connected devices
-        for device in self.devices:
-            if not device.remote_gpio:
-                existing_addresses = [s.address for s in sensors]
-                new_addresses = device.detect_sensors()
-                for addr in new_addresses:
-                    if addr not in existing_addresses:
-                        default_sensor = Sensor(
-                            f"{device.name}_{addr}", addr, "Solar", 100, 12,
-                            self.config.config_data['max_readings'], device_id=device.id, i2c=device.i2c
-                        )
-                        sensors.append(default_sensor)
-
-        # Save sensors if we have any
-        if sensors:
-            self.sensor_config.save_sensors(sensors)
-        
-        logger.info(f"Total sensors loaded: {len(sensors)} (connected devices: {len(self.devices)})")
+            return sensors
+        last = len(self.sensor_order)
+        with self.sensors.writing():
+            merged = list(self.sensors) + sensors
+            self.sensors.replace_all(sorted(merged, key=lambda s: self.sensor_order.get(s.name, last)))
+        self.battery_count = len(self.sensors.by_type("Battery"))
+        # Discovery waits for the first MQTT connect attempt, it is dropped while disconnected
+        self.mqtt_ready.wait()
+        for sensor in sensors:
+            try:
+                self.mqtt.send_discovery_config(sensor.name, sensor.type)
+                logger.info(f"MQTT discovery published for {sensor.name}")
+            except Exception as e:
+                logger.error(f"MQTT discovery failed for {sensor.name}: {e}")
         return sensors
 
+    def scan_devices(self):
+        """Probe every connected device for INA chips; marks addresses already configured"""
+        result = {}
+        for device_id, found in discover(self.devices).items():
+            device = self.find_device(device_id)
+            result[device.name] = [
+                {"address": hex(addr), "chip": chip,
+                 "sensor": getattr(self.sensors.by_address(device_id, addr), "name", None)}
+                for addr, chip in sorted(found.items())
+            ]
+        return result
+
+    def rebind_sensors(self, device):
+        """Point the device's existing sensors at its new connection, keeping their readings"""
+        with self.sensors.editing():
+            for sensor in self.sensors.by_device(device.id):
+                sensor.bind(pi=device.pi, i2c=device.i2c, pool=device.pool)
+        logger.info(f"{device.name}: Sensors rebound to new connection ({device.handles.open_count()} I2C handles open)")
+
+    def apply_group_changes(self, change):
+        added, removed, changed = diff_by_key(change.old.get("groups"), change.new.get("groups"), "id")
+        for group in removed:
+            self.mqtt.remove_totals_device(group.get("id"))
+        self.totals.configure(change.new.get("groups", []))
+        self.publish_group_discovery()
+
+    def publish_group_discovery(self):
+        for group_id, group in self.totals.group_totals().items():
+            self.mqtt.publish_totals_device(group_id, group["name"])
+
+    def apply_alert_changes(self, change):
+        added, removed, changed = diff_by_key(change.old.get("alerts"), change.new.get("alerts"), "id")
+        for rule in removed:
+            self.mqtt.remove_alert_device(rule.get("id"))
+        self.alerts.configure(change.new.get("alerts", []))
+        self.webhook.url = change.new.get("alert_webhook") or None
+        self.publish_alert_discovery()
+
+    def publish_alert_discovery(self):
+        for rule in self.alerts.rule_list():
+            self.mqtt.publish_alert_device(rule)
+
     def load_mqtt_discovery(self):
         self.mqtt.publish_totals_device()
+        self.publish_group_discovery()
+        self.publish_alert_discovery()
         for sensor in self.sensors:
             try:
                 self.mqtt.send_discovery_config(sensor.name, sensor.type)
@@ -321,16 +646,45 @@ class SensorManager:
             except Exception as e:
                 logger.error(f"MQTT discovery failed for {sensor.name}: {e}")
 
+    def evaluate_alerts(self, sensor, data, last_read, now):
+        """
+        Run the sensor's alert rules, but only if the chip was actually read
+        since last_read. An offline or failing sensor reports placeholder
+        zeros, which would otherwise fire low-voltage and low-SoC alerts.
+        """
+        if sensor.last_read is None or sensor.last_read == last_read:
+            return []
+        # Only this sensor's rules run (see sensor_monitor/alerts.py)
+        return self.alerts.evaluate(sensor.name, data, now)
+
+    def reconnect_finished(self, device):
+        """
+        Start device.reconnect() on the reconnect pool, or collect its result.
+        True once an attempt has succeeded; the caller then registers and
+        rebinds on the poll thread. Never waits for the network.
+        """
+        attempt = self.reconnects.get(device.id)
+        if attempt is not None and attempt[0] is not device:
+            attempt = None  # The device was replaced by a config change; its old attempt is ignored
+        if attempt is None:
+            self.reconnects[device.id] = (device, self.reconnector.submit(device.reconnect))
+            return False
+        future = attempt[1]
+        if not future.done():
+            return False
+        del self.reconnects[device.id]
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"{device.name}: Reconnection failed - {e}")
+            return False
+
     def get_data(self):
+        self.apply_pending_changes()
         current_time = time.time()
         data = {}
-
-        solar_total = 0.0
-        wind_total = 0.0
-        average_battery_soc = 0.0
-        battery_in_total = 0.0
-        battery_out_total = 0.0
-        battery_count = 0
+        # After sensors are added, removed or edited every sensor is re-applied to the totals once
+        resync = self.sensors.generation != self.totals_generation
 
         # Check device connections periodically
         connected_devices = 0
@@ -338,6 +692,9 @@ class SensorManager:
         
         for device in self.devices:
             is_connected = device.check_connection()
+            if not is_connected and self.reconnect_finished(device):
+                self.rebind_sensors(device)
+                is_connected = True
             device_status[device.id] = {
                 "name": device.name,
                 "connected": is_connected,
@@ -350,16 +707,20 @@ class SensorManager:
         # Try to reconnect failed devices
         for device_config in self.device_configs:
             device_id = device_config.get('id', 0)
-            if device_id not in [d.id for d in self.devices]:
+            if self.find_device(device_id) is None and not self.progress.is_connecting(device_id):
                 # Device not in connected devices list, try to add it
-                device = Device(
-                    name=device_config['name'],
-                    id=device_id,
-                    remote_gpio=device_config.get('remote_gpio', 0) == 1,
-                    gpio_address=device_config.get('gpio_address')
-                )
-                if device.reconnect():
-                    self.devices.append(device)
+                device = self.pending_devices.get(device_id)
+                if device is None:
+                    device = self.pending_devices[device_id] = Device(
+                        name=device_config['name'],
+                        id=device_id,
+                        remote_gpio=device_config.get('remote_gpio', 0) == 1,
+                        gpio_address=device_config.get('gpio_address')
+                    )
+                if self.reconnect_finished(device):
+                    del self.pending_devices[device_id]
+                    self.register_device(device)
+                    self.rebind_sensors(device)
                     logger.info(f"Device {device.name} reconnected successfully")
                     connected_devices += 1
                     device_status[device_id] = {
@@ -377,88 +738,77 @@ class SensorManager:
                     }
 
         for s in self.sensors:
-            data[s.name] = {
-                "address": s.address,
-                "type": s.type,
-                "max_power": s.max_power,
-                "rating": s.rating,
-                "device_id": s.device_id
-            }
-
-            poll_interval = self.poll_intervals.get(s.type, 30)
-            last_poll = self.last_poll_times.get(s.name, 0)
-
-            if current_time - last_poll >= poll_interval:
-                sensor_data = s.read_data()
-                self.last_poll_times[s.name] = current_time
-                data[s.name]['data'] = sensor_data
-
-                logger.info(f"New Reading - {s.name}: {data[s.name]['data']['voltage']}V, {data[s.name]['data']['current']}A, {data[s.name]['data']['power']}W")
-                self.mqtt.publish_new_data(s.name, sensor_data)
-                self.webserver.broadcast_sensor_data()
-            else:
-                if s.readings:
-                    sensor_data = s.current_data()
-                    data[s.name]['data'] = sensor_data
-                else:
-                    sensor_data = {
-                        "voltage": 0,
-                        "current": 0,
-                        "power": 0,
-                        "time_stamp": "Not Updated",
-                        "status": "no data" if s.type == "Battery" else None,
-                        "state_of_charge": 0 if s.type == "Battery" else None,
-                        "output": 0 if s.type != "Battery" else None,
-                        "readings": []
-                    }
+            new_reading = False
+            last_read = s.last_read
+            # The raw reading the archive last saw; fetch_data() appends a new one unless offline or an outlier
+            last_sample = s.readings[-1] if s.readings else None
+            # Hold off edits while this sensor's fields are read
+            with self.sensors.reading():
+                data[s.name] = {
+                    "address": s.address,
+                    "type": s.type,
+                    "max_power": s.max_power,
+                    "rating": s.rating,
+                    "device_id": s.device_id,
+                    "poll_interval": self.poller.interval(s)
+                }
+
+                if not s.burst_active and self.poller.is_due(s, current_time):
+                    sensor_data = s.read_data()
+                    new_reading = True
+                    self.poller.record_poll(s, current_time)
                     data[s.name]['data'] = sensor_data
 
-            # --- Calculate totals for all sensors, using latest data ---
-            # Only calculate totals for sensors with valid data (not default 'no data' state)
-            sensor_power = data[s.name]['data'].get("power", 0.0)
-            sensor_voltage = data[s.name]['data'].get("voltage", 0.0)
-            
-            # Skip sensors with no readings (voltage and power both 0 usually indicates no data)
-            if sensor_voltage > 0 or sensor_power != 0:
-                if s.type == "Solar":
-                    # Use absolute power for solar in case of negative readings due to wiring
-                    solar_total += abs(sensor_power)
-                elif s.type == "Wind":
-                    # For wind turbines, use absolute power for totals since negative power
-                    # just indicates current direction (depends on wiring/sensor orientation)
-                    wind_total += abs(sensor_power)
-                elif s.type == "Battery":
-                    soc = data[s.name]['data'].get("state_of_charge", 0.0)
-                    status = data[s.name]['data'].get("status", "")
-                    average_battery_soc += soc
-                    battery_count += 1
-                    if status == "charging":
-                        battery_in_total += abs(sensor_power)
-                    elif status == "discharging":
-                        battery_out_total += abs(sensor_power)
-
-        # Calculate average SoC
-        if battery_count > 0:
-            average_battery_soc = average_battery_soc / battery_count
-
-        # Calculate total power generation (solar + wind)
-        total_power_generation = solar_total + wind_total
-        
-        self.totals_data = {
-            "solar_total": round(solar_total, 2),
-            "wind_total": round(wind_total, 2),
-            "total_power": round(total_power_generation, 2),
-            "battery_soc_total": round(average_battery_soc, 2),
-            "battery_in_total": round(battery_in_total, 2),
-            "battery_out_total": round(battery_out_total, 2)
-        }
+                    logger.info(f"New Reading - {s.name}: {data[s.name]['data']['voltage']}V, {data[s.name]['data']['current']}A, {data[s.name]['data']['power']}W")
+                    self.mqtt.publish_new_data(s.name, sensor_data)
+                    self.webserver.broadcast_sensor_data()
+                else:
+                    if s.readings:
+                        sensor_data = s.current_data()
+                        data[s.name]['data'] = sensor_data
+                    else:
+                        sensor_data = {
+                            "voltage": 0,
+                            "current": 0,
+                            "power": 0,
+                            "time_stamp": "Not Updated",
+                            "status": "no data" if s.type == "Battery" else None,
+                            "state_of_charge": 0 if s.type == "Battery" else None,
+                            "output": 0 if s.type != "Battery" else None,
+                            "readings": []
+                        }
+                        data[s.name]['data'] = sensor_data
+                entry = data[s.name]
+
+            if new_reading:
+                self.evaluate_alerts(s, entry['data'], last_read, current_time)
+                # The raw per-poll reading with its own ts, not the smoothed payload
+                sample = s.readings[-1] if s.readings else None
+                if sample is not None and sample is not last_sample:
+                    self.archive.append(s.name, sample, current_time)
+            # Totals only change when a sensor has a new reading
+            if new_reading or resync:
+                self.totals.update(s.name, entry['type'], entry['data'])
+
+        if resync:
+            self.totals.retain(self.sensors.names() + self.federation.sensor_names())
+            self.totals_generation = self.sensors.generation
+        # Peer instances' sensors, devices and their share of the totals
+        self.federation.merge(data, device_status, self.totals)
+        self.totals_data = self.totals.totals()
 
         self.mqtt.publish_totals_data(self.totals_data)
+        for group_id, name, totals in self.totals.take_changed():
+            self.mqtt.publish_totals_data(totals, group_id)
         data["totals"] = self.totals_data
+        data["groups"] = self.totals.group_totals()
+        data["alerts"] = {"rules": len(self.alerts.rules), "active": self.alerts.active()}
         data["devices"] = device_status
         data["system_status"] = {
             "connected_devices": connected_devices,
             "total_devices": len(self.device_configs),
-            "active_sensors": len([s for s in self.sensors if hasattr(s, 'readings') and s.readings])
+            "active_sensors": len([s for s in self.sensors if hasattr(s, 'readings') and s.readings]),
+            # Duration of the previous poll cycle (see sensor_monitor/health.py)
+            "cycle_ms": self.health.cycle_ms()["last"]
         }
         return data
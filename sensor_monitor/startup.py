@@ -0,0 +1,81 @@
+# sensor_monitor/startup.py
+import sys
+import time
+import threading
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+DEVICE_CONNECTING = "connecting"
+DEVICE_CONNECTED = "connected"
+DEVICE_OFFLINE = "offline"
+
+
+class StartupProgress:
+    """
+    Tracks the background startup (device connects, sensor setup, MQTT) so the
+    web UI's loading screen can show what is still pending. on_change is
+    called with to_dict() after every step.
+    """
+    def __init__(self, devices, on_change=None):
+        self.lock = threading.Lock()
+        self.on_change = on_change
+        self.started = time.time()
+        self.devices = {str(d.id): {"name": d.name, "state": DEVICE_CONNECTING} for d in devices}
+        self.sensors = 0
+        self.mqtt = None  # None until the first connect attempt finishes
+        self.done = False
+
+    def is_connecting(self, device_id):
+        with self.lock:
+            entry = self.devices.get(str(device_id))
+            return entry is not None and entry["state"] == DEVICE_CONNECTING
+
+    def device_finished(self, device, connected, sensors=0):
+        with self.lock:
+            self.devices[str(device.id)] = {"name": device.name,
+                                            "state": DEVICE_CONNECTED if connected else DEVICE_OFFLINE}
+            self.sensors += sensors
+        self._changed()
+
+    def mqtt_finished(self, connected):
+        with self.lock:
+            self.mqtt = connected
+        self._changed()
+
+    def finish(self):
+        with self.lock:
+            self.done = True
+        logger.info(f"Startup finished in {time.time() - self.started:.1f}s")
+        self._changed()
+
+    def to_dict(self):
+        with self.lock:
+            total = len(self.devices)
+            finished = sum(1 for d in self.devices.values() if d["state"] != DEVICE_CONNECTING)
+            steps = finished + (self.mqtt is not None)
+            if self.done:
+                message = "Startup complete"
+            elif finished < total:
+                message = f"Connecting devices ({finished}/{total})"
+            elif self.mqtt is None:
+                message = "Connecting to MQTT broker"
+            else:
+                message = "Finishing startup"
+            return {
+                "done": self.done,
+                "progress": 100 if self.done else int(100 * steps / (total + 2)),
+                "message": message,
+                "devices": {k: dict(v) for k, v in self.devices.items()},
+                "sensors": self.sensors,
+                "mqtt": self.mqtt
+            }
+
+    def _changed(self):
+        if self.on_change:
+            try:
+                self.on_change(self.to_dict())
+            except Exception as e:
+                logger.warning(f"Failed to report startup progress: {e}")
@@ -0,0 +1,138 @@
+# sensor_monitor/storage.py
+import os
+import sys
+import json
+import atexit
+import weakref
+import tempfile
+import threading
+try:
+    from pathlib import Path
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# Seconds to hold back a write so a burst of edits becomes one write
+WRITE_DELAY = 2.0
+RETRY_DELAY = 10.0
+
+_stores = weakref.WeakSet()
+
+
+def atomic_write_json(path, data, indent=None):
+    """
+    Write JSON so the file is either the old or the new version, never a
+    truncated mix: write a temp file in the same directory, fsync it, rename
+    it over the target and fsync the directory.
+    """
+    path = Path(path)
+    directory = path.parent if str(path.parent) else Path(".")
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass  # Not supported on every filesystem
+
+
+class JsonStore:
+    """
+    The in-memory copy of one JSON file and the single source of truth for it.
+    set() replaces the data and schedules a write-behind; edits arriving within
+    `delay` seconds are coalesced into one atomic write.
+    """
+    def __init__(self, path, default=None, delay=WRITE_DELAY, indent=4):
+        self.path = Path(path)
+        self.delay = delay
+        self.indent = indent
+        self.lock = threading.RLock()
+        self.timer = None
+        self.dirty = False
+        self.exists = False
+        self.data = self.load(default)
+        _stores.add(self)
+
+    def load(self, default=None):
+        """Read the file from disk; returns default if it is missing or unreadable"""
+        with self.lock:
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                self.exists = True
+                return data
+            except FileNotFoundError:
+                self.exists = False
+            except (OSError, ValueError) as e:
+                self.exists = False
+                logger.error(f"Failed to read {self.path}: {e}")
+            return default
+
+    def reload(self, default=None):
+        with self.lock:
+            self.data = self.load(default)
+            self.dirty = False
+            return self.data
+
+    def get(self):
+        return self.data
+
+    def set(self, data):
+        """Replace the data; the file is written after the write-behind delay"""
+        with self.lock:
+            self.data = data
+            self.dirty = True
+            self._schedule(self.delay)
+
+    def save_now(self, data):
+        """Replace the data and write it immediately (first run, backups, shutdown)"""
+        with self.lock:
+            self.data = data
+            self.dirty = True
+            self.flush()
+
+    def _schedule(self, delay):
+        if self.timer is None:
+            self.timer = threading.Timer(delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            try:
+                atomic_write_json(self.path, self.data, self.indent)
+                self.dirty = False
+                self.exists = True
+                logger.info(f"Saved {self.path}")
+            except Exception as e:
+                logger.error(f"Failed to save {self.path}: {e}. Retrying in {RETRY_DELAY}s")
+                self._schedule(RETRY_DELAY)
+
+
+def flush_all():
+    """Write out any pending edits (called at shutdown)"""
+    for store in list(_stores):
+        store.flush()
+
+
+atexit.register(flush_all)
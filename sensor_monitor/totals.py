@@ -0,0 +1,190 @@
+# sensor_monitor/totals.py
+import sys
+import threading
+try:
+    from sensor_monitor.logger import logger
+except Exception as ex:
+    print("Error loading config: " + str(ex))
+    sys.exit()
+
+# A sensor's contribution to every aggregate it belongs to:
+# (solar W, wind W, SoC sum, battery count, battery in W, battery out W)
+ZERO = (0.0, 0.0, 0.0, 0, 0.0, 0.0)
+# Incremental sums pick up float error; rebuild them exactly this often
+REBUILD_INTERVAL = 3600
+
+
+def contribution(sensor_type, data):
+    """What one sensor adds to the totals for its latest data"""
+    power = data.get("power") or 0.0
+    voltage = data.get("voltage") or 0.0
+    # Voltage and power both 0 usually means no data yet
+    if not (voltage > 0 or power != 0):
+        return ZERO
+    if sensor_type == "Solar":
+        # Absolute power in case of negative readings due to wiring
+        return (abs(power), 0.0, 0.0, 0, 0.0, 0.0)
+    if sensor_type == "Wind":
+        # Negative power just indicates current direction
+        return (0.0, abs(power), 0.0, 0, 0.0, 0.0)
+    if sensor_type == "Battery":
+        status = data.get("status", "")
+        return (0.0, 0.0, data.get("state_of_charge") or 0.0, 1,
+                abs(power) if status == "charging" else 0.0,
+                abs(power) if status == "discharging" else 0.0)
+    return ZERO
+
+
+def _round(value):
+    return round(value, 2) + 0.0  # + 0.0 turns -0.0 into 0.0
+
+
+class Aggregate:
+    """Running sums for one group (or all sensors)"""
+    def __init__(self, group_id=None, name="Totals", parent=None, sensors=()):
+        self.id = group_id
+        self.name = name
+        self.parent = parent
+        self.sensors = list(sensors)
+        self.sums = list(ZERO)
+        self.dirty = True
+
+    def apply(self, old, new, sign=1):
+        for i in range(len(self.sums)):
+            self.sums[i] += sign * (new[i] - old[i])
+        self.dirty = True
+
+    def reset(self):
+        self.sums = list(ZERO)
+        self.dirty = True
+
+    def to_dict(self):
+        solar, wind, soc, batteries, battery_in, battery_out = self.sums
+        return {
+            "solar_total": _round(solar),
+            "wind_total": _round(wind),
+            "total_power": _round(solar + wind),
+            "battery_soc_total": _round(soc / batteries) if batteries > 0 else 0.0,
+            "battery_in_total": _round(battery_in),
+            "battery_out_total": _round(battery_out)
+        }
+
+
+class TotalsTree:
+    """
+    Totals for all sensors plus user-defined groups (config.json "groups"),
+    e.g. a site containing battery banks and solar arrays. A group's totals
+    include its own sensors and those of its child groups. Each new reading
+    updates only the aggregates the sensor belongs to, by the difference from
+    its previous contribution.
+    """
+    def __init__(self, groups=None):
+        self.lock = threading.Lock()
+        self.root = Aggregate()
+        self.groups = {}        # group id -> Aggregate
+        self.members = {}       # sensor name -> Aggregates it counts towards (root excluded)
+        self.contributions = {}  # sensor name -> last contribution
+        self.updates = 0
+        self.configure(groups or [])
+
+    def configure(self, groups):
+        """Build the group tree; groups with a missing or circular parent become top-level"""
+        definitions = {}
+        for group in groups:
+            group_id = str(group.get("id") or "").strip()
+            if not group_id:
+                logger.warning(f"Ignoring group without an id: {group}")
+                continue
+            definitions[group_id] = group
+
+        aggregates = {}
+        for group_id, group in definitions.items():
+            parent = group.get("parent")
+            parent = str(parent) if parent not in (None, "") else None
+            if parent is not None and parent not in definitions:
+                logger.warning(f"Group {group_id}: parent {parent} not found, treating it as top-level")
+                parent = None
+            aggregates[group_id] = Aggregate(group_id, group.get("name", group_id), parent, group.get("sensors", []))
+
+        members = {}
+        for group_id, aggregate in aggregates.items():
+            chain = self._ancestry(group_id, aggregates)
+            for sensor in aggregate.sensors:
+                members.setdefault(sensor, {}).update((a.id, a) for a in chain)
+        with self.lock:
+            self.groups = aggregates
+            self.members = {name: tuple(chain.values()) for name, chain in members.items()}
+            self._rebuild()
+        logger.info(f"Totals configured with {len(aggregates)} group(s)")
+
+    def _ancestry(self, group_id, aggregates):
+        """The group and its ancestors, stopping at a cycle"""
+        chain = []
+        seen = set()
+        while group_id is not None and group_id not in seen:
+            seen.add(group_id)
+            chain.append(aggregates[group_id])
+            group_id = aggregates[group_id].parent
+        if group_id is not None:
+            logger.warning(f"Group {group_id}: circular parent chain, ancestors after it are ignored")
+        return chain
+
+    def update(self, name, sensor_type, data):
+        """Apply a sensor's new data; returns True if any totals changed"""
+        new = contribution(sensor_type, data)
+        with self.lock:
+            old = self.contributions.get(name, ZERO)
+            if new == old:
+                return False
+            self.contributions[name] = new
+            self.root.apply(old, new)
+            for aggregate in self.members.get(name, ()):
+                aggregate.apply(old, new)
+            self.updates += 1
+            if self.updates >= REBUILD_INTERVAL:
+                self._rebuild()
+            return True
+
+    def remove(self, name):
+        with self.lock:
+            old = self.contributions.pop(name, None)
+            if old is None:
+                return
+            self.root.apply(ZERO, old, sign=-1)
+            for aggregate in self.members.get(name, ()):
+                aggregate.apply(ZERO, old, sign=-1)
+
+    def retain(self, names):
+        """Drop sensors that no longer exist"""
+        names = set(names)
+        for name in [n for n in self.contributions if n not in names]:
+            self.remove(name)
+
+    def _rebuild(self):
+        self.updates = 0
+        self.root.reset()
+        for aggregate in self.groups.values():
+            aggregate.reset()
+        for name, value in self.contributions.items():
+            self.root.apply(ZERO, value)
+            for aggregate in self.members.get(name, ()):
+                aggregate.apply(ZERO, value)
+
+    def totals(self):
+        with self.lock:
+            return self.root.to_dict()
+
+    def group_totals(self):
+        with self.lock:
+            return {
+                group_id: {"name": a.name, "parent": a.parent, "sensors": list(a.sensors), **a.to_dict()}
+                for group_id, a in self.groups.items()
+            }
+
+    def take_changed(self):
+        """Groups whose totals changed since the last call (for publishing)"""
+        with self.lock:
+            changed = [a for a in self.groups.values() if a.dirty]
+            for aggregate in changed:
+                aggregate.dirty = False
+            return [(a.id, a.name, a.to_dict()) for a in changed]
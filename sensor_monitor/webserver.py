@@ -1,29 +1,70 @@
 # sensor_monitor/webserver.py
 
-import json
+import io
+import itertools
 import subprocess
 import sys
+import time
+import threading
+from datetime import datetime
 try:
-    from flask import Flask, render_template, request, send_file, abort, jsonify
-    from flask_socketio import SocketIO
+    from flask import Flask, Response, render_template, request, send_file, abort, jsonify, stream_with_context
+    from flask_socketio import SocketIO, join_room, leave_room
+    from werkzeug.utils import secure_filename
     from sensor_monitor.live_data import sensor_data
     from sensor_monitor.config_manager import ROOT
+    from sensor_monitor.storage import flush_all
+    from sensor_monitor.encoding import compact_available, compact_sensor_data, encode_compact
+    from sensor_monitor.burst import BurstRecorder, DEFAULT_BURST_DURATION, DEFAULT_BURST_RATE, DEFAULT_BURST_POINTS
+    from sensor_monitor.downsample import downsample_readings, readings_version, series_cache
+    from sensor_monitor.archive import iter_csv, iter_parquet
+    from sensor_monitor.battery import BLOCK_VOLTAGE
     from sensor_monitor.logger import logger
 except Exception as ex:
     print("Error loading config: " + str(ex))
     sys.exit()
 
+# Room joined by clients that want every sensor (the main dashboard)
+ALL_ROOM = "all"
+# Non-sensor entries included in every sensor_update slice
+SYSTEM_KEYS = ("totals", "groups", "devices", "system_status", "peers", "alerts")
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+# Upper bound on the points= width a client can ask for
+MAX_POINTS = 10000
+
 class flaskWrapper:
-    def __init__(self, config_manager, sensor_config):
+    def __init__(self, config_manager, sensor_config, async_mode="threading"):
         self.config_manager = config_manager
         self.sensor_config = sensor_config
         self.mqtt_publisher = None  # Will be set by SensorManager
+        self.startup = None  # StartupProgress, set by SensorManager
+        # Callbacks set by SensorManager to apply changes without a restart
+        self.on_config_change = None
+        self.on_sensors_change = None
+        self.on_scan = None
+        self.on_alerts = None
+        self.archive = None  # Archiver, set by SensorManager
+        self.on_health = None
+        self.burst = BurstRecorder()
         self.templatePath = ROOT / "templates/"
         self.stylePath = ROOT / "static/"
         self.readmePath = ROOT / "README.md"
         self.logFilePath = ROOT / "sensor_monitor.log"
         self.app = Flask(__name__, template_folder=self.templatePath, static_folder=self.stylePath)
-        self.socketio = SocketIO(self.app, async_mode='threading', ping_timeout=60,ping_interval=25)
+        # http_compression deflates long-polling responses above compression_threshold bytes
+        # Other modes (eventlet, gevent) are for benchmarks/ws_load.py; the service runs threaded
+        self.socketio = SocketIO(self.app, async_mode=async_mode, ping_timeout=60,ping_interval=25,
+                                 http_compression=True, compression_threshold=1024)
+        # Subscription rooms: sid -> room, room -> (filter spec, encoding, points), room -> client count
+        self.subscription_lock = threading.Lock()
+        self.client_rooms = {}
+        self.room_specs = {}
+        self.room_members = {}
+        self.socketio.on_event("connect", self.on_connect)
+        self.socketio.on_event("disconnect", self.on_disconnect)
+        self.socketio.on_event("subscribe", self.subscribe)
+        self.socketio.on_event("sensor_update_request", self.sensor_update_request)
         self.app.route("/", methods=["GET", "POST"])(self.main)
         self.app.route('/get_settings', methods=["GET", "POST"])(self.get_settings) 
         self.app.route('/update_settings', methods=["GET", "POST"])(self.update_settings) 
@@ -40,6 +81,14 @@ class flaskWrapper:
         self.app.route("/list_backups", methods=["GET", "POST"])(self.list_backups)
         self.app.route("/debug", methods=["GET"])(self.serve_debug)
         self.app.route("/mqtt_status", methods=["GET"])(self.get_mqtt_status)
+        self.app.route("/burst", methods=["POST"])(self.start_burst)
+        self.app.route("/burst/status", methods=["GET"])(self.get_burst_status)
+        self.app.route("/burst/download", methods=["GET"])(self.download_burst)
+        self.app.route("/scan", methods=["GET"])(self.scan_devices)
+        self.app.route("/history", methods=["GET"])(self.get_history)
+        self.app.route("/alerts", methods=["GET"])(self.get_alerts)
+        self.app.route("/export", methods=["GET"])(self.export_archive)
+        self.app.route("/healthz", methods=["GET"])(self.get_health)
 
 
     def main(self):
@@ -52,14 +101,34 @@ class flaskWrapper:
         data = request.get_json()
         original_name = data["original_name"]
         new_name = data["name"]
-        new_type = data.get("type", sensor_data[original_name]["type"])
-        max_power = int(data.get("max_power", 100))
-        rating = int(data.get("rating", 100))
-        address = data.get("address", sensor_data[original_name]["address"])
-        device_id = data.get("device_id", sensor_data[original_name]["device_id"])
+        current = sensor_data[original_name]
+        new_type = data.get("type", current["type"])
+        # Fields left out keep their current values; a made-up rating would resize a battery bank
+        max_power = int(data.get("max_power") or current.get("max_power", 100))
+        rating = self.parse_rating(data.get("rating"), new_type, current.get("rating", BLOCK_VOLTAGE))
+        if rating is None:
+            return jsonify({"status": "error", "message": f"Invalid rating for a {new_type} sensor"}), 400
+        address = data.get("address", current["address"])
+        device_id = data.get("device_id", current["device_id"])
 
-        self.sensor_config.update_sensor(original_name, new_name, new_type, max_power, rating, address, device_id)
+        self.sensor_config.update_sensor(original_name, new_name, new_type, max_power, rating, address, device_id,
+                                         battery_model=data.get("battery_model"),
+                                         battery_curve=data.get("battery_curve"),
+                                         internal_resistance=data.get("internal_resistance"))
         return jsonify({"status": "success"})
+
+    def parse_rating(self, value, sensor_type, default):
+        """Voltage rating from a form, default when left empty, None when invalid"""
+        if value is None or value == "":
+            value = default
+        try:
+            rating = int(float(value))
+        except (TypeError, ValueError):
+            return None
+        # A battery bank is sized in 12 V blocks (see battery.bank_blocks); under half a block is a typo
+        if rating <= 0 or (sensor_type == "Battery" and round(rating / BLOCK_VOLTAGE) < 1):
+            return None
+        return rating
     
 
     def get_mqtt_status(self):
@@ -81,8 +150,12 @@ class flaskWrapper:
     def update_settings(self):
         try:
             data = request.get_json()
+            old_config = self.config_manager.config_data
             self.config_manager.save_config(data)
-            return jsonify({"status": "success", "message": "Settings updated successfully"})
+            result = {"status": "success", "message": "Settings updated successfully"}
+            if self.on_config_change:
+                result.update(self.on_config_change(old_config, self.config_manager.config_data))
+            return jsonify(result)
         except Exception as e:
             logger.error(f"Error updating settings: {e}")
             return jsonify({"status": "error", "message": str(e)}), 500
@@ -102,7 +175,15 @@ class flaskWrapper:
         restore_config = data.get("restore_config", True)
         restore_sensors = data.get("restore_sensors", True)        
 
+        old_config = self.config_manager.config_data
         self.config_manager.restore_backup(filename, restore_config, restore_sensors)
+        result = {"status": "success"}
+        if restore_config:
+            if self.on_config_change:
+                result.update(self.on_config_change(old_config, self.config_manager.config_data))
+        if restore_sensors and self.on_sensors_change:
+            self.on_sensors_change()
+        return jsonify(result)
 
     def delete_backup(self):
         data = request.json
@@ -152,19 +233,276 @@ class flaskWrapper:
         except Exception as e:
             return jsonify({"error": str(e), "logs": []}), 500
 
-    def broadcast_sensor_data(self):
-        # Include MQTT status in the sensor data broadcast
-        data_with_status = sensor_data.copy()
+    def start_burst(self):
+        data = request.get_json() or {}
+        name = data.get("sensor")
+        sensor = self.sensor_config.sensors.get(name)
+        if sensor is None:
+            return jsonify({"status": "error", "message": "Sensor not found"}), 404
+        try:
+            capture = self.burst.start(sensor, data.get("duration", DEFAULT_BURST_DURATION),
+                                       data.get("rate", DEFAULT_BURST_RATE))
+            return jsonify({"status": "success", "burst": capture.status()})
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({"status": "error", "message": str(e)}), 409
+
+    def scan_devices(self):
+        if not self.on_scan:
+            return jsonify({"status": "error", "message": "Scanning not available"}), 503
+        return jsonify({"status": "success", "devices": self.on_scan()})
+
+    def get_alerts(self):
+        if not self.on_alerts:
+            return jsonify({"status": "error", "message": "Alerts not available"}), 503
+        return jsonify({"status": "success", **self.on_alerts()})
+
+    def get_health(self):
+        if not self.on_health:
+            return jsonify({"status": "failing", "problems": ["Health monitoring not available"]}), 503
+        health = self.on_health()
+        return jsonify(health), 503 if health["status"] == "failing" else 200
+
+    def get_burst_status(self):
+        return jsonify(self.burst.status())
+
+    def download_burst(self):
+        capture = self.burst.result()
+        if capture is None:
+            return abort(404, "No completed burst capture")
+        points = request.args.get("points", DEFAULT_BURST_POINTS, type=int)
+        file_format = request.args.get("format", "csv")
+        stamp = capture.started.strftime("%Y%m%d-%H%M%S")
+        if file_format == "bin":
+            return send_file(io.BytesIO(capture.to_binary(points)), mimetype="application/octet-stream",
+                             as_attachment=True, download_name=f"burst-{capture.sensor.name}-{stamp}.bin")
+        return send_file(io.BytesIO(capture.to_csv(points)), mimetype="text/csv",
+                         as_attachment=True, download_name=f"burst-{capture.sensor.name}-{stamp}.csv")
+
+    def get_history(self):
+        """A sensor's readings, optionally limited to the last `range` seconds and downsampled to `points`"""
+        name = request.args.get("sensor", "")
+        entry = sensor_data.get(name)
+        if not isinstance(entry, dict) or "data" not in entry:
+            return jsonify({"status": "error", "message": "Sensor not found"}), 404
+        points = self.parse_points(request.args.get("points", 0))
+        seconds = max(0, request.args.get("range", 0, type=int) or 0)
+        readings = entry["data"].get("readings") or []
+        return jsonify({"status": "success", "sensor": name, "points": points, "range": seconds,
+                        "total": len(readings), "readings": self.downsampled_readings(name, readings, points, seconds)})
+
+    def export_archive(self):
+        """Stream a sensor's archived readings between `from` and `to` as CSV or Parquet"""
+        if self.archive is None:
+            return jsonify({"status": "error", "message": "Archive not available"}), 503
+        name = request.args.get("sensor", "")
+        if name not in self.archive.sensors():
+            return jsonify({"status": "error", "message": "No archived readings for sensor"}), 404
+        end = self.parse_time(request.args.get("to"), time.time())
+        start = self.parse_time(request.args.get("from"), (end or 0) - 86400)
+        if start is None or end is None:
+            return jsonify({"status": "error", "message": "from/to must be epoch seconds or ISO dates"}), 400
+        file_format = request.args.get("format", "csv")
+        chunks = self.archive.chunks(name, start, end)
+        if file_format == "parquet":
+            try:
+                body = iter_parquet(chunks)
+                first = next(body)  # Fails here, before any response is sent, if pyarrow is missing
+            except RuntimeError as e:
+                return jsonify({"status": "error", "message": str(e)}), 501
+            body = itertools.chain((first,), body)
+            mimetype, extension = "application/vnd.apache.parquet", "parquet"
+        elif file_format == "csv":
+            body, mimetype, extension = iter_csv(chunks), "text/csv", "csv"
+        else:
+            return jsonify({"status": "error", "message": "format must be csv or parquet"}), 400
+        filename = f"{secure_filename(name) or 'sensor'}-{time.strftime('%Y%m%d', time.localtime(start))}.{extension}"
+        # Generated a block at a time, so a year of readings never sits in memory
+        return Response(stream_with_context(body), mimetype=mimetype,
+                        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    def parse_time(self, value, default):
+        """Epoch seconds or an ISO date/datetime; default when empty, None when invalid or out of range"""
+        if not value:
+            return default
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                return datetime.fromisoformat(value).timestamp()
+            except ValueError:
+                return None
+        # float() takes inf and nan, and the archive needs a real calendar date
+        try:
+            datetime.fromtimestamp(seconds)
+        except (OverflowError, OSError, ValueError):
+            return None
+        return seconds
+
+    def parse_points(self, value):
+        try:
+            return max(0, min(int(value or 0), MAX_POINTS))
+        except (TypeError, ValueError):
+            return 0
+
+    def downsampled_readings(self, name, readings, points, seconds=0):
+        if seconds:
+            cutoff = time.time() - seconds
+            readings = [r for r in readings if r.get("ts", cutoff) >= cutoff]
+        if not points or len(readings) <= points:
+            return readings
+        return series_cache.get((name, seconds, points), readings_version(readings),
+                                lambda: downsample_readings(readings, points))
+
+    def on_connect(self, auth=None):
+        # Clients see every sensor as JSON until they subscribe to something narrower
+        self._join_subscription(request.sid, ALL_ROOM, None, ENCODING_JSON, 0)
+        if self.startup and not self.startup.done:
+            self.socketio.emit("startup_progress", self.startup.to_dict(), to=request.sid)
+
+    def on_disconnect(self, *args):
+        self._leave_subscription(request.sid)
+
+    def subscribe(self, message=None):
+        """
+        Subscribe the client to a slice of the sensor data.
+        message may contain "sensors", "types" and "devices" lists; a sensor is
+        included if it matches any of them. An empty message subscribes to all.
+        "encoding": "msgpack" switches the client to binary sensor_update_bin frames.
+        "points": N downsamples each sensor's readings to about N entries.
+        """
+        message = message or {}
+        spec = self.parse_subscription(message)
+        encoding = self.negotiate_encoding(message.get("encoding"))
+        points = self.parse_points(message.get("points"))
+        room = self.subscription_room(spec, encoding, points)
+        sid = request.sid
+        self._join_subscription(sid, room, spec, encoding, points)
+        logger.info(f"Client {sid} subscribed to room {room}")
+        self.emit_sensor_data(sid, spec, encoding, self.get_status_fields(), points)
+        return {"room": room, "encoding": encoding, "points": points}
+
+    def sensor_update_request(self, *args):
+        with self.subscription_lock:
+            room = self.client_rooms.get(request.sid, ALL_ROOM)
+            spec, encoding, points = self.room_specs.get(room, (None, ENCODING_JSON, 0))
+        self.emit_sensor_data(request.sid, spec, encoding, self.get_status_fields(), points)
+
+    def parse_subscription(self, message):
+        def as_set(key):
+            values = message.get(key) or []
+            if isinstance(values, (str, int)):
+                values = [values]
+            return frozenset(str(v) for v in values if str(v) != "")
+
+        spec = {
+            "sensors": as_set("sensors"),
+            "types": frozenset(t.capitalize() for t in as_set("types")),
+            "devices": as_set("devices"),
+        }
+        if not any(spec.values()):
+            return None
+        return spec
+
+    def negotiate_encoding(self, requested):
+        if requested != ENCODING_MSGPACK:
+            return ENCODING_JSON
+        if not self.config_manager.config_data.get("compact_encoding", 0):
+            logger.info("Client requested msgpack but compact_encoding is disabled, using JSON")
+            return ENCODING_JSON
+        if not compact_available():
+            logger.warning("Client requested msgpack but the msgpack package is not installed, using JSON")
+            return ENCODING_JSON
+        return ENCODING_MSGPACK
+
+    def subscription_room(self, spec, encoding=ENCODING_JSON, points=0):
+        """Canonical room name, so clients with the same filter share one emit"""
+        if spec is None:
+            room = ALL_ROOM
+        else:
+            parts = [f"{key}={','.join(sorted(spec[key]))}" for key in ("sensors", "types", "devices") if spec[key]]
+            room = "filter:" + "|".join(parts)
+        if encoding != ENCODING_JSON:
+            room += f"#{encoding}"
+        if points:
+            room += f"~{points}"
+        return room
+
+    def _join_subscription(self, sid, room, spec, encoding, points):
+        self._leave_subscription(sid)
+        join_room(room, sid=sid)
+        with self.subscription_lock:
+            self.client_rooms[sid] = room
+            self.room_specs[room] = (spec, encoding, points)
+            self.room_members[room] = self.room_members.get(room, 0) + 1
+
+    def _leave_subscription(self, sid):
+        with self.subscription_lock:
+            room = self.client_rooms.pop(sid, None)
+            if room is None:
+                return
+            self.room_members[room] -= 1
+            if self.room_members[room] <= 0:
+                del self.room_members[room]
+                self.room_specs.pop(room, None)
+        leave_room(room, sid=sid)
+
+    def get_status_fields(self):
         if self.mqtt_publisher:
-            data_with_status['mqtt_connection_status'] = 1 if self.mqtt_publisher.is_connected() else 0
+            return {'mqtt_connection_status': 1 if self.mqtt_publisher.is_connected() else 0}
+        return {'mqtt_connection_status': 0}
+
+    def slice_sensor_data(self, spec, status_fields, points=0):
+        """Return the sensors matching spec plus the system entries, readings downsampled to points"""
+        if spec is None:
+            data = sensor_data.copy()
         else:
-            data_with_status['mqtt_connection_status'] = 0
-        
-        self.socketio.emit("sensor_update", data_with_status)
+            data = {}
+            for name, entry in list(sensor_data.items()):
+                if name in SYSTEM_KEYS:
+                    data[name] = entry
+                elif (name in spec["sensors"]
+                      or entry.get("type") in spec["types"]
+                      or str(entry.get("device_id")) in spec["devices"]):
+                    data[name] = entry
+        if points:
+            for name, entry in data.items():
+                readings = entry.get("data", {}).get("readings") if name not in SYSTEM_KEYS else None
+                if isinstance(readings, list) and len(readings) > points:
+                    data[name] = dict(entry, data=dict(entry["data"], readings=self.downsampled_readings(name, readings, points)))
+        data.update(status_fields)
+        return data
+
+    def emit_sensor_data(self, to, spec, encoding, status_fields, points=0):
+        data = self.slice_sensor_data(spec, status_fields, points)
+        if encoding == ENCODING_MSGPACK:
+            self.socketio.emit("sensor_update_bin", encode_compact(compact_sensor_data(data)), to=to)
+        else:
+            self.socketio.emit("sensor_update", data, to=to)
+
+    def emit_alert(self, event):
+        # Fired and cleared alerts go to every client, whatever it subscribed to
+        self.socketio.emit("alert", event)
+
+    def emit_startup_progress(self, progress):
+        # Shown on the loading screen while devices are still connecting
+        self.socketio.emit("startup_progress", progress)
+
+    def broadcast_sensor_data(self):
+        # Only build slices for rooms that currently have clients
+        with self.subscription_lock:
+            rooms = [(room, *self.room_specs[room]) for room in self.room_members]
+        if not rooms:
+            return
+        status_fields = self.get_status_fields()
+        for room, spec, encoding, points in rooms:
+            self.emit_sensor_data(room, spec, encoding, status_fields, points)
 
     def restart_program(self):
         try:
             logger.info("Restarting.....")
+            flush_all()  # Write pending config/sensor edits before systemd stops us
             subprocess.Popen(["sudo", "systemctl", "restart", "sensor_monitor.service"])
             logger.info("Restarted Sucessfully ")
             return jsonify({"status": "restarting"}), 200
@@ -179,19 +517,22 @@ class flaskWrapper:
         gpio_address = data.get("gpio_address", "")
         try:
             # Add to config and save
+            old_config = self.config_manager.config_data
+            devices = list(old_config.get("devices", []))
+            ids = [int(d.get("id", 0)) for d in devices if str(d.get("id", 0)).isdigit()]
             new_device = {
                 "name": name,
+                "id": max(ids) + 1 if ids else 0,
                 "remote_gpio": remote_gpio,
                 "gpio_address": gpio_address
             }
-            # Load, append, and save
-            with open(self.config_manager.DEVICE_FILE, "r") as f:
-                devices = json.load(f)
             devices.append(new_device)
-            with open(self.config_manager.DEVICE_FILE, "w") as f:
-                json.dump(devices, f)
+            self.config_manager.write_config(dict(old_config, devices=devices))
             logger.info(f"Added new device: {name}")
-            return jsonify({"status": "success"})
+            result = {"status": "success"}
+            if self.on_config_change:
+                result.update(self.on_config_change(old_config, self.config_manager.config_data))
+            return jsonify(result)
         except Exception as e:
             logger.error(f"Failed to add device: {e}")
             return jsonify({"status": "error", "message": str(e)}), 500
@@ -201,7 +542,9 @@ class flaskWrapper:
         name = data.get("name")
         sensor_type = data.get("type")
         max_power = int(data.get("max_power", 100))
-        rating = int(data.get("rating", 12))
+        rating = self.parse_rating(data.get("rating"), sensor_type, BLOCK_VOLTAGE)
+        if rating is None:
+            return jsonify({"status": "error", "message": f"Invalid rating for a {sensor_type} sensor"}), 400
         address = data.get("address")
         try:
             # Add to config and save
@@ -212,13 +555,15 @@ class flaskWrapper:
                 "max_power": max_power,
                 "rating": rating
             }
-            # Load, append, and save
-            with open(self.config_manager.SENSOR_FILE, "r") as f:
-                sensors = json.load(f)
+            if sensor_type == "Battery":
+                new_sensor["battery_model"] = data.get("battery_model", "lead_acid")
+            # Append to the in-memory sensor list; the file is written behind
+            sensors = list(self.config_manager.sensor_store.get() or [])
             sensors.append(new_sensor)
-            with open(self.config_manager.SENSOR_FILE, "w") as f:
-                json.dump(sensors, f)
+            self.config_manager.sensor_store.set(sensors)
             logger.info(f"Added new sensor: {name}")
+            if self.on_sensors_change:
+                self.on_sensors_change()
             return jsonify({"status": "success"})
         except Exception as e:
             logger.error(f"Failed to add sensor: {e}")
@@ -4,7 +4,8 @@
 // Handles the main dashboard interface for monitoring solar, wind, and battery systems
 // Provides real-time power generation statistics and system health information
 
-import { isSensorConnected, getConnectedDevicesInfo, getConnectedSensorsInfo } from './utils.js';
+import { isSensorConnected, getConnectedDevicesInfo, getConnectedSensorsInfo, escapeHTML } from './utils.js';
+import { setText, setHTML } from './render.js';
 
 // Create dashboard statistics cards based on sensor data
 export function createDashboardStats(data = {}) {
@@ -127,6 +128,17 @@ export function createDashboardStats(data = {}) {
         const card = createStatCard(stat);
         dashboardGrid.appendChild(card);
     });
+
+    // One card per user-defined group (site, bank, array)
+    const groups = data.groups || {};
+    for (const [groupId, group] of Object.entries(groups)) {
+        dashboardGrid.appendChild(createGroupCard(groupId, group, groups));
+    }
+
+    // Active alerts, shown once any alert rules are configured
+    if (data.alerts?.rules) {
+        dashboardGrid.appendChild(createAlertsCard(data.alerts));
+    }
     
     // Apply responsive layout adjustments
     if (stats.length === 1 && window.innerWidth <= 768) {
@@ -288,6 +300,85 @@ function createGenericCardHTML(stat) {
     `;
 }
 
+// Create a totals card for one group
+function createGroupCard(groupId, group, groups) {
+    const card = document.createElement('div');
+    card.className = 'dashboard-card total-theme group-card';
+    card.id = `group-card-${groupId}`;
+    const parent = group.parent && groups[group.parent] ? `Part of ${groups[group.parent].name}` : 'Group';
+    const entry = (label, field, value, unit) => `
+                <div class="dashboard-entry">
+                    <span class="dashboard-label">${label}:</span>
+                    <span class="dashboard-value"><span data-value="group-${groupId}-${field}">${value}</span>${unit}</span>
+                </div>`;
+    card.innerHTML = `
+        <div class="dashboard-card-header">
+            <div class="dashboard-card-icon">
+                <i class="fa-solid fa-layer-group"></i>
+            </div>
+            <div class="dashboard-card-title">
+                <h3>${group.name}</h3>
+                <p>${parent} · Sensors: ${(group.sensors || []).length}</p>
+            </div>
+        </div>
+        <div class="dashboard-card-content">
+            <div class="dashboard-main-entry">
+                <div class="dashboard-main-value"><span data-value="group-${groupId}-power">${(group.total_power || 0).toFixed(2)}</span><span class="dashboard-card-unit">W</span></div>
+            </div>
+            <div class="dashboard-entries">
+                ${entry('Solar', 'solar', (group.solar_total || 0).toFixed(1), 'W')}
+                ${entry('Wind', 'wind', (group.wind_total || 0).toFixed(1), 'W')}
+                ${entry('Battery SoC', 'soc', (group.battery_soc_total || 0).toFixed(1), '%')}
+                ${entry('Charging', 'in', (group.battery_in_total || 0).toFixed(1), 'W')}
+                ${entry('Discharging', 'out', (group.battery_out_total || 0).toFixed(1), 'W')}
+            </div>
+        </div>
+    `;
+    return card;
+}
+
+// Create the card listing active alerts
+function createAlertsCard(alerts) {
+    const card = document.createElement('div');
+    card.className = 'dashboard-card total-theme';
+    card.id = 'alerts-card';
+    card.innerHTML = `
+        <div class="dashboard-card-header">
+            <div class="dashboard-card-icon">
+                <i class="fa-solid fa-triangle-exclamation"></i>
+            </div>
+            <div class="dashboard-card-title">
+                <h3>Alerts</h3>
+                <p>Rules: ${alerts.rules}</p>
+            </div>
+        </div>
+        <div class="dashboard-card-content">
+            <div class="dashboard-main-entry">
+                <div class="dashboard-main-value"><span data-value="alerts-active">${alerts.active.length}</span><span class="dashboard-card-unit">active</span></div>
+            </div>
+            <div class="dashboard-entries" id="alerts-list">${alertEntriesHTML(alerts.active)}</div>
+        </div>
+    `;
+    return card;
+}
+
+function updateAlertsCard(alerts) {
+    if (!alerts?.rules) return;
+    updateStatValue('alerts-active', String(alerts.active.length));
+    setHTML(document.getElementById('alerts-list'), alertEntriesHTML(alerts.active));
+}
+
+function alertEntriesHTML(active) {
+    if (!active.length) {
+        return '<div class="dashboard-entry"><span class="dashboard-label">All clear</span></div>';
+    }
+    return active.map(alert => `
+                <div class="dashboard-entry">
+                    <span class="dashboard-label">${escapeHTML(alert.name)}:</span>
+                    <span class="dashboard-value">${escapeHTML(alert.sensor)} ${escapeHTML(alert.field)} ${alert.value ?? ''}</span>
+                </div>`).join('');
+}
+
 // Format trend percentage for display
 function formatTrend(trend) {
     if (trend === 0) return '0%';
@@ -332,6 +423,30 @@ export function updateDashboardStats(data) {
         }
     }
 
+    // Groups added or removed since the cards were built need a full re-render
+    const groups = data.groups || {};
+    const groupCards = document.querySelectorAll('.group-card');
+    const groupIds = Object.keys(groups);
+    if (groupCards.length !== groupIds.length ||
+        groupIds.some(groupId => !document.getElementById(`group-card-${groupId}`))) {
+        createDashboardStats(data);
+        return;
+    }
+    // Same for the alerts card appearing or going away
+    if (Boolean(data.alerts?.rules) !== Boolean(document.getElementById('alerts-card'))) {
+        createDashboardStats(data);
+        return;
+    }
+    updateAlertsCard(data.alerts);
+    for (const [groupId, group] of Object.entries(groups)) {
+        updateStatValue(`group-${groupId}-power`, (group.total_power || 0).toFixed(2));
+        updateStatValue(`group-${groupId}-solar`, (group.solar_total || 0).toFixed(1));
+        updateStatValue(`group-${groupId}-wind`, (group.wind_total || 0).toFixed(1));
+        updateStatValue(`group-${groupId}-soc`, (group.battery_soc_total || 0).toFixed(1));
+        updateStatValue(`group-${groupId}-in`, (group.battery_in_total || 0).toFixed(1));
+        updateStatValue(`group-${groupId}-out`, (group.battery_out_total || 0).toFixed(1));
+    }
+
     // Update dashboard card values with animation
     updateStatValue('total-power', totalPower.toFixed(2));
     updateStatValue('solar-generation', solarPower.toFixed(2));
@@ -348,7 +463,8 @@ export function updateDashboardStats(data) {
 // Update individual statistic card value with animation
 function updateStatValue(statType, newValue) {
     const valueElement = document.querySelector(`[data-value="${statType}"]`);
-    if (!valueElement) return;
+    // Unchanged values are left alone (no DOM write, no animation)
+    if (!valueElement || valueElement.textContent === newValue) return;
     
     // Update the value
     valueElement.textContent = newValue;
@@ -368,12 +484,12 @@ function updateDeviceStatusIndicatorFromUtils(deviceInfo) {
     const deviceIcon = deviceCountDisplay.querySelector('i');
     if (!deviceIcon) return;
     
-    // Reset status classes
-    deviceIcon.classList.remove('status-connected', 'status-partial', 'status-disconnected');
-    
-    // Apply status class from utils
-    deviceIcon.classList.add(deviceInfo.connectionClass);
-    deviceCountDisplay.title = `Device Status: ${deviceInfo.count}`;
+    // Apply status class from utils (toggle only writes when the class actually changes)
+    for (const statusClass of ['status-connected', 'status-partial', 'status-disconnected']) {
+        deviceIcon.classList.toggle(statusClass, statusClass === deviceInfo.connectionClass);
+    }
+    const deviceTitle = `Device Status: ${deviceInfo.count}`;
+    if (deviceCountDisplay.title !== deviceTitle) deviceCountDisplay.title = deviceTitle;
     
     // Add count number as text content after icon
     let countSpan = deviceCountDisplay.querySelector('.count-number');
@@ -382,7 +498,7 @@ function updateDeviceStatusIndicatorFromUtils(deviceInfo) {
         countSpan.className = 'count-number';
         deviceCountDisplay.appendChild(countSpan);
     }
-    countSpan.textContent = deviceInfo.count.split('/')[0]; // Show connected count
+    setText(countSpan, deviceInfo.count.split('/')[0]); // Show connected count
 }
 
 // Update sensor status indicator using utils function data
@@ -393,12 +509,12 @@ function updateSensorStatusIndicatorFromUtils(sensorInfo) {
     const sensorIcon = sensorCountDisplay.querySelector('i');
     if (!sensorIcon) return;
     
-    // Reset status classes
-    sensorIcon.classList.remove('status-connected', 'status-partial', 'status-disconnected');
-    
-    // Apply status class from utils
-    sensorIcon.classList.add(sensorInfo.connectionClass);
-    sensorCountDisplay.title = `Sensor Status: ${sensorInfo.count}`;
+    // Apply status class from utils (toggle only writes when the class actually changes)
+    for (const statusClass of ['status-connected', 'status-partial', 'status-disconnected']) {
+        sensorIcon.classList.toggle(statusClass, statusClass === sensorInfo.connectionClass);
+    }
+    const sensorTitle = `Sensor Status: ${sensorInfo.count}`;
+    if (sensorCountDisplay.title !== sensorTitle) sensorCountDisplay.title = sensorTitle;
     
     // Add count number as text content after icon
     let countSpan = sensorCountDisplay.querySelector('.count-number');
@@ -407,7 +523,7 @@ function updateSensorStatusIndicatorFromUtils(sensorInfo) {
         countSpan.className = 'count-number';
         sensorCountDisplay.appendChild(countSpan);
     }
-    countSpan.textContent = sensorInfo.count.split('/')[0]; // Show connected count
+    setText(countSpan, sensorInfo.count.split('/')[0]); // Show connected count
 }
 
 
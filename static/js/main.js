@@ -30,6 +30,11 @@ window.addEventListener('DOMContentLoaded', () => {
     
     // Delay socket initialization to make steps more visible
     setTimeout(() => {
+        // ?bench=1 replaces live data with a synthetic stream and reports frame times
+        if (new URLSearchParams(window.location.search).has('bench')) {
+            import('./renderBench.js').then(bench => bench.runRenderBenchmarkFromUrl());
+            return;
+        }
         initializeSocket(window.location.origin);
         console.log('Socket initialized');
     }, 1200);
@@ -0,0 +1,117 @@
+// ==========================
+// Energy Monitor MsgPack JS
+// ==========================
+// Decoder for the compact sensor_update_bin frames (see sensor_monitor/encoding.py)
+// Frame layout: one flag byte (0 = msgpack, 1 = zlib-deflated msgpack) then the payload
+
+const FRAME_MSGPACK = 0;
+const FRAME_MSGPACK_DEFLATE = 1;
+const textDecoder = new TextDecoder();
+
+// Decode a binary frame into the same object shape as a JSON sensor_update
+export async function decodeCompactFrame(frame) {
+    let bytes = frame instanceof Uint8Array ? frame : new Uint8Array(frame);
+    const flag = bytes[0];
+    bytes = bytes.subarray(1);
+    if (flag === FRAME_MSGPACK_DEFLATE) {
+        bytes = await inflate(bytes);
+    } else if (flag !== FRAME_MSGPACK) {
+        throw new Error(`Unknown compact frame type ${flag}`);
+    }
+    return unpackSensorReadings(decodeMsgpack(bytes));
+}
+
+// Inflate zlib data using the browser's built-in DecompressionStream
+async function inflate(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+// Turn column-packed readings ({_cols, _rows}) back into arrays of objects
+export function unpackSensorReadings(data) {
+    for (const entry of Object.values(data)) {
+        const readings = entry?.data?.readings;
+        if (readings && Array.isArray(readings._cols)) {
+            entry.data.readings = readings._rows.map(row => {
+                const reading = {};
+                readings._cols.forEach((column, i) => { reading[column] = row[i]; });
+                return reading;
+            });
+        }
+    }
+    return data;
+}
+
+// Minimal MessagePack decoder covering the types Python's msgpack produces
+export function decodeMsgpack(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let offset = 0;
+
+    function readString(length) {
+        const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return value;
+    }
+
+    function readBinary(length) {
+        const value = bytes.slice(offset, offset + length);
+        offset += length;
+        return value;
+    }
+
+    function readArray(length) {
+        const array = new Array(length);
+        for (let i = 0; i < length; i++) array[i] = read();
+        return array;
+    }
+
+    function readMap(length) {
+        const map = {};
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            map[key] = read();
+        }
+        return map;
+    }
+
+    function read() {
+        const type = bytes[offset++];
+        // Fixed-size types
+        if (type <= 0x7f) return type;
+        if (type >= 0xe0) return type - 0x100;
+        if ((type & 0xf0) === 0x80) return readMap(type & 0x0f);
+        if ((type & 0xf0) === 0x90) return readArray(type & 0x0f);
+        if ((type & 0xe0) === 0xa0) return readString(type & 0x1f);
+
+        let value;
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: value = view.getUint8(offset); offset += 1; return readBinary(value);
+            case 0xc5: value = view.getUint16(offset); offset += 2; return readBinary(value);
+            case 0xc6: value = view.getUint32(offset); offset += 4; return readBinary(value);
+            case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+            case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+            case 0xcc: value = view.getUint8(offset); offset += 1; return value;
+            case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+            case 0xce: value = view.getUint32(offset); offset += 4; return value;
+            case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+            case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+            case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+            case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+            case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+            case 0xd9: value = view.getUint8(offset); offset += 1; return readString(value);
+            case 0xda: value = view.getUint16(offset); offset += 2; return readString(value);
+            case 0xdb: value = view.getUint32(offset); offset += 4; return readString(value);
+            case 0xdc: value = view.getUint16(offset); offset += 2; return readArray(value);
+            case 0xdd: value = view.getUint32(offset); offset += 4; return readArray(value);
+            case 0xde: value = view.getUint16(offset); offset += 2; return readMap(value);
+            case 0xdf: value = view.getUint32(offset); offset += 4; return readMap(value);
+            default:
+                throw new Error(`Unsupported msgpack type 0x${type.toString(16)} at offset ${offset - 1}`);
+        }
+    }
+
+    return read();
+}
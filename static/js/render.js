@@ -0,0 +1,91 @@
+// ========================
+// Energy Monitor Render JS
+// ========================
+
+// Socket updates are not drawn when they arrive: the newest one waits for the
+// next animation frame, so bursts of updates cost one round of DOM writes and
+// a hidden tab does no rendering at all.
+
+const FRAME_SAMPLES = 600;
+
+let renderHandler = null;
+let pendingData = null;
+let frameRequested = false;
+let frameTimes = [];
+let coalesced = 0;
+let longTasks = 0;
+
+// Count main-thread stalls over 50 ms where the browser reports them
+if (typeof PerformanceObserver !== 'undefined' &&
+    PerformanceObserver.supportedEntryTypes?.includes('longtask')) {
+    new PerformanceObserver((list) => { longTasks += list.getEntries().length; })
+        .observe({ entryTypes: ['longtask'] });
+}
+
+// Function that applies one update to the DOM
+export function setRenderHandler(handler) {
+    renderHandler = handler;
+}
+
+export function scheduleRender(data) {
+    if (pendingData) coalesced++;  // Replaced before it was drawn
+    pendingData = data;
+    if (frameRequested) return;
+    frameRequested = true;
+    requestAnimationFrame(flushRender);
+}
+
+function flushRender() {
+    frameRequested = false;
+    const data = pendingData;
+    pendingData = null;
+    if (!data || !renderHandler) return;
+    const start = performance.now();
+    try {
+        renderHandler(data);
+    } catch (error) {
+        console.error('Error rendering sensor update:', error);
+    }
+    frameTimes.push(performance.now() - start);
+    if (frameTimes.length > FRAME_SAMPLES) frameTimes.shift();
+}
+
+// Render time per frame (ms) over the recent frames
+export function getFrameStats() {
+    const sorted = frameTimes.slice().sort((a, b) => a - b);
+    const pick = (q) => sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(q * sorted.length))] : 0;
+    const round = (value) => Math.round(value * 100) / 100;
+    return {
+        frames: sorted.length,
+        mean: round(sorted.reduce((sum, t) => sum + t, 0) / (sorted.length || 1)),
+        p95: round(pick(0.95)),
+        max: round(sorted[sorted.length - 1] || 0),
+        coalesced,
+        longTasks
+    };
+}
+
+export function resetFrameStats() {
+    frameTimes = [];
+    coalesced = 0;
+    longTasks = 0;
+}
+
+// Write text/classes only when they differ, so unchanged values cause no DOM mutation
+export function setText(element, value) {
+    if (element && element.textContent !== value) element.textContent = value;
+}
+
+// Markup last written by setHTML, per element
+const writtenHTML = new WeakMap();
+
+export function setHTML(element, html) {
+    if (element && writtenHTML.get(element) !== html) {
+        element.innerHTML = html;
+        writtenHTML.set(element, html);
+    }
+}
+
+export function setClassName(element, className) {
+    if (element && element.className !== className) element.className = className;
+}
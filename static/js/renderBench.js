@@ -0,0 +1,98 @@
+// ==============================
+// Energy Monitor Render Benchmark
+// ==============================
+
+// Feeds a synthetic sensor_update stream through the normal update path and
+// reports render time per frame. Open /?bench=1 (the socket is not connected
+// in this mode), optionally with &sensors=40&rate=10&seconds=20&readings=20,
+// or call window.runRenderBenchmark({...}) from the console.
+
+import { dispatchSensorUpdate } from './socket.js';
+import { getFrameStats, resetFrameStats } from './render.js';
+
+const TYPES = ['Solar', 'Wind', 'Battery'];
+
+function syntheticReading(type, step, index) {
+    const voltage = 12 + Math.sin((step + index) / 10);
+    const current = 2 + Math.cos((step + index) / 7);
+    const power = Math.round(voltage * current * 100) / 100;
+    const ts = Date.now() / 1000;
+    const reading = {
+        voltage, current, power, ts,
+        time_stamp: new Date(ts * 1000).toLocaleTimeString()
+    };
+    if (type === 'Battery') {
+        reading.state_of_charge = 50 + (step % 50);
+        reading.status = current > 0 ? 'charging' : 'discharging';
+    } else {
+        reading.output = Math.round(power);
+    }
+    return reading;
+}
+
+// One sensor_update payload; each call adds a new reading to every sensor
+function syntheticStream(sensorCount, readingCount) {
+    const readings = {};
+    let step = 0;
+    return () => {
+        step++;
+        const data = {};
+        for (let i = 0; i < sensorCount; i++) {
+            const type = TYPES[i % TYPES.length];
+            const name = `Bench ${type} ${i + 1}`;
+            const history = readings[name] || (readings[name] = []);
+            history.push(syntheticReading(type, step, i));
+            if (history.length > readingCount) history.shift();
+            const latest = history[history.length - 1];
+            data[name] = {
+                address: 64 + (i % 16), type, max_power: 400, rating: 100,
+                device_id: 0, poll_interval: 5,
+                data: { ...latest, power_trend: 0, readings: history.slice() }
+            };
+        }
+        data.totals = { solar_total: 0, wind_total: 0, total_power: 0, battery_soc_total: 0 };
+        data.groups = {};
+        data.devices = { 0: { name: 'Bench', connected: true, type: 'local', address: 'local' } };
+        data.system_status = { connected_devices: 1, total_devices: 1, active_sensors: sensorCount };
+        data.mqtt_connection_status = 1;
+        return data;
+    };
+}
+
+export function runRenderBenchmark({ sensors = 40, rate = 10, seconds = 20, readings = 20 } = {}) {
+    const next = syntheticStream(sensors, readings);
+    const total = Math.max(1, Math.round(rate * seconds));
+    console.log(`Render benchmark: ${sensors} sensors, ${rate} updates/s for ${seconds}s`);
+    dispatchSensorUpdate(next());  // Builds the cards
+    return new Promise(resolve => {
+        // Let the first render settle before measuring
+        setTimeout(() => {
+            resetFrameStats();
+            let sent = 0;
+            const timer = setInterval(() => {
+                dispatchSensorUpdate(next());
+                if (++sent < total) return;
+                clearInterval(timer);
+                requestAnimationFrame(() => requestAnimationFrame(() => {
+                    const stats = { sensors, rate, updates: total, ...getFrameStats() };
+                    console.table(stats);
+                    window.renderBenchmarkResult = stats;
+                    resolve(stats);
+                }));
+            }, 1000 / rate);
+        }, 1000);
+    });
+}
+
+export function runRenderBenchmarkFromUrl() {
+    const params = new URLSearchParams(window.location.search);
+    const option = (key, fallback) => Number(params.get(key)) || fallback;
+    return runRenderBenchmark({
+        sensors: option('sensors', 40),
+        rate: option('rate', 10),
+        seconds: option('seconds', 20),
+        readings: option('readings', 20)
+    });
+}
+
+window.runRenderBenchmark = runRenderBenchmark;
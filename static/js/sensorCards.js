@@ -4,6 +4,7 @@
 
 import { deviceList, setPaused, getIsPaused, socket, undoTimers, setSensorFilter } from './globals.js';
 import { generateLogHTML, isSensorConnected, updateFilterButtonStates, clearSensorFilter, formatValue, normalizeFilterType, isSensorEntry } from './utils.js';
+import { setText, setHTML } from './render.js';
 
 
 // Get GPIO status for a device from local storage
@@ -41,6 +42,12 @@ function handleGlobalSensorClick(e) {
     else if (target.classList.contains('log-btn')) {
         handleLogButtonClick(e, target);
     }
+    // Handle burst capture button clicks
+    else if (target.classList.contains('burst-btn')) {
+        e.preventDefault();
+        e.stopPropagation();
+        renderSensorBurst(target.getAttribute('data-name'));
+    }
     else if (target.id === 'clear-sensor-filter') {
         clearSensorFilter();
     }
@@ -79,10 +86,13 @@ function handleLogButtonClick(e, target) {
     if (!sensorName || !currentSensorData[sensorName]) return;
     
     const sensor = currentSensorData[sensorName];
-    const readings = sensor.data?.readings;
-    const logHTML = generateLogHTML(Array.isArray(readings) ? readings : []);
+    const readings = Array.isArray(sensor.data?.readings) ? sensor.data.readings : [];
+    const logHTML = generateLogHTML(readings);
     
     renderSensorLogs(sensorName, logHTML);
+    // Marks the list as a live log that later updates append to
+    const list = document.getElementById(`log-entries-${sensorName}`);
+    if (list) list.dataset.newest = readings.length ? readingKey(readings[readings.length - 1]) : '';
 }
 
 function handleSensorAddClick() {
@@ -118,6 +128,7 @@ export function loadSensorCards(data, filterType = null) {
     
     // Clear existing cards and reset layout
     cardGrid.innerHTML = '';
+    sensorViews.clear();
     container.classList.remove('single-card');
     
     // Add "Add New Sensor" card first (always show)
@@ -358,6 +369,8 @@ function generateConnectionStatus(sensor, deviceInfo) {
 function generateSensorCardHTML(name, sensor, deviceInfo, sensorProps) {
     const connectionStatus = generateConnectionStatus(sensor, deviceInfo);
     const iconType = getSensorIcon(sensor.type);
+    // Sensors federated from a peer instance are managed on that instance
+    const peerHidden = sensor.peer ? ' hidden' : '';
     
     return `
         <div class="sensor-card-header">
@@ -369,8 +382,9 @@ function generateSensorCardHTML(name, sensor, deviceInfo, sensorProps) {
                 <p>${connectionStatus.gpioIcon} ${deviceInfo.deviceName} - ${connectionStatus.connectionStatus}</p>
             </div>
             <div class="action-btns sensor-actions">
-                <i class="fa-solid fa-gear edit-btn" id="edit-btn-${name}" data-name="${name}" title="Edit"></i>
+                <i class="fa-solid fa-gear edit-btn${peerHidden}" id="edit-btn-${name}" data-name="${name}" title="Edit"></i>
                 <i class="fa-solid fa-book log-btn" id="log-btn-${name}" data-name="${name}" title="Log"></i> 
+                <i class="fa-solid fa-wave-square burst-btn${peerHidden}" id="burst-btn-${name}" data-name="${name}" title="Burst capture"></i>
                 <i class="fa-solid fa-trash delete-btn hidden" id="delete-btn-${name}" data-name="${name}" title="Delete"></i>
                 <i class="fa-solid fa-save save-btn hidden" id="save-btn-${name}" data-name="${name}" title="Save"></i>
                 <i class="fa-solid fa-xmark back-btn hidden" id="back-btn-${name}" data-name="${name}" title="Back"></i>
@@ -485,33 +499,60 @@ function countActualSensors(data) {
     ).length;
 }
 
+// Element references per sensor card, so updates patch text instead of rebuilding HTML
+const sensorViews = new Map();
+
 // Handle sensor readings update on subsequent data updates
 export function handleSensorReadingsUpdate(data) {
     // Store data globally for filter operations
     window.lastSensorData = data;
-    // Exit early if updates are paused (e.g., during editing)
-    if (getIsPaused()) return;
+    currentSensorData = data;
 
     // Update individual sensor cards with new readings
     for (let [name, sensor] of Object.entries(data)) {
         // Skip system data entries
         if (!isSensorEntry(name, sensor)) continue;
+
+        // Open log panels keep following new readings
+        patchSensorLog(name, sensor.data?.readings);
+        // Skip the cards while updates are paused (e.g., during editing)
+        if (getIsPaused()) continue;
         
         const viewElement = document.getElementById(`view-${name}`);
         if (viewElement) {
-            // Update sensor readings display
-            viewElement.innerHTML = renderSensorReadings(name, sensor);
-            
-            // Update connection status indicator
-            updateSensorConnectionStatus(name, sensor);
+            patchSensorReadings(name, sensor, viewElement);
             
             // Event listeners handled by global delegation
         }
     }
 }
 
+// Update the card in place; rebuild it only when its layout has to change
+function patchSensorReadings(name, sensor, viewElement) {
+    const values = sensorReadingValues(sensor);
+    let view = sensorViews.get(name);
+    if (!view || view.root !== viewElement || view.shape !== values.shape) {
+        viewElement.innerHTML = renderSensorReadings(name, sensor);
+        view = {
+            root: viewElement,
+            shape: values.shape,
+            title: document.getElementById(`card-${name}`)?.querySelector('.sensor-card-title p'),
+            fields: {}
+        };
+        viewElement.querySelectorAll('[data-field]').forEach(element => {
+            view.fields[element.dataset.field] = element;
+        });
+        sensorViews.set(name, view);
+    } else {
+        for (const [field, element] of Object.entries(view.fields)) {
+            setText(element, values[field]);
+        }
+    }
+    updateSensorConnectionStatus(sensor, view.title);
+}
+
 // Update sensor connection status indicator in card title
-function updateSensorConnectionStatus(name, sensor) {
+function updateSensorConnectionStatus(sensor, cardTitleElement) {
     // Find device information for this sensor
     const deviceInfo = getDeviceInfo(sensor.device_id);
     
@@ -519,10 +560,53 @@ function updateSensorConnectionStatus(name, sensor) {
     const connectionInfo = generateConnectionStatus(sensor, deviceInfo);
 
     // Update the connection status in the card title
-    const cardTitleElement = document.querySelector(`#card-${name} .sensor-card-title p`);
-    if (cardTitleElement) {
-        cardTitleElement.innerHTML = `${connectionInfo.gpioIcon} ${deviceInfo.deviceName} - ${connectionInfo.connectionStatus}`;
+    setHTML(cardTitleElement, `${connectionInfo.gpioIcon} ${deviceInfo.deviceName} - ${connectionInfo.connectionStatus}`);
+}
+
+// Identifies a reading in the log list
+function readingKey(reading) {
+    return String(reading.ts ?? reading.time_stamp ?? '');
+}
+
+// Prepend readings that arrived since the log list was drawn and drop the ones that aged out
+function patchSensorLog(name, readings) {
+    const list = document.getElementById(`log-entries-${name}`);
+    if (!list || list.dataset.newest === undefined || !Array.isArray(readings)) return;
+    if (!readings.length) return;
+    const newest = readingKey(readings[readings.length - 1]);
+    if (newest === list.dataset.newest) return;
+    const last = readings.findIndex(reading => readingKey(reading) === list.dataset.newest);
+    if (last < 0) {
+        // Too far behind to patch (or the list was empty): redraw it
+        list.innerHTML = generateLogHTML(readings);
+    } else {
+        list.insertAdjacentHTML('afterbegin', generateLogHTML(readings.slice(last + 1)));
+        while (list.children.length > readings.length) list.lastElementChild.remove();
+    }
+    list.dataset.newest = newest;
+}
+
+// Display strings for a sensor's readings; shape changes when the card layout must change
+function sensorReadingValues(sensor) {
+    const data = sensor.data;
+    if (!data) return { shape: 'no-data' };
+    const type = sensor.type || 'Unknown';
+    const hasSoc = type === 'Battery' && data.state_of_charge !== undefined && data.state_of_charge !== null;
+    const values = {
+        shape: `${type}|${hasSoc}`,
+        // Format readings with appropriate precision
+        power: formatValue(data.power, '', 2),
+        voltage: formatValue(data.voltage, 'V', 2),
+        current: formatValue(data.current, 'A', 3),
+        timestamp: isSensorConnected(sensor) ? `Last Updated: ${data.time_stamp || 'N/A'}` : 'Sensor not connected'
+    };
+    if (hasSoc) {
+        values.soc = `${Math.round(data.state_of_charge * 100) / 100}%`;
+    } else if (type !== 'Battery') {
+        // For non-battery sensors, show trend or other info if available
+        values.trend = `${data.power_trend || 0}%`;
     }
+    return values;
 }
 
 // Render sensor readings HTML
@@ -533,57 +617,42 @@ export function renderSensorReadings(name, sensor) {
         return generateNoDataHTML();
     }
 
-    // Extract current readings and sensor properties
-    const data = sensor.data;
-    const { type = 'Unknown', max_power: maxPower = 0, rating = 0 } = sensor;
-    
-    // Format readings with appropriate precision
-    const voltage = formatValue(data.voltage, 'V', 2);
-    const current = formatValue(data.current, 'A', 3);
-    const power = formatValue(data.power,'', 2);
+    const values = sensorReadingValues(sensor);
     
-    // Generate sensor readings with proper CSS class structure
+    // Generate sensor readings with proper CSS class structure; data-field marks what updates patch
     let html = `
         <div class="sensor-main-entry">
-            <div class="sensor-main-value">${power}<span class="sensor-card-unit">W</span></div>
+            <div class="sensor-main-value"><span data-field="power">${values.power}</span><span class="sensor-card-unit">W</span></div>
         </div>
         <div class="sensor-entries"> 
             <div class="sensor-entry">
                 <span class="sensor-label">Voltage:</span>
-                <span class="sensor-value">${voltage}</span>
+                <span class="sensor-value" data-field="voltage">${values.voltage}</span>
             </div>
             <div class="sensor-entry">
                 <span class="sensor-label">Current:</span>
-                <span class="sensor-value">${current}</span>
+                <span class="sensor-value" data-field="current">${values.current}</span>
             </div>`;
     
     // Add type-specific readings
-    if (type === 'Battery' && data.state_of_charge !== undefined && data.state_of_charge !== null) {
-        const soc = Math.round(data.state_of_charge * 100) / 100;
+    if (values.soc !== undefined) {
         html += `
             <div class="sensor-entry">
                 <span class="sensor-label">SOC:</span>
-                <span class="sensor-value">${soc}%</span>
+                <span class="sensor-value" data-field="soc">${values.soc}</span>
             </div>`;
-    } else if (type !== 'Battery') {
-        // For non-battery sensors, show trend or other info if available
-        const trend = data.power_trend || 0;
+    } else if (values.trend !== undefined) {
         html += `
             <div class="sensor-entry">
                 <span class="sensor-label">Trend:</span>
-                <span class="sensor-value">${trend}%</span>
+                <span class="sensor-value" data-field="trend">${values.trend}</span>
             </div>`;
     }
     
     // Add timestamp
-    const timestamp = data.time_stamp || 'N/A';
-    const connectionStatus = isSensorConnected(sensor) ? 
-        `Last Updated: ${timestamp}` : 
-        'Sensor not connected';
-    
     html += `
             <div class="sensor-entry">
-                <span class="sensor-label timestamp">${connectionStatus}</span>
+                <span class="sensor-label timestamp" data-field="timestamp">${values.timestamp}</span>
             </div>
         </div>`;
     
@@ -627,6 +696,7 @@ function toggleEditMode(name, editMode) {
         edit: document.getElementById(`edit-${name}`),
         editBtn: document.getElementById(`edit-btn-${name}`),
         logBtn: document.getElementById(`log-btn-${name}`),
+        burstBtn: document.getElementById(`burst-btn-${name}`),
         deleteBtn: document.getElementById(`delete-btn-${name}`),
         saveBtn: document.getElementById(`save-btn-${name}`),
         backBtn: document.getElementById(`back-btn-${name}`)
@@ -636,6 +706,7 @@ function toggleEditMode(name, editMode) {
         elements.view?.classList.add('hidden');
         elements.editBtn?.classList.add('hidden');
         elements.logBtn?.classList.add('hidden');
+        elements.burstBtn?.classList.add('hidden');
         elements.deleteBtn?.classList.remove('hidden');
         elements.saveBtn?.classList.remove('hidden');
         elements.backBtn?.classList.remove('hidden');
@@ -644,6 +715,7 @@ function toggleEditMode(name, editMode) {
         elements.edit?.classList.add('hidden');
         elements.editBtn?.classList.remove('hidden');
         elements.logBtn?.classList.remove('hidden');
+        elements.burstBtn?.classList.remove('hidden');
         elements.deleteBtn?.classList.add('hidden');
         elements.saveBtn?.classList.add('hidden');
         elements.backBtn?.classList.add('hidden');
@@ -721,6 +793,7 @@ export function renderSensorLogs(name, logHTML) {
     document.getElementById(`view-${name}`).classList.add('hidden');
     document.getElementById(`edit-btn-${name}`).classList.add("hidden");
     document.getElementById(`log-btn-${name}`).classList.add("hidden");
+    document.getElementById(`burst-btn-${name}`)?.classList.add("hidden");
     // Hide the new action buttons structure
     // const actionsElement = document.querySelector(`[data-name="${name}"]`)?.closest('.sensor-actions');
     // if (actionsElement) actionsElement.classList.add("hidden");
@@ -742,6 +815,79 @@ export function renderSensorLogs(name, logHTML) {
 }
 }
 
+// Render burst capture panel (reuses the log panel area)
+export function renderSensorBurst(name) {
+    renderSensorLogs(name, `
+        <div class="burst-form">
+            <label>Duration (s) <input type="number" id="burst-duration-${name}" value="5" min="1" max="60"></label>
+            <label>Rate (Hz) <input type="number" id="burst-rate-${name}" value="500" min="1" max="2000"></label>
+            <button id="burst-start-${name}">Start capture</button>
+        </div>
+        <div class="burst-result" id="burst-result-${name}"></div>
+    `);
+    document.getElementById(`burst-btn-${name}`).classList.add("hidden");
+    document.getElementById(`burst-start-${name}`).onclick = () => startBurst(name);
+}
+
+function startBurst(name) {
+    const result = document.getElementById(`burst-result-${name}`);
+    fetch('/burst', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            sensor: name,
+            duration: Number(document.getElementById(`burst-duration-${name}`).value),
+            rate: Number(document.getElementById(`burst-rate-${name}`).value)
+        })
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.status !== 'success') {
+            result.innerHTML = `<p>${data.message}</p>`;
+            return;
+        }
+        pollBurst(name);
+    })
+    .catch(err => console.error('Burst capture failed:', err));
+}
+
+function pollBurst(name) {
+    const result = document.getElementById(`burst-result-${name}`);
+    if (!result) return;
+    fetch('/burst/status')
+        .then(res => res.json())
+        .then(status => {
+            if (status.state === 'running') {
+                result.innerHTML = `<p>Capturing... ${status.progress ?? 0}%</p>`;
+                setTimeout(() => pollBurst(name), 500);
+            } else if (status.state === 'done') {
+                result.innerHTML = generateBurstSummaryHTML(status.summary);
+            } else {
+                result.innerHTML = `<p>Capture failed: ${status.error || status.state}</p>`;
+            }
+        })
+        .catch(err => console.error('Burst status failed:', err));
+}
+
+function generateBurstSummaryHTML(summary) {
+    const rows = ['voltage', 'current', 'power'].map(channel => {
+        const stats = summary[channel] || {};
+        return `<tr><td>${channel}</td><td>${formatValue(stats.peak)}</td><td>${formatValue(stats.rms)}</td>
+                <td>${formatValue(stats.ripple)}</td><td>${stats.ripple_pct ?? '-'}%</td></tr>`;
+    }).join('');
+    return `
+        <p>${summary.samples} samples at ${summary.sample_rate} Hz</p>
+        <table class="burst-stats">
+            <tr><th></th><th>Peak</th><th>RMS</th><th>Ripple</th><th>Ripple %</th></tr>
+            ${rows}
+        </table>
+        <p>
+            <a href="/burst/download?format=csv">Download CSV</a> |
+            <a href="/burst/download?format=bin">Download binary</a>
+        </p>
+    `;
+}
+
 // Render sensor delete confirmation
 export function renderSensorDelete(name) {
     document.getElementById(`edit-${name}`).classList.add("hidden");
@@ -783,6 +929,7 @@ export function closeSensorLogs(name) {
     document.getElementById(`view-${name}`).classList.remove("hidden");
     document.getElementById(`edit-btn-${name}`).classList.remove("hidden");
     document.getElementById(`log-btn-${name}`).classList.remove("hidden");
+    document.getElementById(`burst-btn-${name}`)?.classList.remove("hidden");
     document.getElementById(`back-btn-${name}`).classList.add("hidden");
     setPaused(false);    
 }
@@ -816,7 +963,10 @@ export function saveSensor(originalName) {
         })
     })
         .then(res => res.json())
-        .then(() => {
+        .then(result => {
+            if (result.status === "error") {
+                alert(result.message);
+            }
             setPaused(false);
             socket.emit("sensor_update_request");
         });
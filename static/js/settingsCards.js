@@ -4,6 +4,7 @@
 
 import { deviceList, currentConfigData, updateConfigData, deviceCount, connectedDeviceCount, sensorCount, connectedSensorCount, mqttConnectionStatus } from './globals.js';
 import { sleep, getConnectedDevicesInfo, getConnectedSensorsInfo, getMqttConnectionInfo, getDialogElement} from './utils.js';
+import { setText, setClassName } from './render.js';
 
 // Fetch current system status information
 function fetchStatusInfo() {
@@ -30,30 +31,30 @@ export function updateStatusDisplay() {
     const deviceStatusElement = document.getElementById('device-status');
     if (deviceStatusElement) {
         const deviceInfo = getConnectedDevicesInfo();
-        deviceStatusElement.textContent = deviceInfo.count;
-        deviceStatusElement.className = `status-value ${deviceInfo.connectionClass}`;
+        setText(deviceStatusElement, String(deviceInfo.count));
+        setClassName(deviceStatusElement, `status-value ${deviceInfo.connectionClass}`);
     }
     
     // Update sensor status
     const sensorStatusElement = document.getElementById('sensor-status');
     if (sensorStatusElement) {
         const sensorInfo = getConnectedSensorsInfo();
-        sensorStatusElement.textContent = sensorInfo.count;
-        sensorStatusElement.className = `status-value ${sensorInfo.connectionClass}`;
+        setText(sensorStatusElement, String(sensorInfo.count));
+        setClassName(sensorStatusElement, `status-value ${sensorInfo.connectionClass}`);
     }
 
     // Update MQTT status
     const mqttStatusElement = document.getElementById('mqtt-status');
     if (mqttStatusElement) {
         const mqttInfo = getMqttConnectionInfo();
-        mqttStatusElement.textContent = mqttInfo.status;
-        mqttStatusElement.className = `status-value ${mqttInfo.connectionClass}`;
+        setText(mqttStatusElement, mqttInfo.status);
+        setClassName(mqttStatusElement, `status-value ${mqttInfo.connectionClass}`);
     }
     
     // Update last updated time
     const lastUpdatedElement = document.getElementById('last-updated');
     if (lastUpdatedElement) {
-        lastUpdatedElement.textContent = new Date().toLocaleTimeString();
+        setText(lastUpdatedElement, new Date().toLocaleTimeString());
     }
 }
 
@@ -352,12 +353,16 @@ export function saveSettings(settingsSaveFlag) {
         })
     })
         .then(res => res.json())
-        .then(async () => {
+        .then(async (result) => {
             document.getElementById(`${cardName}-card-entries`).classList.add('hidden');
             document.getElementById(`${cardName}-action-message`).classList.remove('hidden');
             let resultHtml = document.getElementById(`${cardName}-save-result`);
-            resultHtml.innerHTML = `Settings Saved Successfully`;
-            await sleep(2000);  
+            // Most settings apply live; only some (e.g. the web port) need a restart
+            const restartRequired = result.restart_required || [];
+            resultHtml.innerHTML = restartRequired.length
+                ? `Settings Saved. Restart required for: ${restartRequired.join(', ')}`
+                : `Settings Saved and Applied`;
+            await sleep(restartRequired.length ? 4000 : 2000);  
             resultHtml.innerHTML = ``;
             document.getElementById(`${cardName}-action-message`).classList.add('hidden');
             document.getElementById(`${cardName}-card-entries`).classList.remove('hidden');
@@ -2,17 +2,58 @@
 // Energy Monitor Socket JS
 // ========================
 
-import { setSocket, updateSensorData, getSensorFilter, updateMqttConnectionStatus, setLastSensorData } from './globals.js';
+import { setSocket, updateSensorData, getSensorFilter, setSensorFilter, updateMqttConnectionStatus, setLastSensorData } from './globals.js';
 import { loadSensorCards, handleSensorReadingsUpdate } from './sensorCards.js';
 import { createDashboardStats, updateDashboardStats } from './dashboardCards.js';
 import { updateSensorData as updateSettingsSensorData } from './settingsCards.js';
-import { updateLoadingProgress, hideLoadingScreen } from './utils.js';
+import { updateLoadingProgress, updateStartupProgress, hideLoadingScreen, isSensorEntry } from './utils.js';
+import { decodeCompactFrame } from './msgpack.js';
+import { scheduleRender, setRenderHandler } from './render.js';
+
+// Build a subscription from the page URL, e.g. /?type=battery or /?sensor=Battery%20Bank&device=1
+// No parameters means the 'all' room used by the main dashboard
+export function getSubscriptionFromUrl() {
+    const params = new URLSearchParams(window.location.search);
+    const subscription = {
+        sensors: params.getAll('sensor'),
+        types: params.getAll('type'),
+        devices: params.getAll('device')
+    };
+    const hasFilter = Object.values(subscription).some(values => values.length > 0);
+    // ?encoding=msgpack opts in to binary sensor_update_bin frames
+    const encoding = params.get('encoding');
+    if (encoding) {
+        subscription.encoding = encoding;
+    }
+    // ?points=200 has the server downsample each sensor's readings (e.g. for tablets)
+    const points = parseInt(params.get('points'), 10);
+    if (points > 0) {
+        subscription.points = points;
+    }
+    return hasFilter || encoding || subscription.points ? subscription : null;
+}
+
+// Ask the server to only send the matching sensors (null subscribes to all)
+export function subscribeSensors(socketInstance, subscription) {
+    socketInstance.emit('subscribe', subscription || {}, (ack) => {
+        console.log('Subscribed to sensor room:', ack?.room, 'encoding:', ack?.encoding);
+    });
+}
 
 export function initializeSocket(url) {
     const socketInstance = io(url, { reconnection: true });
     setSocket(socketInstance);
+    const subscription = getSubscriptionFromUrl();
+    // A single type subscription also drives the sensor card filter
+    if (subscription && subscription.types.length === 1 && !getSensorFilter()) {
+        setSensorFilter(subscription.types[0].toLowerCase());
+    }
     socketInstance.on('connect', () => {
         console.log('Socket Connected:', socketInstance.id);
+        // Re-subscribe on every (re)connect, rooms do not survive a reconnection
+        if (subscription) {
+            subscribeSensors(socketInstance, subscription);
+        }
         // Update progress for socket connection with delay to make it visible
         setTimeout(() => {
             console.log('Calling updateLoadingProgress for socket step');
@@ -20,58 +61,111 @@ export function initializeSocket(url) {
         }, 300);
     });
     
-    // On first update, render all cards and create dashboard stats
-    socketInstance.once('sensor_update', (data) => {
-        console.log('First sensor update received:', data);
+    // Devices connect in the background after the server starts; their sensors
+    // appear in later updates, so ask for fresh data whenever a step completes
+    let refreshTimer = null;
+    socketInstance.on('startup_progress', (progress) => {
+        updateStartupProgress(progress);
+        clearTimeout(refreshTimer);
+        refreshTimer = setTimeout(() => socketInstance.emit('sensor_update_request'), 1500);
+    });
+    socketInstance.on('sensor_update', dispatchSensorUpdate);
+    // The alerts card follows sensor_update; this is for the console and other clients
+    socketInstance.on('alert', (alert) => {
+        const log = alert.state === 'firing' ? console.warn : console.log;
+        log(`Alert ${alert.state}: ${alert.message}`);
+    });
+    socketInstance.on('sensor_update_bin', async (frame) => {
         try {
-            // Store the complete dataset globally for filter operations
-            setLastSensorData(data);
-            
-            // Update MQTT connection status if provided
-            if (data.mqtt_connection_status !== undefined) {
-                updateMqttConnectionStatus(data.mqtt_connection_status);
-            }
-            
-            // Update progress for data received
-            setTimeout(() => {
-                console.log('Calling updateLoadingProgress for data step');
-                updateLoadingProgress('data');
-            }, 300);
-            
-            // Load cards with current filter (if any)
-            const currentFilter = getSensorFilter();
-            loadSensorCards(data, currentFilter);
-            updateSensorData(data); // Update config page status
-            updateSettingsSensorData(data); // Update settings status card
-            createDashboardStats(data);
-            
-            
-            // Update progress for cards rendered (this will hide loading screen)
-            setTimeout(() => {
-                console.log('Calling updateLoadingProgress for cards step - should hide loading screen');
-                updateLoadingProgress('cards');
-            }, 800); // Longer delay to ensure cards are rendered
-            
-            console.log('All data processing completed successfully');
+            dispatchSensorUpdate(await decodeCompactFrame(frame));
         } catch (error) {
-            console.error('Error processing sensor update:', error);
-            // Hide loading screen on error
-            hideLoadingScreen();
+            console.error('Error decoding binary sensor update:', error);
         }
     });
     
-    // On subsequent updates, update readings and dashboard stats (and respect pause)
-    socketInstance.on('sensor_update', (data) => {
+    return socketInstance;
+}
+
+// Sensor names the cards were last rendered for
+let renderedSensors = new Set();
+
+// JSON and msgpack frames (and the render benchmark) feed the same update path
+let firstUpdateReceived = false;
+export function dispatchSensorUpdate(data) {
+    if (!firstUpdateReceived) {
+        firstUpdateReceived = true;
+        handleFirstSensorUpdate(data);
+    }
+    handleSensorUpdate(data);
+}
+
+function sensorNames(data) {
+    return Object.entries(data).filter(([name, sensor]) => isSensorEntry(name, sensor)).map(([name]) => name);
+}
+
+// On first update, render all cards and create dashboard stats
+function handleFirstSensorUpdate(data) {
+    console.log('First sensor update received:', data);
+    try {
+        // Store the complete dataset globally for filter operations
+        setLastSensorData(data);
+        
         // Update MQTT connection status if provided
         if (data.mqtt_connection_status !== undefined) {
             updateMqttConnectionStatus(data.mqtt_connection_status);
         }
         
-        handleSensorReadingsUpdate(data);
-        updateDashboardStats(data);
+        // Update progress for data received
+        setTimeout(() => {
+            console.log('Calling updateLoadingProgress for data step');
+            updateLoadingProgress('data');
+        }, 300);
+        
+        // Load cards with current filter (if any)
+        const currentFilter = getSensorFilter();
+        loadSensorCards(data, currentFilter);
+        renderedSensors = new Set(sensorNames(data));
         updateSensorData(data); // Update config page status
         updateSettingsSensorData(data); // Update settings status card
-    });
-    
-    return socketInstance;
+        createDashboardStats(data);
+        
+        
+        // Update progress for cards rendered (this will hide loading screen)
+        setTimeout(() => {
+            console.log('Calling updateLoadingProgress for cards step - should hide loading screen');
+            updateLoadingProgress('cards');
+        }, 800); // Longer delay to ensure cards are rendered
+        
+        console.log('All data processing completed successfully');
+    } catch (error) {
+        console.error('Error processing sensor update:', error);
+        // Hide loading screen on error
+        hideLoadingScreen();
+    }
+}
+
+// On subsequent updates, update readings and dashboard stats (and respect pause)
+function handleSensorUpdate(data) {
+    // Update MQTT connection status if provided
+    if (data.mqtt_connection_status !== undefined) {
+        updateMqttConnectionStatus(data.mqtt_connection_status);
+    }
+    // DOM work waits for the next animation frame; updates in between are coalesced
+    scheduleRender(data);
+}
+
+// Apply one update to the page (called once per animation frame at most)
+function renderSensorUpdate(data) {
+    // Sensors added since the cards were rendered (e.g. a device that came up late)
+    const names = sensorNames(data);
+    if (names.some(name => !renderedSensors.has(name))) {
+        loadSensorCards(data, getSensorFilter());
+        renderedSensors = new Set(names);
+    }
+    handleSensorReadingsUpdate(data);
+    updateDashboardStats(data);
+    updateSensorData(data); // Update config page status
+    updateSettingsSensorData(data); // Update settings status card
 }
+
+setRenderHandler(renderSensorUpdate);
@@ -14,8 +14,27 @@ const loadingSteps = {
     cards: { progress: 100, message: "Interface ready" }
 };
 
+// Server startup (device connects, MQTT) fills the gap between the socket and data steps
+let startupProgressShown = true;
+
+export function updateStartupProgress(progress) {
+    const progressFill = document.getElementById('loading-progress-fill');
+    const progressText = document.getElementById('loading-progress');
+    if (!startupProgressShown || !progressFill) return;
+    const socketStep = loadingSteps.socket.progress;
+    const width = socketStep + (loadingSteps.data.progress - socketStep) * (progress.progress / 100);
+    progressFill.style.width = `${width}%`;
+    if (progressText) {
+        progressText.textContent = progress.message;
+    }
+}
+
 // Update loading progress bar and text
 export function updateLoadingProgress(step) {
+    // Once sensor data arrives the normal steps take over the bar
+    if (step === 'data' || step === 'cards') {
+        startupProgressShown = false;
+    }
     console.log(`[Progress] Updating loading progress to step: ${step}`);
     
     if (!loadingSteps[step]) {
@@ -745,7 +764,7 @@ export function normalizeFilterType(filterType) {
 
 // Check if entry is a valid sensor (not system entry)
 export function isSensorEntry(name, sensor) {
-    const systemEntries = ['totals', 'devices', 'system_status'];
+    const systemEntries = ['totals', 'groups', 'devices', 'system_status', 'peers', 'alerts'];
     return !systemEntries.includes(name) && sensor && sensor.type && sensor.data;
 }
 
@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The shared logger opens sensor_monitor.log in the working directory on import; keep it out of the tree
+os.chdir(tempfile.mkdtemp(prefix="sensor_monitor_tests_"))
@@ -0,0 +1,79 @@
+# tests/test_alerts.py
+import pytest
+
+from sensor_monitor.alerts import AlertEngine
+from sensor_monitor.sensor import Sensor
+from sensor_monitor.sensor_manager import SensorManager
+
+
+@pytest.fixture
+def offline_battery():
+    sensor = Sensor("Battery Bank", 0x40, "Battery", 100, 12, 10, 0)
+    sensor.detach()  # No device: fetch_data() returns its placeholder zeros
+    return sensor
+
+
+def manager_with(rules):
+    manager = SensorManager.__new__(SensorManager)
+    manager.alerts = AlertEngine(rules)
+    return manager
+
+
+def test_offline_sensor_does_not_fire(offline_battery):
+    manager = manager_with([{"id": "soc_low", "sensor": "Battery Bank", "field": "state_of_charge", "below": 20}])
+    last_read = offline_battery.last_read
+    data = offline_battery.read_data()
+    assert data["state_of_charge"] == 0 and data["status"] == "disconnected"
+    assert manager.evaluate_alerts(offline_battery, data, last_read, 1000.0) == []
+    assert manager.alerts.active() == []
+
+
+def test_real_sample_fires(offline_battery):
+    manager = manager_with([{"id": "soc_low", "sensor": "Battery Bank", "field": "state_of_charge", "below": 20}])
+    offline_battery.last_read = 1000.0  # As fetch_data() sets it after reading the chip
+    events = manager.evaluate_alerts(offline_battery, {"state_of_charge": 10}, None, 1000.0)
+    assert [event["state"] for event in events] == ["firing"]
+
+
+def states(engine, name, values, field="voltage", start=1000.0):
+    """Feed values one second apart; the event state (or None) for each"""
+    result = []
+    for i, value in enumerate(values):
+        events = engine.evaluate(name, {field: value}, start + i)
+        result.append(events[0]["state"] if events else None)
+    return result
+
+
+def test_threshold_hysteresis():
+    engine = AlertEngine([{"id": "low", "sensor": "Battery Bank", "field": "voltage", "below": 11.8, "clear": 12.2, "cooldown": 0}])
+    assert states(engine, "Battery Bank", [12.0, 11.7, 11.9, 12.1, 12.3]) == [None, "firing", None, None, "cleared"]
+
+
+def test_both_bounds_clear_at_their_own_level():
+    engine = AlertEngine([{"id": "range", "sensor": "Battery Bank", "field": "voltage", "below": 11.8, "above": 14.4,
+                           "clear_below": 12.2, "clear_above": 14.0, "cooldown": 0}])
+    assert states(engine, "Battery Bank", [11.7, 12.1, 12.3]) == ["firing", None, "cleared"]
+    assert states(engine, "Battery Bank", [14.5, 14.2, 13.9], start=2000.0) == ["firing", None, "cleared"]
+    assert engine.rules["range"].clear_below == 12.2 and engine.rules["range"].clear_above == 14.0
+
+
+def test_shared_clear_with_both_bounds_is_rejected():
+    engine = AlertEngine([{"id": "range", "sensor": "Battery Bank", "field": "voltage", "below": 11.8, "above": 14.4, "clear": 13}])
+    assert engine.rules == {}
+
+
+def test_cooldown_suppresses_refire():
+    engine = AlertEngine([{"id": "low", "sensor": "Battery Bank", "field": "voltage", "below": 11.8, "cooldown": 10}])
+    assert states(engine, "Battery Bank", [11.7, 12.0, 11.7]) == ["firing", "cleared", None]
+    assert states(engine, "Battery Bank", [11.7], start=1010.0) == ["firing"]
+
+
+def test_configure_keeps_unchanged_rule_state():
+    kept = {"id": "low", "sensor": "Battery Bank", "field": "voltage", "below": 11.8}
+    changed = {"id": "high", "sensor": "Battery Bank", "field": "current", "above": 20}
+    engine = AlertEngine([kept, changed])
+    engine.evaluate("Battery Bank", {"voltage": 11.7, "current": 25}, 1000.0)
+    assert {rule["id"] for rule in engine.active()} == {"low", "high"}
+    engine.configure([dict(kept), dict(changed, above=30)])
+    assert engine.rules["low"].active and engine.rules["low"].last_fired == 1000.0
+    assert not engine.rules["high"].active and engine.rules["high"].last_fired is None
@@ -0,0 +1,99 @@
+# tests/test_archive.py
+import time
+
+import pytest
+
+from sensor_monitor import archive
+from sensor_monitor import downsample
+
+START = time.mktime((2024, 5, 1, 10, 0, 0, 0, 0, -1))  # Local mid-morning, so a block never spans midnight
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(downsample, "_numpy", None)
+    else:
+        monkeypatch.setattr(downsample, "_numpy", False)
+    return request.param
+
+
+@pytest.fixture(params=[archive.CODEC_RAW, archive.CODEC_ZSTD])
+def archiver(request, tmp_path, backend):
+    if request.param == archive.CODEC_ZSTD and archive.zstd() is None:
+        pytest.skip("zstandard not installed")
+    store = archive.Archiver(enabled=1, directory=tmp_path)
+    store.codec = request.param
+    return store
+
+
+def reading(i):
+    return {"ts": START + i, "voltage": 12 + (i % 7) * 0.011, "current": -1.5 + (i % 5) * 0.0003, "power": 18 + i * 0.001}
+
+
+def as_list(values):
+    return values.tolist() if hasattr(values, "tolist") else list(values)
+
+
+def fill(store, count, name="Solar East"):
+    for i in range(count):
+        store.append(name, reading(i))
+
+
+def day_file(store, name="Solar East"):
+    return archive.sensor_dir(store.directory, name) / f"{archive.day_of(START * 1000)}{archive.SEGMENT_SUFFIX}"
+
+
+def test_round_trip(archiver):
+    count = archive.BLOCK_SAMPLES * 2 + 37
+    fill(archiver, count)
+    archiver.flush()
+    assert archiver.stats()["blocks_written"] == 3
+    data = archiver.read("Solar East")
+    assert as_list(data["ts"]) == pytest.approx([START + i for i in range(count)])
+    for name, scale in archive.COLUMNS:
+        expected = [archive.quantize(reading(i)[name], scale) / scale for i in range(count)]
+        assert as_list(data[name]) == pytest.approx(expected)
+
+
+def test_time_range_and_fields(archiver):
+    fill(archiver, 1500)
+    archiver.flush()
+    data = archiver.read("Solar East", START + 590, START + 610, fields=("power",))
+    assert set(data) == {"ts", "power"}
+    assert as_list(data["ts"]) == pytest.approx([START + i for i in range(590, 611)])
+
+
+def test_unwritten_readings_are_included(archiver):
+    fill(archiver, 10)
+    assert archiver.stats()["pending"] == 10
+    assert len(as_list(archiver.read("Solar East")["ts"])) == 10
+    assert archiver.sensors() == ["Solar East"]
+
+
+def test_torn_last_block_is_ignored(archiver):
+    fill(archiver, archive.BLOCK_SAMPLES + 50)
+    archiver.flush()
+    path = day_file(archiver)
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - 10)
+    assert len(as_list(archiver.read("Solar East")["ts"])) == archive.BLOCK_SAMPLES
+
+
+def test_damaged_block_is_skipped(archiver):
+    fill(archiver, archive.BLOCK_SAMPLES + 50)
+    archiver.flush()
+    path = day_file(archiver)
+    raw = bytearray(path.read_bytes())
+    raw[archive.BLOCK.size + 5] ^= 0xFF  # Inside the first block's body
+    path.write_bytes(bytes(raw))
+    ts = as_list(archiver.read("Solar East")["ts"])
+    assert ts == pytest.approx([START + i for i in range(archive.BLOCK_SAMPLES, archive.BLOCK_SAMPLES + 50)])
+
+
+def test_csv_export(archiver):
+    fill(archiver, 3)
+    lines = "".join(archive.iter_csv(archiver.chunks("Solar East"))).splitlines()
+    assert lines[0] == "time,ts,voltage,current,power"
+    assert len(lines) == 4
@@ -0,0 +1,31 @@
+# tests/test_downsample.py
+import pytest
+
+from sensor_monitor import downsample as ds
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(ds, "_numpy", None)
+    else:
+        monkeypatch.setattr(ds, "_numpy", False)
+    return request.param
+
+
+@pytest.mark.parametrize("n", range(0, 7))
+@pytest.mark.parametrize("points", [1, 2, 3, 4])
+def test_tiny_series(backend, n, points):
+    x = list(range(n))
+    y = [float(v % 3) for v in range(n)]
+    indices, mins, maxs = ds.downsample(x, y, points)
+    assert len(indices) == len(mins) == len(maxs) == min(n, max(points, ds.MIN_POINTS))
+    assert indices == sorted(set(indices))
+    if n:
+        assert indices[0] == 0 and indices[-1] == n - 1
+
+
+def test_readings_with_points_below_minimum(backend):
+    readings = [{"ts": 1.0, "power": 2.0}, {"ts": 2.0, "power": 5.0}]
+    assert len(ds.downsample_readings(readings, 1)) == 2
@@ -0,0 +1,45 @@
+# tests/test_i2c_pool.py
+from sensor_monitor.i2c_pool import I2CHandlePool
+
+
+class FakePi:
+    """pigpio.pi stand-in that hands out handle numbers from 0, as pigpiod does after a restart"""
+    def __init__(self):
+        self.connected = True
+        self.next_handle = 0
+        self.closed = []
+
+    def i2c_open(self, bus, address):
+        handle = self.next_handle
+        self.next_handle += 1
+        return handle
+
+    def i2c_close(self, handle):
+        self.closed.append(handle)
+
+
+def test_shared_handle_closes_with_last_user():
+    pool = I2CHandlePool("hub")
+    pi = FakePi()
+    pool.attach(pi)
+    first = pool.open(0x40)
+    second = pool.open(0x40)
+    assert first == second
+    pool.release(0x40, *first)
+    assert pi.closed == [] and pool.open_count() == 1
+    pool.release(0x40, *second)
+    assert pi.closed == [first[0]] and pool.open_count() == 0
+
+
+def test_stale_release_after_reconnect_is_ignored():
+    pool = I2CHandlePool("hub")
+    pool.attach(FakePi())
+    old = pool.open(0x40)
+    new_pi = FakePi()
+    pool.attach(new_pi)  # Reconnect: old handles dropped
+    new = pool.open(0x40)
+    assert new[0] == old[0]  # Same handle number on the new connection
+    pool.release(0x40, *old)
+    assert pool.open_count() == 1 and new_pi.closed == []
+    pool.release(0x40, *new)
+    assert pool.open_count() == 0 and new_pi.closed == [new[0]]
@@ -0,0 +1,80 @@
+# tests/test_mqtt_queue.py
+from sensor_monitor.mqtt_queue import DiskQueue, SEGMENT_SUFFIX, encode_record
+
+
+def fill(queue, count, start=0):
+    for i in range(start, start + count):
+        queue.put(f"solar/sensor/{i}", f"payload {i}", timestamp=1000.0 + i)
+
+
+def topics(batch):
+    return [topic for _, _, topic, _, _ in batch]
+
+
+def test_fifo_and_ack(tmp_path):
+    queue = DiskQueue(tmp_path)
+    fill(queue, 5)
+    batch = queue.peek(3)
+    assert topics(batch) == ["solar/sensor/0", "solar/sensor/1", "solar/sensor/2"]
+    assert batch[0][3] == b"payload 0" and batch[0][4] is True
+    queue.ack(batch[-1][0])
+    assert len(queue) == 2
+    assert topics(queue.peek(10)) == ["solar/sensor/3", "solar/sensor/4"]
+
+
+def test_cursor_survives_restart(tmp_path):
+    queue = DiskQueue(tmp_path)
+    fill(queue, 4)
+    queue.ack(queue.peek(2)[-1][0])
+    queue.close()
+    reopened = DiskQueue(tmp_path)
+    assert len(reopened) == 2
+    assert topics(reopened.peek(10)) == ["solar/sensor/2", "solar/sensor/3"]
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    queue = DiskQueue(tmp_path)
+    fill(queue, 3)
+    queue.close()
+    segment = next(tmp_path.glob(f"*{SEGMENT_SUFFIX}"))
+    good_size = segment.stat().st_size
+    with open(segment, "ab") as f:
+        f.write(encode_record(2000.0, "solar/sensor/torn", "cut short", True)[:-4])
+    reopened = DiskQueue(tmp_path)
+    assert segment.stat().st_size == good_size
+    assert len(reopened) == 3
+    fill(reopened, 1, start=3)  # Appends after the truncated record, not after the garbage
+    assert topics(reopened.peek(10))[-1] == "solar/sensor/3"
+
+
+def test_corrupt_record_stops_replay(tmp_path):
+    queue = DiskQueue(tmp_path)
+    fill(queue, 3)
+    queue.close()
+    segment = next(tmp_path.glob(f"*{SEGMENT_SUFFIX}"))
+    record_size = len(encode_record(1000.0, "solar/sensor/0", "payload 0", True))
+    raw = bytearray(segment.read_bytes())
+    raw[record_size + 10] ^= 0xFF  # Inside the second record
+    segment.write_bytes(bytes(raw))
+    assert topics(DiskQueue(tmp_path).peek(10)) == ["solar/sensor/0"]
+
+
+def test_segments_roll_and_oldest_is_evicted(tmp_path):
+    record_size = len(encode_record(1000.0, "solar/sensor/0", "payload 0", True))
+    queue = DiskQueue(tmp_path, max_bytes=0, segment_bytes=record_size * 4)  # Capped at two segments
+    fill(queue, 10)
+    assert len(list(tmp_path.glob(f"*{SEGMENT_SUFFIX}"))) == 2
+    stats = queue.stats()
+    assert stats["evicted"] == 4 and stats["depth"] == 6
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert topics(queue.peek(1)) == ["solar/sensor/4"]
+
+
+def test_ack_of_evicted_position_is_ignored(tmp_path):
+    record_size = len(encode_record(1000.0, "solar/sensor/0", "payload 0", True))
+    queue = DiskQueue(tmp_path, max_bytes=0, segment_bytes=record_size * 4)
+    fill(queue, 2)
+    position = queue.peek(1)[0][0]
+    fill(queue, 8, start=2)  # Evicts the segment holding position
+    queue.ack(position)
+    assert topics(queue.peek(1)) == ["solar/sensor/4"]
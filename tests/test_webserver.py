@@ -0,0 +1,41 @@
+# tests/test_webserver.py
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_socketio")
+
+from sensor_monitor.webserver import flaskWrapper  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    return flaskWrapper.__new__(flaskWrapper)  # parse_* helpers need no app state
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "1e300", "-1e300", "yesterday", "2024-13-01"])
+def test_parse_time_rejects_invalid(server, value):
+    assert server.parse_time(value, 0) is None
+
+
+def test_parse_time_accepts_epoch_and_iso(server):
+    assert server.parse_time("1714557600", None) == 1714557600.0
+    assert server.parse_time("1714557600.5", None) == 1714557600.5
+    assert server.parse_time("2024-05-01", None) == datetime(2024, 5, 1).timestamp()
+    assert server.parse_time("2024-05-01T10:30:00", None) == datetime(2024, 5, 1, 10, 30).timestamp()
+
+
+def test_parse_time_empty_uses_default(server):
+    assert server.parse_time("", 42.0) == 42.0
+    assert server.parse_time(None, 42.0) == 42.0
+
+
+def test_parse_rating(server):
+    assert server.parse_rating("24", "Battery", 12) == 24
+    assert server.parse_rating("", "Battery", 48) == 48
+    assert server.parse_rating(None, "Solar", 12) == 12
+    assert server.parse_rating("5", "Battery", 12) is None  # Under half a 12 V block
+    assert server.parse_rating("5", "Solar", 12) == 5
+    assert server.parse_rating("0", "Solar", 12) is None
+    assert server.parse_rating("twelve", "Solar", 12) is None